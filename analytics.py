@@ -0,0 +1,351 @@
+"""
+Day x key matrix analytics.
+
+Loads the keystroke history once into a dense NumPy matrix, one row per
+calendar day from the first tracked day and one column per key id, and keeps
+it current by adding each flush's rows as they are committed
+(database.flush_listeners).
+Period sums, trends, streaks, weekday profiles and rolling averages are then
+vectorized operations on that matrix instead of SQL round trips.
+
+NumPy is optional. Without it `available` is False and callers use the SQL
+queries in database.py; with it, the module-level functions mirror their
+database.py counterparts (same arguments, same results), so the report can
+use either.
+"""
+import importlib.util
+import os
+import threading
+from collections import Counter
+from datetime import date, timedelta
+from itertools import chain
+from typing import Optional
+
+import database
+
+# Imported on first use: report, server and render import this module, and
+# NumPy alone takes ~100 ms to load
+np = None
+available = importlib.util.find_spec('numpy') is not None
+
+# Whether the report reads from the matrix instead of SQL; HEATMAP_ANALYTICS=1
+enabled = available and os.environ.get('HEATMAP_ANALYTICS', '') not in ('', '0')
+
+WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+
+
+def _import_numpy():
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+
+
+class DayKeyMatrix:
+    """
+    Keystroke counts as a (day, key id) int64 matrix.
+
+    Row i is day `first_day + i` (a date ordinal); column j is key id j, so
+    ids index columns directly. Per-day and per-key totals are kept alongside
+    and updated with every add.
+    """
+
+    def __init__(self, first_day: int, names: dict[int, str]):
+        _import_numpy()
+        self.first_day = first_day
+        self.days = 0  # rows in use; capacity may be larger
+        self.counts = np.zeros((0, max(names, default=0) + 1), dtype=np.int64)
+        self.day_totals = np.zeros(0, dtype=np.int64)
+        self.key_totals = np.zeros(self.counts.shape[1], dtype=np.int64)
+        self.names = dict(names)
+        self.generation = -1
+
+    @classmethod
+    def load(cls) -> 'DayKeyMatrix':
+        """
+        Read the whole history in one query.
+
+        Months folded by database.compact_history sit on their last day, so
+        per-day totals come from day_totals instead of the matrix rows.
+        """
+        _import_numpy()
+        manager = database.get_manager()
+        # Flush listeners add on top of `generation`, so no write may land between the two
+        with manager.writes_paused(), manager.reader() as conn:
+            generation = database.get_generation()
+            names = dict(conn.execute('SELECT id, name FROM keys').fetchall())
+            cursor = conn.execute(f'SELECT * FROM {database.HISTORY}')
+            cursor.row_factory = None
+            # Straight from the cursor into the array; no list of row tuples
+            rows = np.fromiter(chain.from_iterable(cursor), dtype=np.int64).reshape(-1, 3)
+            cursor = conn.execute('SELECT day, count FROM day_totals')
+            cursor.row_factory = None
+            day_totals = np.fromiter(chain.from_iterable(cursor), dtype=np.int64).reshape(-1, 2)
+        first_day = int(day_totals[:, 0].min()) if len(day_totals) else date.today().toordinal()
+        matrix = cls(first_day, names)
+        if len(day_totals):
+            matrix.add(rows)
+            matrix.extend_to(int(day_totals[:, 0].max()))
+            matrix.day_totals[:] = 0
+            matrix.day_totals[day_totals[:, 0] - first_day] = day_totals[:, 1]
+        matrix.generation = generation
+        return matrix
+
+    def _reserve(self, first_day: int, last_day: int, key_id: int):
+        """Grow the matrix to cover days first_day..last_day and ids up to key_id."""
+        prepend = max(0, self.first_day - first_day)
+        days = max(self.days + prepend, last_day - min(first_day, self.first_day) + 1)
+        keys = max(self.counts.shape[1], key_id + 1)
+        if prepend or days > len(self.counts) or keys > self.counts.shape[1]:
+            # Double the day capacity so appending day by day stays amortized O(1)
+            capacity = max(days, 2 * len(self.counts)) if days > len(self.counts) else len(self.counts) + prepend
+            counts = np.zeros((capacity, keys), dtype=np.int64)
+            counts[prepend:prepend + self.days, :self.counts.shape[1]] = self.counts[:self.days]
+            day_totals = np.zeros(capacity, dtype=np.int64)
+            day_totals[prepend:prepend + self.days] = self.day_totals[:self.days]
+            key_totals = np.zeros(keys, dtype=np.int64)
+            key_totals[:len(self.key_totals)] = self.key_totals
+            self.counts, self.day_totals, self.key_totals = counts, day_totals, key_totals
+            self.first_day -= prepend
+        self.days = days
+
+    def add(self, rows, names: Optional[dict[int, str]] = None):
+        """
+        Add (day, key_id, count) rows.
+
+        Args:
+            rows: Array or list of (day ordinal, key id, count)
+            names: Names for key ids not seen before
+        """
+        rows = np.asarray(rows, dtype=np.int64).reshape(-1, 3)
+        if names:
+            self.names.update(names)
+        if not len(rows):
+            return
+        days, key_ids, counts = rows[:, 0], rows[:, 1], rows[:, 2]
+        self._reserve(int(days.min()), int(days.max()), int(key_ids.max()))
+        index = days - self.first_day
+        np.add.at(self.counts, (index, key_ids), counts)
+        np.add.at(self.day_totals, index, counts)
+        np.add.at(self.key_totals, key_ids, counts)
+
+    def extend_to(self, day: int):
+        """Make sure the day axis reaches day, with zero rows for untracked days."""
+        if day >= self.first_day + self.days:
+            self._reserve(self.first_day, day, 0)
+
+    def _index(self, day: date) -> int:
+        """Row index of a day, clamped to the matrix."""
+        return min(max(day.toordinal() - self.first_day, 0), self.days)
+
+    def _to_counter(self, sums) -> Counter:
+        return Counter({self.names[key_id]: int(sums[key_id]) for key_id in np.flatnonzero(sums)})
+
+    def key_counts(self, start: Optional[date] = None, end: Optional[date] = None) -> Counter:
+        """Per-key sums over [start, end], inclusive; all time by default."""
+        if start is None and end is None:
+            return self._to_counter(self.key_totals)
+        if start is not None and start > (end or date.today()):
+            raise ValueError(f'start {start} is after end {end or date.today()}')
+        lo = self._index(start) if start else 0
+        hi = self._index((end or date.today()) + timedelta(days=1))
+        return self._to_counter(self.counts[lo:hi].sum(axis=0))
+
+    def total(self, start: Optional[date] = None, end: Optional[date] = None) -> int:
+        """Keystrokes over [start, end], inclusive; all time by default."""
+        lo = self._index(start) if start else 0
+        hi = self._index(end + timedelta(days=1)) if end else self.days
+        return int(self.day_totals[lo:hi].sum())
+
+    def tracked(self):
+        """Boolean vector of days with any keystrokes."""
+        return self.day_totals[:self.days] > 0
+
+    def most_active_day(self) -> Optional[tuple[str, int]]:
+        """Day with the most keystrokes (earliest on ties), as (ISO date, count)."""
+        if not self.days or not self.day_totals.any():
+            return None
+        index = int(np.argmax(self.day_totals[:self.days]))
+        return date.fromordinal(self.first_day + index).isoformat(), int(self.day_totals[index])
+
+    def current_streak(self) -> int:
+        """Consecutive tracked days ending today (0 if today has no keys)."""
+        today = date.today().toordinal() - self.first_day
+        if not 0 <= today < self.days:
+            return 0
+        untracked = np.flatnonzero(~self.tracked()[:today + 1])
+        return today - int(untracked[-1]) if len(untracked) else today + 1
+
+    def _islands(self):
+        """Start and end row indexes of every run of tracked days."""
+        edges = np.diff(np.concatenate(([0], self.tracked().astype(np.int8), [0])))
+        return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1) - 1
+
+    def streak_analysis(self, max_gaps: Optional[int] = 10) -> dict:
+        """Same result as database.get_streak_analysis."""
+        starts, ends = self._islands()
+
+        def iso(index) -> str:
+            return date.fromordinal(self.first_day + int(index)).isoformat()
+
+        longest = None
+        if len(starts):
+            lengths = ends - starts + 1
+            # Longest run, latest start on ties
+            best = len(lengths) - 1 - int(np.argmax(lengths[::-1]))
+            longest = (int(lengths[best]), iso(starts[best]), iso(ends[best]))
+
+        gap_starts, gap_ends = ends[:-1] + 1, starts[1:] - 1
+        gap_days = gap_ends - gap_starts + 1
+        order = np.lexsort((-gap_starts, -gap_days))[:max_gaps]
+        return {
+            'current_streak': self.current_streak(),
+            'longest_streak': longest,
+            'gaps': [(iso(gap_starts[i]), iso(gap_ends[i]), int(gap_days[i])) for i in order],
+        }
+
+    def weekday_profile(self) -> dict[str, float]:
+        """Average keystrokes per tracked day, for each weekday."""
+        tracked = self.tracked()
+        # date.weekday() of row i is (first_day + i - 1) % 7 for ordinals
+        weekdays = (np.arange(self.days) + self.first_day - 1) % 7
+        days = np.bincount(weekdays[tracked], minlength=7)
+        keys = np.bincount(weekdays[tracked], weights=self.day_totals[:self.days][tracked], minlength=7)
+        averages = np.divide(keys, days, out=np.zeros(7), where=days > 0)
+        return {name: round(float(avg), 1) for name, avg in zip(WEEKDAYS, averages)}
+
+    def rolling_average(self, window: int = 7) -> list[tuple[str, float]]:
+        """Trailing window-day mean of daily keystrokes, for every calendar day."""
+        totals = np.concatenate(([0], np.cumsum(self.day_totals[:self.days])))
+        index = np.arange(1, self.days + 1)
+        lower = np.maximum(index - window, 0)
+        means = (totals[index] - totals[lower]) / (index - lower)
+        first = date.fromordinal(self.first_day)
+        return [((first + timedelta(days=i)).isoformat(), round(float(m), 1)) for i, m in enumerate(means)]
+
+    def key_trends(self, days: int = 30) -> dict[str, float]:
+        """
+        Least-squares slope of each key's daily count over the last `days`
+        days, in keystrokes per day per day; keys unused in the window are left out.
+        """
+        hi = self._index(date.today() + timedelta(days=1))
+        window = self.counts[max(0, hi - days):hi]
+        if len(window) < 2:
+            return {}
+        t = np.arange(len(window)) - (len(window) - 1) / 2
+        slopes = t @ window / (t @ t)
+        used = np.flatnonzero(window.any(axis=0))
+        return {self.names[key_id]: round(float(slopes[key_id]), 3) for key_id in used}
+
+    def period_counts(self, ranges: Optional[dict[str, tuple[date, date]]] = None) -> dict[str, Counter]:
+        """Same result as database.get_period_counts."""
+        today = date.today()
+        periods = {
+            'today': self.key_counts(today, today),
+            'week': self.key_counts(today - timedelta(days=today.weekday()), today),
+            'month': self.key_counts(today.replace(day=1), today),
+            'all': self.key_counts(),
+        }
+        for name, (start, end) in (ranges or {}).items():
+            periods[name] = self.key_counts(start, end)
+        return periods
+
+    def statistics(self) -> dict:
+        """Same result as database.get_statistics."""
+        today = date.today()
+        tracked = self.tracked()
+        total = int(self.key_totals.sum())
+        days = int(tracked.sum())
+        keys_per_day = round(total / days) if days > 0 else 0
+        first_tracked = np.flatnonzero(tracked)
+        return {
+            'total_keystrokes': total,
+            'tracking_since': date.fromordinal(self.first_day + int(first_tracked[0])).isoformat() if days else None,
+            'days_tracked': days,
+            'keys_per_day': keys_per_day,
+            # Assume ~8 hours of active typing per day
+            'keys_per_hour': round(keys_per_day / 8) if days > 0 else 0,
+            'most_active_day': self.most_active_day(),
+            'current_streak': self.current_streak(),
+            'period_totals': {
+                'today': self.total(today, today),
+                'week': self.total(today - timedelta(days=today.weekday()), today),
+                'month': self.total(today.replace(day=1), today),
+            },
+        }
+
+
+_matrix: Optional[DayKeyMatrix] = None
+_matrix_lock = threading.RLock()
+
+
+def _on_flush(rows: list, names: dict[int, str], generation: int):
+    """database.flush_listeners hook: add a committed flush to the matrix."""
+    with _matrix_lock:
+        # Only if the matrix saw every write before this one; otherwise it reloads
+        if _matrix is not None and _matrix.generation == generation - 1:
+            _matrix.add(rows, names)
+            _matrix.generation = generation
+
+
+def get_matrix() -> DayKeyMatrix:
+    """
+    Get the shared matrix, loading it on first use and again after writes it
+    did not see (e.g. a rollup rebuild or another database).
+    """
+    global _matrix
+    if not available:
+        raise RuntimeError('analytics needs NumPy')
+    with _matrix_lock:
+        if _matrix is None or _matrix.generation != database.get_generation():
+            if _on_flush not in database.flush_listeners:
+                database.flush_listeners.append(_on_flush)
+            _matrix = DayKeyMatrix.load()
+        _matrix.extend_to(date.today().toordinal())
+        return _matrix
+
+
+def get_key_counts(period: str = 'all', start: Optional[date] = None,
+                   end: Optional[date] = None) -> Counter:
+    """Same as database.get_key_counts, from the matrix."""
+    with _matrix_lock:
+        matrix = get_matrix()
+        if start is not None or end is not None:
+            return matrix.key_counts(start, end)
+        return matrix.period_counts()[period]
+
+
+def get_period_counts(ranges: Optional[dict[str, tuple[date, date]]] = None) -> dict[str, Counter]:
+    """Same as database.get_period_counts, from the matrix."""
+    with _matrix_lock:
+        return get_matrix().period_counts(ranges)
+
+
+def get_statistics() -> dict:
+    """Same as database.get_statistics, from the matrix."""
+    with _matrix_lock:
+        return get_matrix().statistics()
+
+
+def get_streak_analysis(max_gaps: Optional[int] = 10) -> dict:
+    """Same as database.get_streak_analysis, from the matrix."""
+    with _matrix_lock:
+        return get_matrix().streak_analysis(max_gaps)
+
+
+def get_weekday_profile() -> dict[str, float]:
+    """Average keystrokes per tracked day for each weekday."""
+    with _matrix_lock:
+        return get_matrix().weekday_profile()
+
+
+def get_rolling_average(window: int = 7) -> list[tuple[str, float]]:
+    """Trailing window-day average of daily keystrokes."""
+    with _matrix_lock:
+        return get_matrix().rolling_average(window)
+
+
+def get_key_trends(days: int = 30) -> dict[str, float]:
+    """Per-key daily count slope over the last `days` days."""
+    with _matrix_lock:
+        return get_matrix().key_trends(days)
@@ -0,0 +1,1451 @@
+"""
+Micro-benchmarks for the keyboard heat map.
+
+Every benchmark runs against a throwaway database in a temp directory,
+never against the real one in AppData.
+
+Usage:
+    python benchmark.py              # run all benchmarks
+    python benchmark.py connections  # run selected benchmarks
+    python benchmark.py suite --json results.json  # save results for comparison
+"""
+import argparse
+import atexit
+import http.client
+import json
+import os
+import sqlite3
+import tempfile
+import random
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+
+import analytics
+import database
+import journal
+import logger
+import render
+import replay
+import report
+import server
+
+
+_temp_dirs: list[str] = []
+
+
+def make_temp_dir() -> str:
+    """Make a temp AppData directory that remove_temp_dirs deletes."""
+    temp_dir = tempfile.mkdtemp(prefix='heatmap-bench-')
+    _temp_dirs.append(temp_dir)
+    return temp_dir
+
+
+@atexit.register
+def remove_temp_dirs():
+    """Close connections and delete every temp directory made so far."""
+    database.close_connections()
+    while _temp_dirs:
+        shutil.rmtree(_temp_dirs.pop(), ignore_errors=True)
+
+
+def use_temp_db() -> Path:
+    """Point the database module at a fresh temp directory and initialize it."""
+    # Earlier benchmarks' databases are done with; don't let repeated runs fill /tmp
+    remove_temp_dirs()
+    os.environ['APPDATA'] = make_temp_dir()
+    database.init_db()
+    return database.get_db_path()
+
+
+HISTORY_KEYS = [
+    *'etaoinshrdlcumwfgypbvkjxqz', *'0123456789',
+    'Space', 'Backspace', 'Enter', 'Shift', 'Ctrl', 'Tab', 'Alt', 'Esc',
+    'Up', 'Down', 'Left', 'Right', 'Delete', 'Home', 'End', 'CapsLock',
+    '.', ',', ';', "'", '/', '-', '=', '[', ']',
+]
+
+
+def fill_history(years: float, seed: int = 0, active_ratio: float = 0.9,
+                 end: date = None, daily_mean: int = 4000, weekend_factor: float = 0.35,
+                 zipf: float = 1.1) -> int:
+    """
+    Fill the database with a plausible keystroke history ending today.
+
+    Key popularity follows a Zipf-like distribution over HISTORY_KEYS (which
+    is roughly in frequency order), weekends are quieter than weekdays, and
+    every active day's volume varies around its mean.
+
+    Args:
+        years: Length of the history
+        seed: Random seed, so sizes are reproducible across commits
+        active_ratio: Share of days with any typing at all
+        end: Last day of the history (default: today)
+        daily_mean: Average keystrokes on an active weekday
+        weekend_factor: Weekend volume relative to weekdays
+        zipf: Exponent of the key distribution
+
+    Returns:
+        Number of daily_counts rows written
+    """
+    rng = random.Random(seed)
+    end = end or date.today()
+    day = end - timedelta(days=int(years * 365))
+    weights = [1 / (rank + 1) ** zipf for rank in range(len(HISTORY_KEYS))]
+    weight_sum = sum(weights)
+    shares = [w / weight_sum for w in weights]
+
+    batches = []
+    while day <= end:
+        if rng.random() < active_ratio:
+            mean = daily_mean * (weekend_factor if day.weekday() >= 5 else 1)
+            total = max(1.0, rng.lognormvariate(0, 0.5) * mean)
+            counts = Counter()
+            for key, share in zip(HISTORY_KEYS, shares):
+                expected = total * share
+                count = round(rng.gauss(expected, expected ** 0.5))
+                if count > 0:
+                    counts[key] = count
+            if counts:
+                batches.append((day, counts))
+        day += timedelta(days=1)
+    return database.flush_batches(batches).rows
+
+
+def time_per_call(func, number: int) -> float:
+    """Return the average wall time of func() in microseconds."""
+    start = time.perf_counter()
+    for _ in range(number):
+        func()
+    return (time.perf_counter() - start) / number * 1e6
+
+
+def bench_connections(number: int = 2000) -> dict:
+    """Per-query overhead of opening a connection vs. reusing a pooled one."""
+    use_temp_db()
+
+    def legacy_query():
+        # What every database function did before the connection manager
+        conn = sqlite3.connect(database.get_db_path())
+        conn.row_factory = sqlite3.Row
+        conn.execute('SELECT SUM(count) FROM daily_counts').fetchone()
+        conn.close()
+
+    def pooled_query():
+        with database.get_manager().reader() as conn:
+            conn.execute('SELECT SUM(count) FROM daily_counts').fetchone()
+
+    legacy_us = time_per_call(legacy_query, number)
+    pooled_us = time_per_call(pooled_query, number)
+    database.close_connections()
+
+    return {
+        'legacy_us_per_call': round(legacy_us, 2),
+        'pooled_us_per_call': round(pooled_us, 2),
+        'speedup': round(legacy_us / pooled_us, 1),
+    }
+
+
+def bench_flush(key_counts=(10, 100, 500), repeat: int = 50) -> dict:
+    """Flush latency of a per-key execute loop vs. the batched executemany path."""
+    db_path = use_temp_db()
+    results = {}
+
+    for n in key_counts:
+        counts = Counter({f'key{i}': i + 1 for i in range(n)})
+        database.flush_counts(counts)  # register the key names
+        today = date.today().toordinal()
+        month = database._month_of(today)
+        rows = [(key_id, counts[key]) for key, key_id in database._key_ids.items() if key in counts]
+
+        def legacy_flush():
+            # What flush_counts did before batching: a fresh connection and
+            # one execute per key (and per rollup)
+            conn = sqlite3.connect(db_path)
+            for key_id, count in rows:
+                conn.execute(database.UPSERT_SQL, (today, key_id, count))
+                conn.execute(database.KEY_TOTALS_UPSERT_SQL, (key_id, count))
+                conn.execute(database.MONTHLY_UPSERT_SQL, (month, key_id, count))
+                conn.execute(database.DAY_TOTALS_UPSERT_SQL, (today, count))
+            conn.commit()
+            conn.close()
+
+        legacy_us = time_per_call(legacy_flush, repeat)
+        batched_us = time_per_call(lambda: database.flush_counts(counts), repeat)
+        results[f'legacy_us_{n}_keys'] = round(legacy_us, 1)
+        results[f'batched_us_{n}_keys'] = round(batched_us, 1)
+
+    database.close_connections()
+    return results
+
+
+def bench_scheduler(bursts: int = 5, keys_per_burst: int = 300) -> dict:
+    """
+    Drive the flush scheduler with short policy timings against a fake
+    database: bursts of typing separated by pauses, then a quiet period
+    that must not wake the scheduler at all.
+    """
+    written = Counter()
+
+    def fake_flush_counts(counts, day=None, journal_epoch=None):
+        written.update(counts)
+        return database.FlushResult(len(counts), 0.0)
+
+    key_logger = logger.KeyLogger()
+    key_logger.FLUSH_THRESHOLD = 1000
+    key_logger.FLUSH_MAX_AGE = 0.5
+    key_logger.FLUSH_IDLE = 0.1
+    keys = [SimpleNamespace(vk=65 + i, char=chr(97 + i)) for i in range(26)]
+
+    original = database.flush_counts
+    database.flush_counts = fake_flush_counts
+    try:
+        key_logger.start_scheduler()
+        for burst in range(bursts):
+            for i in range(keys_per_burst):
+                key_logger._on_release(keys[i % len(keys)])
+            time.sleep(0.3)
+        wakeups = key_logger.stats['scheduler_wakeups']
+        time.sleep(1.0)
+        idle_wakeups = key_logger.stats['scheduler_wakeups'] - wakeups
+        key_logger.stop_scheduler()
+    finally:
+        database.flush_counts = original
+
+    assert sum(written.values()) == bursts * keys_per_burst, 'scheduler lost counts'
+    assert idle_wakeups == 0, f'{idle_wakeups} wake-ups with an empty buffer'
+    stats = key_logger.stats
+    return {
+        'flushes': stats['flushes'],
+        'reasons': dict(stats['flush_reasons']),
+        'wakeups': stats['scheduler_wakeups'],
+        'idle_wakeups': idle_wakeups,
+    }
+
+
+def bench_journal(appends: int = 2000, keys: int = 60) -> dict:
+    """Cost of one journal checkpoint append under each fsync policy."""
+    directory = use_temp_db().parent / 'journal'
+    deltas = Counter({f'key{i}': i + 1 for i in range(keys)})
+    results = {}
+    for policy in journal.FSYNC_POLICIES:
+        writer = journal.Journal(directory, fsync=policy, fsync_interval=1.0)
+        writer.start_epoch(1)
+        count = appends if policy != 'always' else appends // 20
+        results[f'{policy}_us_per_append'] = round(
+            time_per_call(lambda: writer.append(date.today().toordinal(), deltas), count), 1)
+        writer.discard(1)
+        writer.release()
+
+    # A tool replaying next to a running logger must not commit its live segment
+    key_logger = logger.KeyLogger()
+    key_logger.open_journal()
+    for _ in range(10):
+        key_logger._on_release(replay.FakeKeyCode(char='a'))
+    key_logger.checkpoint()
+    before = database.get_key_counts('all')['a']
+    subprocess.run([sys.executable, 'database.py', 'verify'], cwd=Path(__file__).parent, check=True, capture_output=True)
+    assert database.replay_journal() == 0, 'replayed a journal another logger holds'
+    key_logger.flush('exit')
+    assert database.get_key_counts('all')['a'] == before + 10, 'journaled keys counted twice'
+
+    # Once released (as after a crash), leftover segments are replayed
+    key_logger._on_release(replay.FakeKeyCode(char='a'))
+    key_logger.checkpoint()
+    key_logger.journal.release()
+    assert database.replay_journal() == 1
+    database.close_connections()
+    return results
+
+
+def percentile(samples: list, fraction: float):
+    """Return the value at the given fraction (0-1) of the sorted samples."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def bench_ingest(threads: int = 4, events_per_thread: int = 50_000,
+                 flush_delay: float = 0.05, p99_budget_us: float = 100.0) -> dict:
+    """
+    Stress the capture path: hammer KeyLogger._on_release from several
+    threads while another thread keeps flushing into a deliberately slow
+    fake database. Fails if any count is lost or hook latency leaves the
+    microsecond range.
+    """
+    written = Counter()
+
+    def slow_flush_counts(counts, day=None, journal_epoch=None):
+        time.sleep(flush_delay)  # simulate a slow disk
+        written.update(counts)
+        return database.FlushResult(len(counts), flush_delay)
+
+    key_logger = logger.KeyLogger()
+    keys = [SimpleNamespace(vk=65 + i, char=chr(97 + i)) for i in range(26)]
+    latencies = [[] for _ in range(threads)]
+    done = threading.Event()
+
+    def type_keys(samples):
+        clock = time.perf_counter_ns
+        for i in range(events_per_thread):
+            key = keys[i % len(keys)]
+            start = clock()
+            key_logger._on_release(key)
+            samples.append(clock() - start)
+
+    def keep_flushing():
+        while not done.is_set():
+            key_logger.flush()
+
+    original = database.flush_counts
+    database.flush_counts = slow_flush_counts
+    try:
+        flusher = threading.Thread(target=keep_flushing)
+        flusher.start()
+        typists = [threading.Thread(target=type_keys, args=(samples,)) for samples in latencies]
+        start = time.perf_counter()
+        for thread in typists:
+            thread.start()
+        for thread in typists:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        done.set()
+        flusher.join()
+        key_logger.flush()
+    finally:
+        database.flush_counts = original
+
+    samples = [sample / 1000 for thread_samples in latencies for sample in thread_samples]
+    expected = threads * events_per_thread
+    p99 = percentile(samples, 0.99)
+    assert sum(written.values()) == expected, f'lost {expected - sum(written.values())} counts'
+    assert p99 <= p99_budget_us, f'p99 hook latency {p99:.1f} us exceeds {p99_budget_us} us'
+
+    return {
+        'events': expected,
+        'events_per_sec': round(expected / elapsed),
+        'p50_us': round(percentile(samples, 0.5), 2),
+        'p99_us': round(p99, 2),
+        'max_us': round(max(samples), 2),
+    }
+
+
+def statistics_from_helpers() -> dict:
+    """get_statistics as it was assembled before the one-query engine."""
+    total = database.get_total_keystrokes('all')
+    days = database.get_days_tracked()
+    keys_per_day = round(total / days) if days > 0 else 0
+    return {
+        'total_keystrokes': total,
+        'tracking_since': database.get_tracking_start_date(),
+        'days_tracked': days,
+        'keys_per_day': keys_per_day,
+        'keys_per_hour': round(keys_per_day / 8) if days > 0 else 0,
+        'most_active_day': database.get_most_active_day(),
+        'current_streak': database.get_current_streak(),
+        'period_totals': {
+            period: database.get_total_keystrokes(period) for period in ('today', 'week', 'month')
+        },
+    }
+
+
+def bench_statistics(seeds: int = 20, years: int = 10, repeat: int = 20) -> dict:
+    """
+    Check get_statistics against the per-helper queries on randomized
+    databases, then time both on a synthetic multi-year history.
+    """
+    for seed in range(seeds):
+        use_temp_db()
+        rng = random.Random(seed)
+        # Short, gappy histories that sometimes include or end before today
+        fill_history(rng.uniform(0, 0.3), seed=seed, active_ratio=rng.random(),
+                     end=date.today() - timedelta(days=rng.choice([0, 0, 1, 5])))
+        expected = statistics_from_helpers()
+        actual = database.get_statistics()
+        assert actual == expected, f'seed {seed}: {actual} != {expected}'
+
+    use_temp_db()
+    rows = fill_history(years)
+    helpers_ms = time_per_call(statistics_from_helpers, repeat) / 1000
+    engine_ms = time_per_call(database.get_statistics, repeat) / 1000
+    database.close_connections()
+
+    return {
+        'equivalent_databases': seeds,
+        'history_rows': rows,
+        'helpers_ms': round(helpers_ms, 2),
+        'engine_ms': round(engine_ms, 2),
+        'speedup': round(helpers_ms / engine_ms, 1),
+    }
+
+
+def streaks_in_python() -> dict:
+    """Reference streak analysis: pull every date into Python and walk them."""
+    with database.get_manager().reader() as conn:
+        dates = [date.fromordinal(row[0]) for row in conn.execute('SELECT day FROM day_totals ORDER BY day')]
+
+    current = 0
+    check_date = date.today()
+    for day in reversed(dates):
+        if day == check_date:
+            current += 1
+            check_date -= timedelta(days=1)
+        elif day < check_date:
+            break
+
+    runs, gaps = [], []
+    for i, day in enumerate(dates):
+        if i and (day - dates[i - 1]).days == 1:
+            runs[-1][0] += 1
+            runs[-1][2] = day
+        else:
+            runs.append([1, day, day])
+        if i and (day - dates[i - 1]).days > 1:
+            gaps.append(((dates[i - 1] + timedelta(days=1)).isoformat(),
+                         (day - timedelta(days=1)).isoformat(),
+                         (day - dates[i - 1]).days - 1))
+
+    longest = max(runs, key=lambda run: (run[0], run[1]), default=None)
+    return {
+        'current_streak': current,
+        'longest_streak': (longest[0], longest[1].isoformat(), longest[2].isoformat()) if longest else None,
+        'gaps': sorted(gaps, key=lambda gap: (gap[2], gap[0]), reverse=True),
+    }
+
+
+def bench_streaks(seeds: int = 20, years: int = 10, repeat: int = 20) -> dict:
+    """Check the SQL streak analysis against a Python walk, then time both."""
+    for seed in range(seeds):
+        use_temp_db()
+        rng = random.Random(seed)
+        fill_history(rng.uniform(0, 0.5), seed=seed, active_ratio=rng.uniform(0.3, 1.0),
+                     end=date.today() - timedelta(days=rng.choice([0, 0, 1, 5])))
+        expected = streaks_in_python()
+        actual = database.get_streak_analysis(max_gaps=None)
+        assert actual == expected, f'seed {seed}: {actual} != {expected}'
+
+    use_temp_db()
+    fill_history(years, active_ratio=0.95)
+    python_ms = time_per_call(streaks_in_python, repeat) / 1000
+    sql_ms = time_per_call(database.get_streak_analysis, repeat) / 1000
+    current_us = time_per_call(database.get_current_streak, repeat * 10)
+    database.close_connections()
+
+    return {
+        'equivalent_databases': seeds,
+        'python_ms': round(python_ms, 2),
+        'sql_ms': round(sql_ms, 2),
+        'current_streak_us': round(current_us, 1),
+    }
+
+
+def bench_schema(years: int = 10, repeat: int = 20) -> dict:
+    """
+    Compare the text-keyed schema 1 layout with the integer-keyed
+    WITHOUT ROWID layout on the same synthetic history: file size,
+    date-range scans and full GROUP BYs.
+    """
+    v2_path = use_temp_db()
+    fill_history(years)
+    database.close_connections()
+
+    # Same history in a second AppData folder, converted to schema 1
+    os.environ['APPDATA'] = make_temp_dir()
+    v1_path = database.get_db_path()
+    shutil.copy(v2_path, v1_path)
+    database.downgrade_schema()
+    database.close_connections()
+
+    start_day = date.today() - timedelta(days=90)
+    layouts = {
+        'v1': (v1_path, {
+            'range_scan': ('SELECT key, SUM(count) FROM daily_counts WHERE date >= ? GROUP BY key',
+                           (start_day.isoformat(),)),
+            'group_by_key': ('SELECT key, SUM(count) FROM daily_counts GROUP BY key', ()),
+            'group_by_day': ('SELECT date, SUM(count) FROM daily_counts GROUP BY date', ()),
+        }),
+        'v2': (v2_path, {
+            'range_scan': ('SELECT key_id, SUM(count) FROM daily_counts WHERE day >= ? GROUP BY key_id',
+                           (start_day.toordinal(),)),
+            'group_by_key': ('SELECT key_id, SUM(count) FROM daily_counts GROUP BY key_id', ()),
+            'group_by_day': ('SELECT day, SUM(count) FROM daily_counts GROUP BY day', ()),
+        }),
+    }
+
+    results = {}
+    for layout, (path, queries) in layouts.items():
+        conn = sqlite3.connect(path)
+        conn.execute('VACUUM')
+        results[f'{layout}_file_kb'] = round(path.stat().st_size / 1024)
+        for name, (sql, params) in queries.items():
+            ms = time_per_call(lambda: conn.execute(sql, params).fetchall(), repeat) / 1000
+            results[f'{layout}_{name}_ms'] = round(ms, 2)
+        conn.close()
+    return results
+
+
+def bench_report(years: int = 2, repeat: int = 20) -> dict:
+    """Report generation cost: fresh data vs. reopening with nothing flushed."""
+    use_temp_db()
+    fill_history(years)
+
+    def fresh_report():
+        database.flush_counts(Counter(e=1))
+        report.generate_report()
+
+    fresh_ms = time_per_call(fresh_report, repeat) / 1000
+    cached_us = time_per_call(report.generate_report, repeat * 10)
+    html = report.generate_html()
+    html_kb = len(html) / 1024
+    assert 'src="http' not in html and '<link' not in html, 'report loads remote assets'
+    database.close_connections()
+    # The NumPy analytics path is opt-in, so importing the report must not load NumPy
+    numpy_loaded = subprocess.run(
+        [sys.executable, '-c', 'import sys, report; print("numpy" in sys.modules)'],
+        cwd=Path(__file__).parent, capture_output=True, text=True, check=True,
+        env={k: v for k, v in os.environ.items() if k != 'HEATMAP_ANALYTICS'},
+    ).stdout.strip()
+    assert numpy_loaded == 'False', 'importing report loads NumPy'
+    return {
+        'fresh_ms': round(fresh_ms, 2),
+        'unchanged_us': round(cached_us, 1),
+        'html_kb': round(html_kb, 1),
+    }
+
+
+# Four-period report payload cost, in multiples of the all-time-only payload:
+# every key needs a lookup per period instead of one rollup read (2-3x here)
+PERIOD_PAYLOAD_BUDGET = 4
+
+
+def bench_periods(years: int = 10, repeat: int = 50) -> dict:
+    """Four-period report payload in one query vs. the single all-time query."""
+    use_temp_db()
+    fill_history(years)
+
+    periods = database.get_period_counts()
+    for period in ('today', 'week', 'month', 'all'):
+        assert periods[period] == database.get_key_counts(period), f'{period} counts differ'
+
+    def separate():
+        return {period: database.get_key_counts(period) for period in ('today', 'week', 'month', 'all')}
+
+    def single_period_payload():
+        counts = database.get_key_counts('all')
+        return counts, counts.most_common(10), database.get_statistics()
+
+    single_us = time_per_call(lambda: database.get_key_counts('all'), repeat)
+    combined_us = time_per_call(database.get_period_counts, repeat)
+    separate_us = time_per_call(separate, repeat)
+    single_payload_us = time_per_call(single_period_payload, repeat)
+    payload_us = time_per_call(report.build_report_data, repeat)
+    payload_kb = len(json.dumps(report.build_report_data())) / 1024
+    database.close_connections()
+
+    assert combined_us < separate_us, 'one query is slower than four'
+    assert payload_us <= single_payload_us * PERIOD_PAYLOAD_BUDGET, \
+        f'four-period payload {payload_us / single_payload_us:.1f}x the single-period one, budget {PERIOD_PAYLOAD_BUDGET}x'
+    return {
+        'all_only_us': round(single_us, 1),
+        'four_periods_one_query_us': round(combined_us, 1),
+        'four_periods_separate_us': round(separate_us, 1),
+        'single_period_payload_us': round(single_payload_us, 1),
+        'four_period_payload_us': round(payload_us, 1),
+        'payload_ratio': round(payload_us / single_payload_us, 2),
+        'budget_ratio': PERIOD_PAYLOAD_BUDGET,
+        'payload_kb': round(payload_kb, 1),
+    }
+
+
+def bench_render(days: int = 60, repeat: int = 10) -> dict:
+    """Pillow heat map rendering: cold sprite cache, warm renders and a per-day batch."""
+    use_temp_db()
+    fill_history(1)
+    counts = database.get_key_counts('all')
+
+    render._key_sprite.cache_clear()
+    render._text_sprite.cache_clear()
+    start = time.perf_counter()
+    render.render_heatmap(counts)
+    cold_ms = (time.perf_counter() - start) * 1000
+    warm_ms = time_per_call(lambda: render.render_heatmap(counts), repeat) / 1000
+
+    out_dir = Path(tempfile.mkdtemp(prefix='heatmap-render-'))
+    end = date.today()
+    misses = render._key_sprite.cache_info().misses
+    start = time.perf_counter()
+    paths = render.export_days(out_dir, end - timedelta(days=days - 1), end)
+    batch_s = time.perf_counter() - start
+    new_sprites = render._key_sprite.cache_info().misses - misses
+    shutil.rmtree(out_dir)
+    database.close_connections()
+
+    assert paths and all(p.suffix == '.png' for p in paths)
+    return {
+        'cold_first_image_ms': round(cold_ms, 1),
+        'warm_render_ms': round(warm_ms, 1),
+        'batch_images': len(paths),
+        'batch_ms_per_image': round(batch_s / len(paths) * 1000, 1),
+        'sprites_built_in_batch': new_sprites,
+    }
+
+
+# Extra cold-start time `python -m cli today` may add over a bare interpreter
+CLI_STARTUP_BUDGET_MS = 150
+CLI_FORBIDDEN_IMPORTS = ('pystray', 'pynput', 'PIL', 'report', 'render', 'logger', 'icons', 'winreg', 'numpy')
+
+
+def bench_cli(runs: int = 15) -> dict:
+    """Cold start of the headless CLI, against a budget and an import blacklist."""
+    use_temp_db()
+    fill_history(2)
+    database.close_connections()
+    env = dict(os.environ)
+    cwd = Path(__file__).parent
+
+    def cold_ms(args: list) -> float:
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, *args], cwd=cwd, env=env, check=True, capture_output=True)
+            samples.append((time.perf_counter() - start) * 1000)
+        return percentile(samples, 0.5)
+
+    bare_ms = cold_ms(['-c', 'pass'])
+    today_ms = cold_ms(['-m', 'cli', 'today'])
+    stats_ms = cold_ms(['-m', 'cli', 'stats'])
+
+    trace = subprocess.run([sys.executable, '-X', 'importtime', '-m', 'cli', 'today'],
+                           cwd=cwd, env=env, check=True, capture_output=True, text=True).stderr
+    imported = {line.rsplit('|', 1)[-1].strip().split('.')[0] for line in trace.splitlines() if '|' in line}
+    heavy = sorted(imported.intersection(CLI_FORBIDDEN_IMPORTS))
+    assert not heavy, f"cli imports {', '.join(heavy)}"
+    assert today_ms - bare_ms <= CLI_STARTUP_BUDGET_MS, \
+        f'cli startup {today_ms - bare_ms:.0f} ms over the interpreter, budget {CLI_STARTUP_BUDGET_MS} ms'
+    return {
+        'interpreter_ms': round(bare_ms, 1),
+        'cli_today_ms': round(today_ms, 1),
+        'cli_stats_ms': round(stats_ms, 1),
+        'overhead_ms': round(today_ms - bare_ms, 1),
+        'budget_ms': CLI_STARTUP_BUDGET_MS,
+        'modules_imported': len(imported),
+    }
+
+
+# Budget from process start to the first keystroke reaching the buffer
+FIRST_KEYSTROKE_BUDGET_MS = 300
+STARTUP_DEFERRED_IMPORTS = ('pystray', 'PIL', 'report', 'icons', 'urllib.request', 'subprocess', 'json', 'winreg', 'numpy')
+
+# Loads main.pyw and starts capture with a stand-in pynput whose listener
+# delivers one key as soon as the hook is installed
+STARTUP_SCRIPT = """
+import sys, types
+from importlib.machinery import SourceFileLoader
+
+class KeyCode:
+    vk, char = 65, 'a'
+
+class Listener:
+    def __init__(self, on_release):
+        self.on_release = on_release
+        self.running = False
+    def start(self):
+        self.running = True
+        self.on_release(KeyCode())
+    def stop(self):
+        self.running = False
+
+pynput = types.ModuleType('pynput')
+pynput.keyboard = types.ModuleType('pynput.keyboard')
+pynput.keyboard.Listener = Listener
+sys.modules.update({'pynput': pynput, 'pynput.keyboard': pynput.keyboard})
+
+main = SourceFileLoader('heatmap_main', 'main.pyw').load_module()
+key_logger = main.start_capture()
+assert key_logger.buffer['a'] == 1
+print('captured', flush=True)
+print(','.join(sorted(sys.modules)), flush=True)
+key_logger.stop()
+"""
+
+
+def bench_startup(runs: int = 10) -> dict:
+    """Tray app startup: time to first captured keystroke and deferred imports."""
+    use_temp_db()
+    database.close_connections()
+    env = dict(os.environ)
+    cwd = Path(__file__).parent
+
+    samples = []
+    modules = set()
+    for _ in range(runs):
+        start = time.perf_counter()
+        child = subprocess.Popen([sys.executable, '-c', STARTUP_SCRIPT], cwd=cwd, env=env,
+                                 stdout=subprocess.PIPE, text=True)
+        assert child.stdout.readline().strip() == 'captured', 'no keystroke captured'
+        samples.append((time.perf_counter() - start) * 1000)
+        modules = set(child.stdout.readline().strip().split(','))
+        child.wait()
+
+    trace = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c',
+         "from importlib.machinery import SourceFileLoader; SourceFileLoader('m', 'main.pyw').load_module()"],
+        cwd=cwd, env=env, check=True, capture_output=True, text=True,
+    ).stderr
+    import_us = sum(int(line.split('|')[0].split(':')[1]) for line in trace.splitlines() if '|' in line
+                    and line.split('|')[0].split(':')[1].strip().isdigit())
+
+    loaded_early = sorted(m for m in STARTUP_DEFERRED_IMPORTS if m in modules)
+    assert not loaded_early, f"loaded before the first keystroke: {', '.join(loaded_early)}"
+    first_key_ms = percentile(samples, 0.5)
+    assert first_key_ms <= FIRST_KEYSTROKE_BUDGET_MS, \
+        f'first keystroke after {first_key_ms:.0f} ms, budget {FIRST_KEYSTROKE_BUDGET_MS} ms'
+    return {
+        'first_keystroke_ms': round(first_key_ms, 1),
+        'first_keystroke_max_ms': round(max(samples), 1),
+        'budget_ms': FIRST_KEYSTROKE_BUDGET_MS,
+        'import_ms': round(import_us / 1000, 1),
+        'modules_at_first_key': len(modules),
+    }
+
+
+# database.get_* functions that are plumbing rather than queries
+SUITE_SKIP = {'get_db_path', 'get_journal_dir', 'get_connection', 'get_manager', 'get_generation',
+              'get_journal_epoch', 'get_query_cache_stats'}
+
+
+def bench_suite(sizes=(0.25, 1, 5, 10), repeat: int = 20) -> dict:
+    """Every database query, flush and report path, at several history sizes."""
+    import inspect
+
+    queries = {
+        name: func for name, func in inspect.getmembers(database, inspect.isfunction)
+        if name.startswith('get_') and name not in SUITE_SKIP and func.__module__ == 'database'
+    }
+    calls = {}
+    for name, func in queries.items():
+        if name in ('get_key_counts', 'get_total_keystrokes'):
+            for period in ('today', 'week', 'month', 'all'):
+                calls[f'{name}[{period}]'] = lambda func=func, period=period: func(period)
+        elif name == 'get_daily_key_counts':
+            calls[f'{name}[30d]'] = lambda func=func: func(date.today() - timedelta(days=29))
+        else:
+            calls[name] = func
+
+    rng = random.Random(5)
+    flush_batch = Counter({key: rng.randint(1, 50) for key in HISTORY_KEYS})
+
+    def fresh_report():
+        database.flush_counts(Counter(e=1))
+        report.generate_report()
+
+    results = {}
+    for years in sizes:
+        label = f'{years:g}y'
+        use_temp_db()
+        results[f'{label}/rows'] = fill_history(years)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            database.flush_counts(flush_batch)
+        results[f'{label}/flush_counts_us'] = round((time.perf_counter() - start) / repeat * 1e6, 1)
+        for name, call in calls.items():
+            results[f'{label}/{name}_us'] = round(time_per_call(call, repeat), 1)
+        results[f'{label}/generate_html_us'] = round(time_per_call(report.generate_html, repeat), 1)
+        results[f'{label}/generate_report_fresh_us'] = round(time_per_call(fresh_report, repeat), 1)
+        results[f'{label}/generate_report_unchanged_us'] = round(time_per_call(report.generate_report, repeat), 1)
+        database.close_connections()
+    return results
+
+
+def bench_server(years: int = 2, repeat: int = 50, keys: int = 5000) -> dict:
+    """JSON API latency and SSE delivery of live deltas, over plain HTTP."""
+    use_temp_db()
+    fill_history(years)
+    # Stands in for KeyLogger.flush: keys still buffered when the API is asked
+    buffered = Counter({'a': 7})
+
+    def flush():
+        if buffered:
+            database.flush_counts(buffered)
+            buffered.clear()
+
+    srv = server.ReportServer(before_page=flush)
+    srv.start()
+    port = srv.server_address[1]
+    before = database.get_key_counts('today')['a']
+
+    def get(path: str, host: str = f'127.0.0.1:{port}'):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+        conn.request('GET', path, headers={'Host': host})
+        response = conn.getresponse()
+        body = response.read()
+        conn.close()
+        return response.status, body
+
+    assert get('/api/counts?period=decade')[0] == 400
+    assert get('/api/stats', host='evil.example:80')[0] == 403
+    assert json.loads(get('/api/counts?period=today')[1])['a'] == before + 7, 'buffered keys missing'
+    assert json.loads(get('/api/counts?period=all')[1]) == dict(database.get_key_counts('all'))
+    assert len(json.loads(get('/api/top?n=5')[1])) == 5
+    assert get('/api/image.png?period=week')[1].startswith(b'\x89PNG')
+
+    results = {}
+    assert get('/api/counts?start=2020-13-01')[0] == 400
+    for path in ('/api/counts?period=week', '/api/counts?start=2000-01-01', '/api/stats', '/api/top?n=10', '/'):
+        results[f'{path}_ms'] = round(time_per_call(lambda: get(path), repeat) / 1000, 2)
+
+    # Stream a burst of keys and check every one arrives, coalesced
+    events = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    events.request('GET', '/api/events', headers={'Host': f'127.0.0.1:{port}'})
+    stream = events.getresponse()
+    assert stream.status == 200
+    while not srv.hub.subscriber_count:
+        time.sleep(0.01)
+
+    sent = Counter(random.Random(3).choices(HISTORY_KEYS, k=keys))
+    start = time.perf_counter()
+    for key, count in sent.items():
+        for _ in range(count):
+            srv.publish(key)
+    received = Counter()
+    messages = 0
+    first_ms = None
+    while received != sent:
+        line = stream.fp.readline()
+        if line.startswith(b'data: '):
+            received.update(json.loads(line[6:]))
+            messages += 1
+            if first_ms is None:
+                first_ms = (time.perf_counter() - start) * 1000
+    events.close()
+    srv.stop()
+    database.close_connections()
+
+    assert received == sent, 'live deltas lost'
+    results.update({
+        'sse_keys': keys,
+        'sse_messages': messages,
+        'sse_first_event_ms': round(first_ms, 1),
+    })
+    return results
+
+
+def legacy_parse_key(key) -> str:
+    """KeyLogger._parse_key as it was before the precompiled tables."""
+    # Numpad virtual key codes (check first before char)
+    numpad_map = {
+        96: 'Num0', 97: 'Num1', 98: 'Num2', 99: 'Num3',
+        100: 'Num4', 101: 'Num5', 102: 'Num6', 103: 'Num7',
+        104: 'Num8', 105: 'Num9',
+        106: 'Num*', 107: 'Num+', 109: 'Num-',
+        110: 'Num.', 111: 'Num/',
+    }
+
+    # Check virtual key code first for numpad keys
+    if hasattr(key, 'vk') and key.vk is not None:
+        if key.vk in numpad_map:
+            return numpad_map[key.vk]
+
+    try:
+        # Regular character keys
+        if hasattr(key, 'char') and key.char is not None:
+            return key.char.lower()
+    except AttributeError:
+        pass
+
+    # Special keys
+    key_str = str(key)
+
+    # Handle Key.xxx format
+    if key_str.startswith('Key.'):
+        key_name = key_str[4:]  # Remove 'Key.' prefix
+
+        # Map common key names to display names
+        key_mapping = {
+            'space': 'Space',
+            'enter': 'Enter',
+            'backspace': 'Backspace',
+            'tab': 'Tab',
+            'shift': 'Shift',
+            'shift_r': 'Shift',
+            'ctrl': 'Ctrl',
+            'ctrl_l': 'Ctrl',
+            'ctrl_r': 'Ctrl',
+            'alt': 'Alt',
+            'alt_l': 'Alt',
+            'alt_r': 'Alt',
+            'alt_gr': 'AltGr',
+            'caps_lock': 'CapsLock',
+            'esc': 'Esc',
+            'delete': 'Delete',
+            'insert': 'Insert',
+            'home': 'Home',
+            'end': 'End',
+            'page_up': 'PageUp',
+            'page_down': 'PageDown',
+            'up': 'Up',
+            'down': 'Down',
+            'left': 'Left',
+            'right': 'Right',
+            'print_screen': 'PrtSc',
+            'scroll_lock': 'ScrLk',
+            'pause': 'Pause',
+            'num_lock': 'NumLock',
+            'menu': 'Menu',
+            'cmd': 'Win',
+            'cmd_l': 'Win',
+            'cmd_r': 'Win',
+            # Function keys
+            'f1': 'F1', 'f2': 'F2', 'f3': 'F3', 'f4': 'F4',
+            'f5': 'F5', 'f6': 'F6', 'f7': 'F7', 'f8': 'F8',
+            'f9': 'F9', 'f10': 'F10', 'f11': 'F11', 'f12': 'F12',
+            # Media keys
+            'media_play_pause': 'Play/Pause',
+            'media_next': 'Next',
+            'media_previous': 'Previous',
+            'media_volume_up': 'VolUp',
+            'media_volume_down': 'VolDown',
+            'media_volume_mute': 'Mute',
+        }
+
+        return key_mapping.get(key_name, key_name.title())
+
+    # Handle numpad and other special cases via string format
+    if '<' in key_str and '>' in key_str:
+        # Virtual key codes like <65437>
+        vk_code = key_str.strip('<>')
+        if vk_code.isdigit():
+            vk = int(vk_code)
+            if vk in numpad_map:
+                return numpad_map[vk]
+            return f'Key{vk}'
+
+    return key_str
+
+
+def bench_decode(events: int = 2_000_000) -> dict:
+    """Replay synthetic key objects through the old and new decoders."""
+    keys = replay.synthetic_keys(events)
+    try:
+        # Replay real pynput objects when a keyboard backend is available
+        from pynput.keyboard import Key, KeyCode
+        keys = [
+            Key[key.name] if isinstance(key, replay.FakeKey) else KeyCode(vk=key.vk, char=key.char)
+            for key in keys
+            if not isinstance(key, replay.FakeKey) or key.name in Key.__members__
+        ]
+    except ImportError:
+        pass
+
+    start = time.perf_counter()
+    legacy = [legacy_parse_key(key) for key in keys]
+    legacy_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    decoded = [logger.decode_key(key) for key in keys]
+    decoded_s = time.perf_counter() - start
+
+    mismatches = sum(1 for a, b in zip(legacy, decoded) if a != b)
+    assert mismatches == 0, f'{mismatches} keys decoded differently'
+
+    return {
+        'events': len(keys),
+        'legacy_ns_per_key': round(legacy_s / len(keys) * 1e9),
+        'decoded_ns_per_key': round(decoded_s / len(keys) * 1e9),
+        'speedup': round(legacy_s / decoded_s, 1),
+    }
+
+
+def bench_replay(events: int = 50_000, threads: int = 4, p99_budget_us: float = 100.0) -> dict:
+    """
+    Replay synthetic keystrokes through KeyLogger with the real scheduler:
+    flat out into a slow fake database, at a typing-like rate, and into
+    SQLite with the journal on. Fails if any keystroke is lost.
+    """
+    keys = replay.synthetic_keys(events)
+    runs = {
+        'fake': replay.replay(keys, threads, flush_delay=0.05, flush_threshold=5000),
+        'paced': replay.replay(keys[:2000], threads, rate=8000, flush_delay=0.05, flush_threshold=1000),
+        'sqlite': replay.replay(keys, threads, db='sqlite', flush_threshold=5000, journal=True),
+    }
+    results = {}
+    for name, run in runs.items():
+        assert run['lost'] == 0, f"{name}: lost {run['lost']} keystrokes"
+        assert run['p99_us'] <= p99_budget_us, f"{name}: p99 hook latency {run['p99_us']} us"
+        for metric in ('events_per_sec', 'p50_us', 'p99_us', 'max_us', 'flushes', 'flush_max_ms', 'stall_max_us'):
+            results[f'{name}/{metric}'] = run[metric]
+    return results
+
+
+def bench_metrics(events: int = 200_000, repeat: int = 2000) -> dict:
+    """
+    Cost of the runtime metrics: the keyboard hook and a database query
+    with metrics off and on, and a snapshot with everything filled in.
+    """
+    import metrics
+
+    use_temp_db()
+    fill_history(1)
+    keys = replay.synthetic_keys(events)
+    was_enabled = metrics.enabled
+    results = {}
+    try:
+        for state in ('off', 'on'):
+            metrics.enable(state == 'on')
+            metrics.reset()
+            run = replay.replay(keys, flush_threshold=5000)
+            assert run['lost'] == 0, f"lost {run['lost']} keystrokes"
+            results[f'hook_{state}_p50_us'] = run['p50_us']
+            results[f'hook_{state}_p99_us'] = run['p99_us']
+            results[f'events_per_sec_{state}'] = run['events_per_sec']
+            results[f'get_today_count_{state}_us'] = round(time_per_call(database.get_today_count, repeat), 2)
+
+        snapshot = metrics.snapshot()
+        assert snapshot['counters']['keys_captured'] == events
+        assert snapshot['histograms']['hook_latency_us']['count'] == events
+        assert snapshot['timings']['get_today_count']['calls'] == repeat
+        results['snapshot_us'] = round(time_per_call(metrics.snapshot, 200), 1)
+        assert report.build_report_data()['diagnostics']['queries']
+    finally:
+        metrics.enable(was_enabled)
+        metrics.reset()
+    if not was_enabled:
+        assert report.build_report_data()['diagnostics'] is None
+    return results
+
+
+def bench_tooltip(events: int = 100_000, threads: int = 2, repeat: int = 2000) -> dict:
+    """
+    The tooltip's in-memory count of today's keys: stays equal to the
+    database plus the buffer while keys are logged and flushed, without
+    reading the database after the seed.
+    """
+    use_temp_db()
+    fill_history(0.1)
+    key_logger = logger.KeyLogger()
+    key_logger.FLUSH_THRESHOLD = 3000
+    key_logger.seed_today()
+
+    reads = []
+    original = database.get_today_count
+
+    def counted_get_today_count():
+        reads.append(1)
+        return original()
+
+    keys = replay.synthetic_keys(events)
+
+    def type_keys():
+        for key in keys:
+            key_logger._on_release(key)
+
+    before = original()
+    database.get_today_count = counted_get_today_count
+    try:
+        key_logger.start_scheduler()
+        typists = [threading.Thread(target=type_keys) for _ in range(threads)]
+        for thread in typists:
+            thread.start()
+        for thread in typists:
+            thread.join()
+        key_logger.stop_scheduler()
+        live = key_logger.today_count
+        key_logger.flush()
+    finally:
+        database.get_today_count = original
+
+    expected = before + threads * events
+    assert not reads, f'{len(reads)} database reads after the seed'
+    assert live == expected, f'tooltip count {live}, expected {expected}'
+    assert key_logger.today_count == original() == expected
+    return {
+        'keys': threads * events,
+        'flushes': key_logger.stats['flushes'],
+        'db_reads': len(reads),
+        'today_count_us': round(time_per_call(lambda: key_logger.today_count, repeat), 2),
+        'get_today_count_us': round(time_per_call(database.get_today_count, repeat), 2),
+    }
+
+
+def bench_cache(years: int = 10, repeat: int = 200) -> dict:
+    """
+    The query read cache: report data and tooltip reads between flushes,
+    and invalidation by a flush and by the date changing.
+    """
+    use_temp_db()
+    fill_history(years)
+    uncached_report_us = time_per_call(report.build_report_data, 20)
+    uncached_today_us = time_per_call(database.get_today_count, repeat)
+
+    database.enable_query_cache()
+    try:
+        expected = report.build_report_data()
+        cached_report_us = time_per_call(report.build_report_data, repeat)
+        cached_today_us = time_per_call(database.get_today_count, repeat)
+        stats = database.get_query_cache_stats()
+        assert report.build_report_data() == expected
+
+        # Callers may modify what they get back without touching the cache
+        database.get_key_counts('all')['e'] += 10**6
+        assert database.get_key_counts('all') == Counter(expected['periods'][-1]['counts'])
+        gaps = list(database.get_streak_analysis()['gaps'])
+        database.get_streak_analysis()['gaps'].append(None)
+        assert database.get_streak_analysis()['gaps'] == gaps
+
+        # A flush invalidates every entry
+        today = database.get_today_count()
+        database.flush_counts(Counter(e=7))
+        assert database.get_today_count() == today + 7
+        assert database.get_key_counts('all')['e'] == expected['periods'][-1]['counts']['e'] + 7
+
+        # So does midnight, for the date-relative periods
+        class Tomorrow(date):
+            @classmethod
+            def today(cls):
+                return date.today() + timedelta(days=1)
+
+        database.date = Tomorrow
+        try:
+            assert database.get_today_count() == 0
+        finally:
+            database.date = date
+
+        for i in range(database.QUERY_CACHE_SIZE * 2):
+            day = date.today() - timedelta(days=i)
+            database.get_key_counts(start=day, end=day)
+        assert database.get_query_cache_stats()['size'] <= database.QUERY_CACHE_SIZE
+    finally:
+        database.enable_query_cache(False)
+
+    return {
+        'report_data_uncached_us': round(uncached_report_us, 1),
+        'report_data_cached_us': round(cached_report_us, 1),
+        'report_speedup': round(uncached_report_us / cached_report_us, 1),
+        'today_count_uncached_us': round(uncached_today_us, 2),
+        'today_count_cached_us': round(cached_today_us, 2),
+        'hits': stats['hits'],
+        'misses': stats['misses'],
+    }
+
+
+def range_counts_by_scan(start: date, end: date) -> Counter:
+    """get_key_counts(start=, end=) as it was before cumulative_counts: a BETWEEN scan."""
+    with database.get_manager().reader() as conn:
+        return Counter(dict(conn.execute('''
+            SELECT keys.name, SUM(counts.count)
+            FROM daily_counts AS counts JOIN keys ON keys.id = counts.key_id
+            WHERE counts.day BETWEEN ? AND ?
+            GROUP BY counts.key_id
+        ''', (start.toordinal(), end.toordinal())).fetchall()))
+
+
+def bench_ranges(years: int = 10, writes: int = 300, repeat: int = 50) -> dict:
+    """
+    Custom date ranges from the cumulative_counts prefix sums: checked
+    against a daily_counts scan after random (also back-dated and
+    multi-day) writes and a schema 2 upgrade, then timed by range length.
+    """
+    rng = random.Random(23)
+    use_temp_db()
+    fill_history(years)
+    today = date.today()
+    first = today - timedelta(days=int(years * 365))
+
+    def random_day():
+        return first + timedelta(days=rng.randrange((today - first).days + 1))
+
+    for _ in range(writes):
+        kind = rng.random()
+        counts = Counter({rng.choice(HISTORY_KEYS): rng.randint(1, 500) for _ in range(rng.randint(1, 5))})
+        if kind < 0.5:
+            database.flush_counts(counts)
+        elif kind < 0.9:
+            database.flush_counts(counts, day=random_day())
+        else:
+            database.flush_batches([(random_day(), counts) for _ in range(rng.randint(2, 40))])
+
+    drift = database.verify_rollups()
+    assert not any(drift.values()), f'rollups drifted: { {t: len(d) for t, d in drift.items() if d} }'
+    checks = [(today, today), (first, today), (first - timedelta(days=5), first)]
+    for _ in range(200):
+        start, end = sorted((random_day(), random_day()))
+        checks.append((start, end))
+    for start, end in checks:
+        assert database.get_key_counts(start=start, end=end) == range_counts_by_scan(start, end), (start, end)
+    for query in (lambda: database.get_key_counts(start=today, end=first),
+                  lambda: database.get_period_counts({'reversed': (today, first)})):
+        try:
+            query()
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('a reversed range was answered')
+    ranges = {'q': checks[3], 'r': checks[4]}
+    periods = database.get_period_counts(ranges)
+    assert periods['q'] == range_counts_by_scan(*checks[3]) and periods['r'] == range_counts_by_scan(*checks[4])
+
+    # A schema 2 database gets cumulative_counts on upgrade
+    with database.get_manager().writer() as conn:
+        conn.execute('DROP TABLE cumulative_counts')
+        conn.execute('PRAGMA user_version = 2')
+    start = time.perf_counter()
+    database.init_db(replay=False)
+    upgrade_ms = (time.perf_counter() - start) * 1000
+    assert not database.verify_rollups()['cumulative_counts']
+
+    results = {'checked_ranges': len(checks), 'upgrade_ms': round(upgrade_ms, 1)}
+    for label, days in (('90d', 90), ('1y', 365), ('all', None)):
+        start = first if days is None else today - timedelta(days=days - 1)
+        results[f'{label}_scan_us'] = round(time_per_call(lambda: range_counts_by_scan(start, today), repeat), 1)
+        results[f'{label}_prefix_us'] = round(
+            time_per_call(lambda: database.get_key_counts(start=start, end=today), repeat), 1)
+    results['flush_today_us'] = round(time_per_call(lambda: database.flush_counts(Counter(HISTORY_KEYS)), repeat), 1)
+    results['flush_year_ago_us'] = round(time_per_call(
+        lambda: database.flush_counts(Counter(HISTORY_KEYS), day=today - timedelta(days=365)), repeat), 1)
+    return results
+
+
+def bench_analytics(sizes=(1, 5, 10), seeds: int = 10, repeat: int = 20) -> dict:
+    """
+    The NumPy day x key matrix against the SQL queries: same statistics,
+    period counts and streaks on random histories and after incremental
+    flushes, then load time and per-query times on 1, 5 and 10 years.
+    """
+    if not analytics.available:
+        return {'skipped': 'NumPy not installed'}
+    rng = random.Random(24)
+    today = date.today()
+
+    def check(label):
+        ranges = {'r': tuple(sorted((today - timedelta(days=rng.randrange(800)),
+                                     today - timedelta(days=rng.randrange(800)))))}
+        for name, args in (('get_statistics', ()), ('get_period_counts', (ranges,)),
+                           ('get_streak_analysis', (None,))):
+            expected, actual = getattr(database, name)(*args), getattr(analytics, name)(*args)
+            assert actual == expected, f'{label}: {name} {actual} != {expected}'
+
+    for seed in range(seeds):
+        use_temp_db()
+        fill_history(rng.uniform(0, 2), seed=seed, active_ratio=rng.uniform(0.3, 1.0),
+                     end=today - timedelta(days=rng.choice([0, 0, 1, 5])))
+        check(f'seed {seed}')
+        # Appended by the flush listener: today, back-dated, before the first day, new keys
+        generation = analytics.get_matrix().generation
+        database.flush_counts(Counter(HISTORY_KEYS))
+        database.flush_counts(Counter({'Key.f13': 3}), day=today - timedelta(days=rng.randrange(400)))
+        database.flush_batches([(today - timedelta(days=rng.randrange(3000)), Counter({'a': 2, 'Key.f14': 1}))
+                                for _ in range(5)])
+        assert analytics.get_matrix().generation == generation + 3, 'matrix reloaded instead of appending'
+        check(f'seed {seed} after flushes')
+
+    results = {'equivalent_databases': seeds}
+    for years in sizes:
+        use_temp_db()
+        fill_history(years)
+        start = time.perf_counter()
+        analytics.get_matrix()
+        results[f'{years}y_load_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        for name in ('get_statistics', 'get_period_counts', 'get_streak_analysis'):
+            sql_us = time_per_call(getattr(database, name), repeat)
+            numpy_us = time_per_call(getattr(analytics, name), repeat)
+            results[f'{years}y_{name[4:]}_sql_us'] = round(sql_us, 1)
+            results[f'{years}y_{name[4:]}_numpy_us'] = round(numpy_us, 1)
+        for name in ('get_weekday_profile', 'get_rolling_average', 'get_key_trends'):
+            results[f'{years}y_{name[4:]}_numpy_us'] = round(time_per_call(getattr(analytics, name), repeat), 1)
+        results[f'{years}y_flush_append_us'] = round(
+            time_per_call(lambda: database.flush_counts(Counter(HISTORY_KEYS)), repeat), 1)
+    database.close_connections()
+    return results
+
+
+COMPACTION_FLUSH_BUDGET_MS = 100  # longest a flush may wait for a compaction batch
+
+
+def bench_compaction(years: int = 10, keep_days: int = 730, flush_interval: float = 0.005) -> dict:
+    """
+    Retention: fold everything older than keep_days into monthly rows and
+    check nothing the app shows changes (totals, months, per-day totals,
+    streaks, month-aligned ranges, the analytics matrix); then time it with
+    flushes running alongside, and on a database without auto_vacuum.
+    """
+    # HEATMAP_KEEP_DAYS never stops the app starting: bad values are reported
+    for value, days, warned in (('', None, False), ('0', None, False), ('400', 400, False),
+                                ('3', database.MIN_KEEP_DAYS, True), ('-5', None, True), ('2y', None, True)):
+        parsed, warning = database._parse_keep_days(value)
+        assert (parsed, bool(warning)) == (days, warned), f'HEATMAP_KEEP_DAYS={value!r}: {parsed}, {warning}'
+
+    db_path = use_temp_db()
+    fill_history(years)
+    today = date.today()
+    horizon = (today - timedelta(days=keep_days)).replace(day=1)
+    months = [(today - timedelta(days=days)).replace(day=1) for days in range(keep_days + 30, years * 365, 97)]
+    ranges = {f'{m:%Y-%m}': (m, (m + timedelta(days=31)).replace(day=1) - timedelta(days=1)) for m in months}
+    ranges['kept'] = (horizon, today)
+
+    def snapshot():
+        with database.get_manager().reader() as conn:
+            tables = {table: conn.execute(f'SELECT * FROM {table} ORDER BY 1, 2').fetchall()
+                      for table in ('key_totals', 'monthly_counts', 'day_totals')}
+        return {
+            'tables': {table: [tuple(row) for row in rows] for table, rows in tables.items()},
+            'statistics': database.get_statistics(),
+            'periods': database.get_period_counts(ranges),
+            'streaks': database.get_streak_analysis(None),
+        }
+
+    def file_pages():
+        with database.get_manager().writer() as conn:
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        return db_path.stat().st_size
+
+    expected = snapshot()
+    size_before = file_pages()
+    start = time.perf_counter()
+    result = database.compact_history(keep_days)
+    compact_s = time.perf_counter() - start
+    size_after = file_pages()
+    assert result['months'] and snapshot() == expected, 'compaction changed what the app shows'
+    assert not any(database.verify_rollups().values()), 'rollups drifted'
+    if analytics.available:
+        assert analytics.get_statistics() == expected['statistics']
+        assert analytics.get_period_counts(ranges) == expected['periods']
+        assert analytics.get_streak_analysis(None) == expected['streaks']
+
+    # Late writes into a folded month are folded by the next run
+    late = Counter({'e': 5, 'Key.f15': 2})
+    database.flush_counts(late, day=horizon - timedelta(days=400))
+    database.flush_counts(late)
+    assert database.compact_history(keep_days)['months'] == 1
+    expected_all = expected['periods']['all'] + late + late
+    assert database.get_key_counts('all') == expected_all
+    assert not any(database.verify_rollups().values()), 'rollups drifted after a late write'
+
+    # Flush latency while compacting in the background, as the app does it
+    use_temp_db()
+    fill_history(years)
+    waits, stop = [], threading.Event()
+
+    def flusher():
+        while not stop.is_set():
+            begin = time.perf_counter()
+            database.flush_counts(Counter(e=1))
+            waits.append(time.perf_counter() - begin)
+            time.sleep(flush_interval)
+
+    thread = threading.Thread(target=flusher)
+    thread.start()
+    time.sleep(0.2)
+    idle_waits, waits[:] = waits[:], []
+    start = time.perf_counter()
+    background = database.compact_history(keep_days, pause=flush_interval)
+    background_s = time.perf_counter() - start
+    stop.set()
+    thread.join()
+    assert max(waits) * 1000 <= COMPACTION_FLUSH_BUDGET_MS, \
+        f'a flush waited {max(waits) * 1000:.0f} ms for compaction, budget {COMPACTION_FLUSH_BUDGET_MS} ms'
+
+    # A database from before auto_vacuum: a one-time full VACUUM
+    use_temp_db()
+    fill_history(years)
+    with database.get_manager().writer() as conn:
+        conn.execute('PRAGMA auto_vacuum=NONE')
+        conn.execute('VACUUM')
+    start = time.perf_counter()
+    database.compact_history(keep_days)
+    convert_s = time.perf_counter() - start
+    with database.get_manager().writer() as conn:
+        assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+    database.close_connections()
+
+    return {
+        'months_folded': result['months'],
+        'rows_removed': result['rows'],
+        'file_kb_before': size_before // 1024,
+        'file_kb_after': size_after // 1024,
+        'compact_ms': round(compact_s * 1000, 1),
+        'ms_per_month': round(compact_s * 1000 / result['months'], 2),
+        'background_s': round(background_s, 2),
+        'flush_p50_idle_ms': round(percentile(idle_waits, 0.5) * 1000, 2),
+        'flush_p50_compacting_ms': round(percentile(waits, 0.5) * 1000, 2),
+        'flush_max_compacting_ms': round(max(waits) * 1000, 2),
+        'background_months': background['months'],
+        'first_run_with_vacuum_ms': round(convert_s * 1000, 1),
+    }
+
+
+BENCHMARKS = {
+    'connections': bench_connections,
+    'flush': bench_flush,
+    'ingest': bench_ingest,
+    'journal': bench_journal,
+    'scheduler': bench_scheduler,
+    'decode': bench_decode,
+    'replay': bench_replay,
+    'metrics': bench_metrics,
+    'tooltip': bench_tooltip,
+    'statistics': bench_statistics,
+    'streaks': bench_streaks,
+    'schema': bench_schema,
+    'report': bench_report,
+    'periods': bench_periods,
+    'cache': bench_cache,
+    'ranges': bench_ranges,
+    'analytics': bench_analytics,
+    'compaction': bench_compaction,
+    'render': bench_render,
+    'cli': bench_cli,
+    'startup': bench_startup,
+    'suite': bench_suite,
+    'server': bench_server,
+}
+
+
+def _environment() -> dict:
+    """Describe what the results were measured on, for comparing runs."""
+    import platform
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=Path(__file__).parent,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run heat map micro-benchmarks.')
+    parser.add_argument('names', nargs='*', metavar='name',
+                        help=f"benchmarks to run ({', '.join(BENCHMARKS)})")
+    parser.add_argument('--json', type=Path, metavar='FILE',
+                        help='also write the results as JSON, for comparing commits')
+    args = parser.parse_args()
+
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(unknown)}")
+
+    all_results = {}
+    for name in args.names or BENCHMARKS:
+        results = BENCHMARKS[name]()
+        all_results[name] = results
+        print(f'{name}:')
+        for metric, value in results.items():
+            print(f'    {metric:<36} {value}')
+
+    if args.json:
+        args.json.write_text(json.dumps({**_environment(), 'results': all_results}, indent=2), encoding='utf-8')
+
+
+if __name__ == '__main__':
+    main()
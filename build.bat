@@ -20,6 +20,13 @@ if errorlevel 1 (
 echo Generating icon...
 python "%~dp0icons.py"
 
+:: Fetch the offline report fonts and html2canvas (once)
+if not exist "%~dp0assets\report\html2canvas.min.js" (
+    echo Fetching report assets...
+    python "%~dp0report.py" --fetch-assets
+    if errorlevel 1 echo Could not fetch report assets; the report will use system fonts.
+)
+
 :: Build the executable
 pyinstaller --onefile --windowed --name "KeyboardHeatMap" --icon "%~dp0assets\icon.ico" --add-data "%~dp0assets;assets" "%~dp0main.pyw"
 
@@ -0,0 +1,189 @@
+"""
+Headless command line for the keyboard heat map.
+
+Reads the same database as the tray app without starting it, and prints JSON
+(default) or CSV. Only database.py is imported up front; subcommands import
+what they need, so polling `today` from a script stays cheap.
+
+Usage:
+    python -m cli today
+    python -m cli stats [--format csv]
+    python -m cli counts --period week
+    python -m cli counts --from 2025-01-01 --to 2025-01-31
+    python -m cli top -n 5
+    python -m cli export [--from DATE] [--to DATE] [--out FILE] [--format csv]
+    python -m cli render [--period all] [--days 30] [--out DIR]
+"""
+import argparse
+import json
+import sys
+from datetime import date
+
+import database
+
+PERIODS = ('today', 'week', 'month', 'all')
+
+
+def _open_database():
+    """
+    Open the database read-only and check it is current, without creating
+    or migrating it.
+
+    The CLI never calls database.init_db: a migration takes the write lock and
+    journal replay belongs to the running app.
+    """
+    if not database.get_db_path(create=False).exists():
+        sys.exit('No database yet. Start the app to begin tracking.')
+    database.open_read_only()
+    with database.get_manager().reader() as conn:
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+    if version != database.SCHEMA_VERSION:
+        sys.exit(f'Database schema is version {version}, expected {database.SCHEMA_VERSION}. '
+                 'Start the app once to upgrade it.')
+
+
+def _write(data, fmt: str, out=None, columns=None):
+    """
+    Print data as JSON, or as CSV rows.
+
+    For CSV, data is a list of rows and columns is the header.
+    """
+    out = out or sys.stdout
+    if fmt == 'csv':
+        import csv
+        writer = csv.writer(out, lineterminator='\n')
+        writer.writerow(columns)
+        writer.writerows(data)
+    else:
+        json.dump(data, out, indent=2 if out.isatty() else None)
+        out.write('\n')
+
+
+def _counts_rows(counts) -> list:
+    return [[key, count] for key, count in counts.most_common()]
+
+
+def cmd_today(args):
+    print(database.get_today_count())
+
+
+def cmd_stats(args):
+    stats = database.get_statistics()
+    if args.format == 'csv':
+        most_active = stats['most_active_day'] or (None, None)
+        rows = [
+            [name, value] for name, value in stats.items()
+            if name not in ('most_active_day', 'period_totals')
+        ]
+        rows += [['most_active_day', most_active[0]], ['most_active_day_count', most_active[1]]]
+        rows += [[f'{period}_total', total] for period, total in stats['period_totals'].items()]
+        _write(rows, 'csv', columns=['metric', 'value'])
+    else:
+        _write(stats, 'json')
+
+
+def cmd_counts(args):
+    if args.start or args.end:
+        counts = database.get_key_counts(start=args.start, end=args.end)
+    else:
+        counts = database.get_key_counts(args.period)
+    if args.format == 'csv':
+        _write(_counts_rows(counts), 'csv', columns=['key', 'count'])
+    else:
+        _write(dict(counts.most_common()), 'json')
+
+
+def cmd_top(args):
+    top = database.get_key_counts(args.period).most_common(args.n)
+    if args.format == 'csv':
+        _write([[rank, key, count] for rank, (key, count) in enumerate(top, 1)], 'csv',
+               columns=['rank', 'key', 'count'])
+    else:
+        _write([{'rank': rank, 'key': key, 'count': count} for rank, (key, count) in enumerate(top, 1)], 'json')
+
+
+def cmd_export(args):
+    days = database.get_daily_key_counts(args.start, args.end)
+    out = open(args.out, 'w', encoding='utf-8', newline='') if args.out else sys.stdout
+    try:
+        if args.format == 'csv':
+            rows = ([day.isoformat(), key, count] for day, counts in days for key, count in counts.items())
+            _write(rows, 'csv', out, columns=['day', 'key', 'count'])
+        else:
+            _write({day.isoformat(): counts for day, counts in days}, 'json', out)
+    finally:
+        if args.out:
+            out.close()
+
+
+def cmd_render(args):
+    from datetime import timedelta
+    from pathlib import Path
+
+    import render
+
+    out_dir = Path(args.out)
+    if args.days or args.start:
+        end = args.end or date.today()
+        start = args.start or end - timedelta(days=args.days - 1)
+        paths = render.export_days(out_dir, start, end, args.scale)
+    else:
+        paths = render.export_periods(out_dir, args.period, scale=args.scale)
+    _write([str(path) for path in paths], 'json')
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m cli', description='Query the keyboard heat map.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def add(name, func, help, fmt=True):
+        command = commands.add_parser(name, help=help)
+        command.set_defaults(func=func)
+        if fmt:
+            command.add_argument('--format', choices=['json', 'csv'], default='json')
+        return command
+
+    def add_range(command):
+        command.add_argument('--from', dest='start', type=date.fromisoformat, help='first day (YYYY-MM-DD)')
+        command.add_argument('--to', dest='end', type=date.fromisoformat, help='last day (default: today)')
+
+    add('today', cmd_today, 'print today\'s keystroke count', fmt=False)
+    add('stats', cmd_stats, 'print all statistics')
+
+    counts = add('counts', cmd_counts, 'print key counts for a period or date range')
+    counts.add_argument('--period', choices=PERIODS, default='all')
+    add_range(counts)
+
+    top = add('top', cmd_top, 'print the most pressed keys')
+    top.add_argument('-n', type=int, default=10, help='number of keys (default: 10)')
+    top.add_argument('--period', choices=PERIODS, default='all')
+
+    export = add('export', cmd_export, 'export per-day key counts')
+    export.add_argument('--out', help='output file (default: stdout)')
+    add_range(export)
+
+    render = add('render', cmd_render, 'export heat map images', fmt=False)
+    render.add_argument('--out', default='heatmaps', help='output folder (default: ./heatmaps)')
+    render.add_argument('--period', action='append', choices=PERIODS,
+                        help='period to export; repeatable (default: all four)')
+    render.add_argument('--days', type=int, help='export one image per day for the last DAYS days')
+    render.add_argument('--scale', type=int, default=2, help='pixels per CSS pixel (default: 2)')
+    add_range(render)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    _open_database()
+    try:
+        args.func(args)
+    except ValueError as e:
+        parser.error(str(e))  # e.g. --from after --to
+    except BrokenPipeError:
+        # Output piped into e.g. `head`; stop quietly
+        sys.stderr.close()
+
+
+if __name__ == '__main__':
+    main()
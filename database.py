@@ -1,225 +1,1291 @@
 import sqlite3
+import functools
 import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime, timedelta, date
-from collections import Counter
+from collections import Counter, OrderedDict
 from pathlib import Path
+from typing import Callable, Iterable, Iterator, NamedTuple, Optional, Union
 
+import journal
+import metrics
 
-def get_db_path() -> Path:
-    """Get the database path in AppData folder."""
+
+def get_db_path(create: bool = True) -> Path:
+    """Get the database path in AppData folder, creating the folder unless create is False."""
     appdata = os.environ.get('APPDATA', os.path.expanduser('~'))
     db_dir = Path(appdata) / 'KeyboardHeatMap'
-    db_dir.mkdir(parents=True, exist_ok=True)
+    if create:
+        db_dir.mkdir(parents=True, exist_ok=True)
     return db_dir / 'keystrokes.db'
 
 
-def get_connection() -> sqlite3.Connection:
-    """Get a database connection."""
-    conn = sqlite3.connect(get_db_path())
+def get_journal_dir() -> Path:
+    """Get the folder holding the keystroke journal segments."""
+    return get_db_path().parent / 'journal'
+
+
+def get_connection(db_path: Optional[Path] = None, read_only: bool = False) -> sqlite3.Connection:
+    """Open a new database connection with the standard pragmas applied."""
+    db_path = db_path or get_db_path()
+    if read_only:
+        # mode=ro never creates the file and fails any write
+        conn = sqlite3.connect(f'{Path(db_path).resolve().as_uri()}?mode=ro', uri=True, check_same_thread=False)
+    else:
+        conn = sqlite3.connect(db_path, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    for pragma in ConnectionManager.PRAGMAS:
+        conn.execute(pragma)
     return conn
 
 
-def init_db():
-    """Initialize the database schema."""
-    conn = get_connection()
-    cursor = conn.cursor()
+class ConnectionManager:
+    """
+    Keeps database connections open for the lifetime of the process.
+
+    A single writer connection is shared behind a lock, while readers are
+    checked out of a small pool. The database runs in WAL mode, so reads
+    from the report and tooltip never block a flush (and vice versa).
+    """
+
+    MAX_IDLE_READERS = 4
+
+    PRAGMAS = (
+        'PRAGMA synchronous=NORMAL',
+        'PRAGMA mmap_size=67108864',  # 64 MB
+        'PRAGMA cache_size=-8192',    # 8 MB
+        'PRAGMA temp_store=MEMORY',
+    )
+
+    def __init__(self, db_path: Optional[Path] = None, read_only: bool = False):
+        self.db_path = db_path or get_db_path()
+        self.read_only = read_only
+        self._writer: Optional[sqlite3.Connection] = None
+        self._writer_lock = threading.Lock()
+        self._idle_readers: list[sqlite3.Connection] = []
+        self._pool_lock = threading.Lock()
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """Use the shared writer connection; commits on success, rolls back on error."""
+        with self._writer_lock:
+            if self._writer is None:
+                if self.read_only:
+                    raise sqlite3.OperationalError('database is open read-only')
+                self._writer = get_connection(self.db_path)
+                # Only takes effect on a new, empty database; compact_history
+                # converts older ones
+                self._writer.execute('PRAGMA auto_vacuum=INCREMENTAL')
+                self._writer.execute('PRAGMA journal_mode=WAL')
+            try:
+                yield self._writer
+                self._writer.commit()
+            except BaseException:
+                self._writer.rollback()
+                raise
+            _bump_generation()
+
+    @contextmanager
+    def writes_paused(self) -> Iterator[None]:
+        """Hold off writers, so a read and get_generation() describe the same data."""
+        with self._writer_lock:
+            yield
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """Check out a reader connection from the pool for the current thread."""
+        with self._pool_lock:
+            conn = self._idle_readers.pop() if self._idle_readers else None
+        if conn is None:
+            conn = get_connection(self.db_path, self.read_only)
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            with self._pool_lock:
+                if len(self._idle_readers) < self.MAX_IDLE_READERS:
+                    self._idle_readers.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+
+    def close(self):
+        """Close the writer and all idle reader connections."""
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        with self._pool_lock:
+            for conn in self._idle_readers:
+                conn.close()
+            self._idle_readers.clear()
+
+
+_manager: Optional[ConnectionManager] = None
+_manager_lock = threading.Lock()
+
+# Bumped after every committed write, so readers can tell when data changed
+_generation = 0
+
+
+def _bump_generation():
+    global _generation
+    _generation += 1
 
+
+def get_generation() -> int:
+    """Get a counter that changes whenever data is written to the database."""
+    return _generation
+
+
+def get_manager() -> ConnectionManager:
+    """Get the process-wide connection manager, creating it on first use."""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = ConnectionManager()
+    return _manager
+
+
+def open_read_only():
+    """
+    Serve every query from read-only connections to the existing database.
+
+    For tools reading next to the app (cli.py): the database and its folder
+    are never created, and any write raises sqlite3.OperationalError.
+    """
+    global _manager
+    with _manager_lock:
+        if _manager is not None:
+            _manager.close()
+        _manager = ConnectionManager(get_db_path(create=False), read_only=True)
+    _key_ids.clear()
+    _bump_generation()
+
+
+def close_connections():
+    """Close all open connections. The next query reopens them."""
+    global _manager
+    with _manager_lock:
+        if _manager is not None:
+            _manager.close()
+            _manager = None
+    _key_ids.clear()
+    _bump_generation()
+
+
+# Bumped whenever init_db needs to migrate an existing database
+SCHEMA_VERSION = 4
+
+# Dates are stored as proleptic Gregorian ordinals (date.toordinal()).
+# Adding this offset turns an ordinal into a Julian day SQLite understands.
+JULIAN_OFFSET = 1721424.5
+
+# All counts ever recorded: daily_counts plus the months compact_history has
+# folded into archived_counts (one row per key, on the month's last day)
+HISTORY = '(SELECT day, key_id, count FROM daily_counts UNION ALL SELECT day, key_id, count FROM archived_counts)'
+
+# Rollup tables kept in step with daily_counts inside every flush transaction.
+# Each entry maps the table to the query that recomputes it from the history.
+ROLLUPS = {
+    'key_totals': f'SELECT key_id, SUM(count) FROM {HISTORY} GROUP BY key_id',
+    'monthly_counts': f'''
+        SELECT CAST(strftime('%Y%m', day + {JULIAN_OFFSET}) AS INTEGER) AS month, key_id, SUM(count)
+        FROM {HISTORY} GROUP BY month, key_id
+    ''',
+    'day_totals': '''
+        SELECT day, SUM(count)
+        FROM (SELECT day, count FROM daily_counts UNION ALL SELECT day, count FROM archived_day_totals)
+        GROUP BY day
+    ''',
+    'cumulative_counts': f'''
+        SELECT key_id, day, SUM(SUM(count)) OVER (PARTITION BY key_id ORDER BY day)
+        FROM {HISTORY} GROUP BY key_id, day
+    ''',
+}
+
+
+def _create_schema(cursor: sqlite3.Cursor):
+    """Create the current schema's tables and indexes if they don't exist."""
+    # Key names are stored once; every other table refers to them by id
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS keys (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+    ''')
+
+    # Clustered by day, so date-range scans read contiguous pages
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS daily_counts (
-            key TEXT NOT NULL,
-            date TEXT NOT NULL,
-            count INTEGER DEFAULT 0,
-            PRIMARY KEY (key, date)
+            day INTEGER NOT NULL,
+            key_id INTEGER NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, key_id)
+        ) WITHOUT ROWID
+    ''')
+
+    # Rollups: all-time per key, per key per month (YYYYMM), per day
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS key_totals (
+            key_id INTEGER PRIMARY KEY,
+            count INTEGER NOT NULL DEFAULT 0
         )
     ''')
 
     cursor.execute('''
-        CREATE INDEX IF NOT EXISTS idx_date ON daily_counts(date)
+        CREATE TABLE IF NOT EXISTS monthly_counts (
+            month INTEGER NOT NULL,
+            key_id INTEGER NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (month, key_id)
+        ) WITHOUT ROWID
     ''')
 
-    conn.commit()
-    conn.close()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS day_totals (
+            day INTEGER PRIMARY KEY,
+            count INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
 
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_day_totals_count ON day_totals(count DESC, day)
+    ''')
 
-def flush_counts(counts: Counter):
-    """
-    Flush buffered key counts to the database.
-    Uses UPSERT to increment existing counts or insert new rows.
+    # Prefix sums: each key's running total up to and including each day it
+    # was pressed, so any date range is two seeks per key
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cumulative_counts (
+            key_id INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            total INTEGER NOT NULL,
+            PRIMARY KEY (key_id, day)
+        ) WITHOUT ROWID
+    ''')
+
+    # Days before the retention horizon, folded by compact_history: per key
+    # per month (on the month's last day), and the per-day totals
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS archived_counts (
+            day INTEGER NOT NULL,
+            key_id INTEGER NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, key_id)
+        ) WITHOUT ROWID
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS archived_day_totals (
+            day INTEGER PRIMARY KEY,
+            count INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+    # Small integer settings, e.g. the last journal epoch committed
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS meta (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    ''')
+
+
+def _table_columns(conn: sqlite3.Connection, table: str) -> list[str]:
+    """Get the column names of a table (empty if it doesn't exist)."""
+    return [row['name'] for row in conn.execute(f'PRAGMA table_info({table})')]
+
+
+def _upgrade_to_v2(conn: sqlite3.Connection):
     """
-    if not counts:
-        return
+    Migrate a text-keyed database (schema 0 or 1) to integer keys and days.
 
-    today = date.today().isoformat()
-    conn = get_connection()
+    Runs in the caller's transaction, so a failure leaves the old schema intact.
+    """
     cursor = conn.cursor()
+    cursor.execute('ALTER TABLE daily_counts RENAME TO daily_counts_v1')
+    for table in ROLLUPS:
+        cursor.execute(f'DROP TABLE IF EXISTS {table}')
+    cursor.execute('DROP INDEX IF EXISTS idx_date')
+
+    _create_schema(cursor)
+    cursor.execute('INSERT OR IGNORE INTO keys (name) SELECT DISTINCT key FROM daily_counts_v1 ORDER BY key')
+    cursor.execute(f'''
+        INSERT INTO daily_counts (day, key_id, count)
+        SELECT CAST(julianday(v1.date) - {JULIAN_OFFSET} AS INTEGER), keys.id, SUM(v1.count)
+        FROM daily_counts_v1 AS v1 JOIN keys ON keys.name = v1.key
+        GROUP BY 1, 2
+    ''')
+    cursor.execute('DROP TABLE daily_counts_v1')
+    _rebuild_rollups(conn)
+
+
+def downgrade_schema():
+    """
+    Convert the database back to the text-keyed schema 1 layout, for
+    rolling back to an older release. The next init_db upgrades it again.
+
+    Months folded by compact_history come back as one day per month (the
+    last), so totals are unchanged but their days are not restored.
+    """
+    with get_manager().writer() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        cursor = conn.cursor()
+        cursor.execute('ALTER TABLE daily_counts RENAME TO daily_counts_v2')
+        for table in ROLLUPS:
+            cursor.execute(f'DROP TABLE IF EXISTS {table}')
 
-    for key, count in counts.items():
         cursor.execute('''
+            CREATE TABLE daily_counts (
+                key TEXT NOT NULL,
+                date TEXT NOT NULL,
+                count INTEGER DEFAULT 0,
+                PRIMARY KEY (key, date)
+            )
+        ''')
+        cursor.execute('CREATE INDEX idx_date ON daily_counts(date)')
+        cursor.execute(f'''
             INSERT INTO daily_counts (key, date, count)
-            VALUES (?, ?, ?)
-            ON CONFLICT(key, date) DO UPDATE SET count = count + excluded.count
-        ''', (key, today, count))
+            SELECT keys.name, date(v2.day + {JULIAN_OFFSET}), SUM(v2.count)
+            FROM (SELECT * FROM daily_counts_v2 UNION ALL SELECT * FROM archived_counts) AS v2
+            JOIN keys ON keys.id = v2.key_id
+            GROUP BY v2.day, v2.key_id
+        ''')
+        cursor.execute('DROP TABLE daily_counts_v2')
+        cursor.execute('DROP TABLE archived_counts')
+        cursor.execute('DROP TABLE archived_day_totals')
+        cursor.execute('DROP TABLE keys')
+
+        cursor.execute('CREATE TABLE key_totals (key TEXT PRIMARY KEY, count INTEGER NOT NULL DEFAULT 0)')
+        cursor.execute('INSERT INTO key_totals SELECT key, SUM(count) FROM daily_counts GROUP BY key')
+        cursor.execute('''
+            CREATE TABLE monthly_counts (
+                key TEXT NOT NULL,
+                month TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (month, key)
+            )
+        ''')
+        cursor.execute('''
+            INSERT INTO monthly_counts
+            SELECT key, substr(date, 1, 7), SUM(count) FROM daily_counts GROUP BY 1, 2
+        ''')
+        cursor.execute('CREATE TABLE day_totals (date TEXT PRIMARY KEY, count INTEGER NOT NULL DEFAULT 0)')
+        cursor.execute('INSERT INTO day_totals SELECT date, SUM(count) FROM daily_counts GROUP BY date')
+        cursor.execute('CREATE INDEX idx_day_totals_count ON day_totals(count DESC, date)')
+        cursor.execute('PRAGMA user_version = 1')
+
+    _key_ids.clear()
+
+
+def init_db(replay: bool = True):
+    """
+    Initialize the database schema, migrating older layouts in place.
+
+    Args:
+        replay: Apply leftover journal segments. Only the process that owns
+            the journal (the tray app) should do this; a tool running next
+            to the app would commit counts the app is still going to flush,
+            so replay_journal also skips a journal another process holds.
+    """
+    with get_manager().writer() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+
+        if version < 2 and 'key' in _table_columns(conn, 'daily_counts'):
+            _upgrade_to_v2(conn)
+        else:
+            _create_schema(conn.cursor())
+            if version == 2:
+                # Schema 3 adds cumulative_counts
+                _rebuild_rollups(conn, ['cumulative_counts'])
+            # Schema 4 adds the archive tables, created above
+
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    _key_ids.clear()
+    if replay:
+        replay_journal()
+
+
+def get_journal_epoch() -> int:
+    """Get the last journal epoch whose counts are committed to the database."""
+    with get_manager().reader() as conn:
+        row = conn.execute("SELECT value FROM meta WHERE name = 'journal_epoch'").fetchone()
+    return row['value'] if row else 0
+
+
+@metrics.timed
+def replay_journal() -> int:
+    """
+    Apply journal segments left behind by a crash and delete them.
+
+    Epochs at or below the committed journal epoch are already in the
+    database and are only deleted, so replaying twice is harmless. Nothing
+    is replayed while a running KeyLogger (in any process) holds the journal.
+
+    Returns:
+        Number of keystrokes recovered
+    """
+    directory = get_journal_dir()
+    segments = journal.read_segments(directory)
+    if not segments:
+        return 0
+    owner = journal.acquire_owner(directory)
+    if owner is None:
+        return 0  # Live segments of a running app, which commits them itself
+
+    try:
+        committed = get_journal_epoch()
+        pending = {epoch: records for epoch, records in segments.items() if epoch > committed}
+        recovered = 0
+        if pending:
+            batches = [
+                (date.fromordinal(day), deltas)
+                for epoch in sorted(pending)
+                for day, deltas in pending[epoch]
+            ]
+            recovered = sum(sum(deltas.values()) for _, deltas in batches)
+            flush_batches(batches, journal_epoch=max(pending))
+
+        journal.remove_segments(directory, max(segments))
+    finally:
+        owner.close()
+    return recovered
+
+
+UPSERT_SQL = '''
+    INSERT INTO daily_counts (day, key_id, count)
+    VALUES (?, ?, ?)
+    ON CONFLICT(day, key_id) DO UPDATE SET count = count + excluded.count
+'''
+
+KEY_TOTALS_UPSERT_SQL = '''
+    INSERT INTO key_totals (key_id, count)
+    VALUES (?, ?)
+    ON CONFLICT(key_id) DO UPDATE SET count = count + excluded.count
+'''
+
+MONTHLY_UPSERT_SQL = '''
+    INSERT INTO monthly_counts (month, key_id, count)
+    VALUES (?, ?, ?)
+    ON CONFLICT(month, key_id) DO UPDATE SET count = count + excluded.count
+'''
+
+DAY_TOTALS_UPSERT_SQL = '''
+    INSERT INTO day_totals (day, count)
+    VALUES (?, ?)
+    ON CONFLICT(day) DO UPDATE SET count = count + excluded.count
+'''
+
+# Prefix sums after a (day, key_id, count) delta: later days shift by the
+# delta, and the day's own row is created from the running total before it
+CUMULATIVE_SHIFT_SQL = '''
+    UPDATE cumulative_counts SET total = total + ?3 WHERE key_id = ?2 AND day > ?1
+'''
+
+CUMULATIVE_UPSERT_SQL = '''
+    INSERT INTO cumulative_counts (key_id, day, total)
+    VALUES (?2, ?1, ?3 + IFNULL((
+        SELECT total FROM cumulative_counts WHERE key_id = ?2 AND day < ?1 ORDER BY day DESC LIMIT 1
+    ), 0))
+    ON CONFLICT(key_id, day) DO UPDATE SET total = total + ?3
+'''
+
+# Batches spanning more days than this rebuild cumulative_counts instead,
+# since every back-dated delta shifts all of its key's later rows
+CUMULATIVE_REBUILD_DAYS = 31
+
+# Key name -> id, filled as keys are written or read
+_key_ids: dict[str, int] = {}
+
+
+def _resolve_key_ids(conn: sqlite3.Connection, names: Iterable[str]) -> dict[str, int]:
+    """Get ids for key names, adding unknown names to the keys table."""
+    ids = {name: _key_ids[name] for name in names if name in _key_ids}
+    missing = [name for name in names if name not in ids]
+    if missing:
+        conn.executemany('INSERT OR IGNORE INTO keys (name) VALUES (?)', ((name,) for name in missing))
+        placeholders = ', '.join('?' * len(missing))
+        for row in conn.execute(f'SELECT id, name FROM keys WHERE name IN ({placeholders})', missing):
+            ids[row['name']] = row['id']
+    return ids
+
+
+class FlushResult(NamedTuple):
+    """Outcome of a flush: rows upserted and seconds spent writing."""
+    rows: int
+    seconds: float
+
+
+def _to_ordinal(day: Union[date, str]) -> int:
+    """Convert a date or ISO date string to its stored ordinal."""
+    return (date.fromisoformat(day) if isinstance(day, str) else day).toordinal()
+
+
+def _month_of(day: int) -> int:
+    """Get the YYYYMM month number of a stored day ordinal."""
+    value = date.fromordinal(day)
+    return value.year * 100 + value.month
+
+
+JOURNAL_EPOCH_SQL = '''
+    INSERT INTO meta (name, value)
+    VALUES ('journal_epoch', ?)
+    ON CONFLICT(name) DO UPDATE SET value = MAX(value, excluded.value)
+'''
+
+
+# Called after every committed flush_batches with its (day, key_id, count)
+# rows, {key_id: name} for those keys and the generation the flush produced,
+# e.g. to keep analytics.py's in-memory matrix current
+flush_listeners: list[Callable[[list[tuple[int, int, int]], dict[int, str], int], None]] = []
+
+
+@metrics.timed
+def flush_batches(batches: Iterable[tuple[Union[date, str], Counter]],
+                  journal_epoch: Optional[int] = None) -> FlushResult:
+    """
+    Flush several dated Counters to the database in one transaction.
+
+    Args:
+        batches: (date, counts) pairs; dates may be date objects or ISO strings
+        journal_epoch: Journal epoch these counts complete, recorded in the
+            same transaction so the journal is never replayed twice
+
+    Returns:
+        FlushResult with the number of rows written and the elapsed time
+    """
+    start = time.perf_counter()
+    batches = [(_to_ordinal(day), counts) for day, counts in batches if counts]
+    if not batches:
+        if journal_epoch is not None:
+            with get_manager().writer() as conn:
+                conn.execute(JOURNAL_EPOCH_SQL, (journal_epoch,))
+        return FlushResult(0, 0.0)
+    names = {key for _, counts in batches for key in counts}
+
+    with get_manager().writer() as conn:
+        # Writes are serialized, so committing this one bumps the generation to:
+        generation = _generation + 1
+        key_ids = _resolve_key_ids(conn, names)
+        rows = [
+            (day, key_ids[key], count)
+            for day, counts in batches
+            for key, count in counts.items()
+        ]
+
+        # Pre-aggregate the rollup deltas so each rollup row is touched once
+        months = {day: _month_of(day) for day, _ in batches}
+        key_totals = Counter()
+        monthly = Counter()
+        day_totals = Counter()
+        for day, key_id, count in rows:
+            key_totals[key_id] += count
+            monthly[(months[day], key_id)] += count
+            day_totals[day] += count
+
+        # Only back-dated deltas have later prefix-sum rows to shift
+        latest_day = conn.execute('SELECT MAX(day) FROM day_totals').fetchone()[0]
+        back_dated = latest_day is not None and min(months) < latest_day
+
+        # The statement texts are constant, so sqlite3 reuses their prepared form
+        conn.executemany(UPSERT_SQL, rows)
+        conn.executemany(KEY_TOTALS_UPSERT_SQL, key_totals.items())
+        conn.executemany(MONTHLY_UPSERT_SQL, ((month, key_id, count) for (month, key_id), count in monthly.items()))
+        conn.executemany(DAY_TOTALS_UPSERT_SQL, day_totals.items())
+        if len(months) > CUMULATIVE_REBUILD_DAYS:
+            _rebuild_rollups(conn, ['cumulative_counts'])
+        else:
+            # All shifts first, so they only touch rows that existed before
+            # this flush; then new rows in day order, each from the one before
+            rows.sort()
+            if back_dated:
+                conn.executemany(CUMULATIVE_SHIFT_SQL, rows)
+            conn.executemany(CUMULATIVE_UPSERT_SQL, rows)
+        if journal_epoch is not None:
+            conn.execute(JOURNAL_EPOCH_SQL, (journal_epoch,))
+
+    # Only cache ids once the transaction that created them has committed
+    _key_ids.update(key_ids)
+    if metrics.enabled:
+        metrics.count('rows_upserted', len(rows))
+    if flush_listeners:
+        names_by_id = {key_id: name for name, key_id in key_ids.items()}
+        for listener in flush_listeners:
+            listener(rows, names_by_id, generation)
+    return FlushResult(len(rows), time.perf_counter() - start)
+
+
+def flush_counts(counts: Counter, day: Optional[date] = None,
+                 journal_epoch: Optional[int] = None) -> FlushResult:
+    """
+    Flush buffered key counts to the database.
+    Uses UPSERT to increment existing counts or insert new rows.
+    """
+    return flush_batches([(day or date.today(), counts)], journal_epoch=journal_epoch)
+
+
+def _rebuild_rollups(conn: sqlite3.Connection, tables: Optional[Iterable[str]] = None):
+    """Recompute rollup tables (default: all) from the history on the given connection."""
+    for table in tables or ROLLUPS:
+        conn.execute(f'DELETE FROM {table}')
+        conn.execute(f'INSERT INTO {table} {ROLLUPS[table]}')
+
+
+def rebuild_rollups():
+    """Recompute the rollup tables from the history in one transaction."""
+    with get_manager().writer() as conn:
+        _rebuild_rollups(conn)
+
+
+def verify_rollups() -> dict:
+    """
+    Compare every rollup table against the history.
+
+    Returns:
+        Dict mapping table name to a list of (row key, expected, actual)
+        tuples for each drifted row; empty lists mean the rollup is exact
+    """
+    drift = {}
+    with get_manager().reader() as conn:
+        for table, query in ROLLUPS.items():
+            expected = {tuple(row[:-1]): row[-1] for row in conn.execute(query)}
+            actual = {tuple(row[:-1]): row[-1] for row in conn.execute(f'SELECT * FROM {table}')}
+            drift[table] = [
+                (row_key, expected.get(row_key, 0), actual.get(row_key, 0))
+                for row_key in sorted(expected.keys() | actual.keys())
+                if expected.get(row_key, 0) != actual.get(row_key, 0)
+            ]
+    return drift
+
 
-    conn.commit()
-    conn.close()
+MIN_KEEP_DAYS = 7  # this week's counts are always read per day
 
 
-def get_key_counts(period: str = 'all') -> Counter:
+def _parse_keep_days(value: Optional[str]) -> tuple[Optional[int], Optional[str]]:
+    """
+    Parse a HEATMAP_KEEP_DAYS value without ever failing.
+
+    Returns:
+        (days to keep or None for all, warning for the user or None); a
+        value that isn't a whole number keeps everything, one below
+        MIN_KEEP_DAYS is raised to it
+    """
+    if not value or not value.strip():
+        return None, None
+    try:
+        days = int(value)
+    except ValueError:
+        days = -1
+    if days < 0:
+        return None, f'HEATMAP_KEEP_DAYS={value.strip()} is not a number of days; keeping all history.'
+    if days == 0:
+        return None, None
+    if days < MIN_KEEP_DAYS:
+        return MIN_KEEP_DAYS, f'HEATMAP_KEEP_DAYS={days} is below the minimum; keeping {MIN_KEEP_DAYS} days.'
+    return days, None
+
+
+# Days of per-day detail compact_history keeps (HEATMAP_KEEP_DAYS); older
+# months are folded into archived_counts. None keeps every day. A bad value
+# is reported once through KEEP_DAYS_WARNING (main.pyw shows it).
+KEEP_DAYS, KEEP_DAYS_WARNING = _parse_keep_days(os.environ.get('HEATMAP_KEEP_DAYS'))
+COMPACT_VACUUM_PAGES = 256  # free pages handed back to the filesystem per step
+
+ARCHIVE_COUNTS_SQL = '''
+    INSERT INTO archived_counts (day, key_id, count)
+    SELECT :end, key_id, SUM(count) FROM daily_counts
+    WHERE day BETWEEN :start AND :end
+    GROUP BY key_id
+    ON CONFLICT(day, key_id) DO UPDATE SET count = count + excluded.count
+'''
+
+ARCHIVE_DAY_TOTALS_SQL = '''
+    INSERT INTO archived_day_totals (day, count)
+    SELECT day, SUM(count) FROM daily_counts
+    WHERE day BETWEEN :start AND :end
+    GROUP BY day
+    ON CONFLICT(day) DO UPDATE SET count = count + excluded.count
+'''
+
+# Each key's running total on the month's last day replaces its rows for the
+# month; one primary key range per key, since the table is clustered by key
+FOLD_CUMULATIVE_SQL = '''
+    INSERT INTO cumulative_counts (key_id, day, total)
+    SELECT keys.id, :end, MAX(c.total)
+    FROM keys CROSS JOIN cumulative_counts AS c
+    WHERE c.key_id = keys.id AND c.day BETWEEN :start AND :end
+    GROUP BY keys.id
+    ON CONFLICT(key_id, day) DO UPDATE SET total = excluded.total
+'''
+
+DELETE_CUMULATIVE_SQL = '''
+    DELETE FROM cumulative_counts
+    WHERE key_id IN (SELECT id FROM keys) AND day >= :start AND day < :end
+'''
+
+
+@metrics.timed
+def compact_month(day: date) -> int:
+    """
+    Fold the daily_counts rows of the month holding day into archived_counts,
+    in one short write transaction.
+
+    key_totals, monthly_counts and day_totals don't change; cumulative_counts
+    keeps each key's running total at the end of the month, so ranges over
+    compacted months are exact to the month.
+
+    Returns:
+        Number of daily_counts rows removed
+    """
+    start = day.replace(day=1)
+    end = (start + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+    params = {'start': start.toordinal(), 'end': end.toordinal()}
+    with get_manager().writer() as conn:
+        conn.execute(ARCHIVE_COUNTS_SQL, params)
+        conn.execute(ARCHIVE_DAY_TOTALS_SQL, params)
+        conn.execute(FOLD_CUMULATIVE_SQL, params)
+        conn.execute(DELETE_CUMULATIVE_SQL, params)
+        return conn.execute('DELETE FROM daily_counts WHERE day BETWEEN :start AND :end', params).rowcount
+
+
+def _vacuum_step() -> int:
+    """Release up to COMPACT_VACUUM_PAGES free pages; returns how many were released."""
+    with get_manager().writer() as conn:
+        before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        # Frees one page per step of the statement, so run it to completion
+        conn.execute(f'PRAGMA incremental_vacuum({COMPACT_VACUUM_PAGES})').fetchall()
+        return before - conn.execute('PRAGMA freelist_count').fetchone()[0]
+
+
+def compact_history(keep_days: Optional[int] = KEEP_DAYS, pause: float = 0.0,
+                    stop: Optional[threading.Event] = None) -> dict:
+    """
+    Apply the retention policy: fold every month that ended more than
+    keep_days ago into monthly archive rows, oldest first, then return the
+    space to the filesystem with incremental vacuum.
+
+    Each month and each vacuum step is its own short transaction, so a flush
+    waits for one batch at most. All-time, monthly and per-day totals are
+    unchanged; per-key detail for compacted days is only kept per month.
+
+    A database created before auto_vacuum was enabled gets a one-time full
+    VACUUM after its first compaction; after that, space is released
+    incrementally.
+
+    Args:
+        keep_days: Days of per-day detail to keep (at least MIN_KEEP_DAYS);
+            None does nothing
+        pause: Seconds to wait between batches, to leave the writer to flushes
+        stop: Event that ends the work early, between batches
+
+    Returns:
+        Dict with 'months' compacted, daily 'rows' removed and 'pages_freed'
+    """
+    result = {'months': 0, 'rows': 0, 'pages_freed': 0}
+    if keep_days is None:
+        return result
+    if keep_days < MIN_KEEP_DAYS:
+        raise ValueError(f'keep_days must be at least {MIN_KEEP_DAYS}')
+    horizon = (date.today() - timedelta(days=keep_days)).replace(day=1).toordinal()
+
+    def wait() -> bool:
+        """Pause between batches; True once stop is set."""
+        if stop is not None:
+            return stop.wait(pause)
+        if pause:
+            time.sleep(pause)
+        return False
+
+    while True:
+        with get_manager().reader() as conn:
+            oldest = conn.execute('SELECT MIN(day) FROM daily_counts').fetchone()[0]
+        if oldest is None or oldest >= horizon:
+            break
+        result['rows'] += compact_month(date.fromordinal(oldest))
+        result['months'] += 1
+        result['pages_freed'] += _vacuum_step()
+        if wait():
+            return result
+
+    # Asked on the writer: reader connections keep the mode they opened with
+    with get_manager().writer() as conn:
+        incremental = conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+        if not incremental and result['months']:
+            before = conn.execute('PRAGMA page_count').fetchone()[0]
+            conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            conn.execute('VACUUM')
+            result['pages_freed'] += before - conn.execute('PRAGMA page_count').fetchone()[0]
+    while incremental:
+        freed = _vacuum_step()
+        result['pages_freed'] += freed
+        if not freed or wait():
+            break
+
+    # Let the file shrink now rather than at the next automatic checkpoint
+    with get_manager().reader() as conn:
+        conn.execute('PRAGMA wal_checkpoint(PASSIVE)')
+    return result
+
+
+# Read cache: results of the get_* queries below, stamped with the data
+# generation and date they were computed under. Off unless this process does
+# all the writing, since writes from another process don't bump _generation.
+QUERY_CACHE_SIZE = 128  # entries; custom date ranges would otherwise grow it without bound
+_query_cache: OrderedDict = OrderedDict()
+_query_cache_lock = threading.Lock()
+_query_cache_enabled = False
+_query_cache_stats = Counter()
+
+
+def enable_query_cache(on: bool = True):
+    """
+    Cache query results until the next write or day rollover.
+
+    Only for the process that makes every write to the database (the tray
+    app); tools reading next to it must keep querying.
+    """
+    global _query_cache_enabled
+    with _query_cache_lock:
+        _query_cache_enabled = on
+        _query_cache.clear()
+
+
+def get_query_cache_stats() -> dict:
+    """Get read cache hits, misses and current size."""
+    with _query_cache_lock:
+        return {
+            'enabled': _query_cache_enabled,
+            'hits': _query_cache_stats['hits'],
+            'misses': _query_cache_stats['misses'],
+            'size': len(_query_cache),
+        }
+
+
+def _copy_result(value):
+    """Copy the mutable parts of a cached result so callers can't alter the cache."""
+    if isinstance(value, Counter):
+        return value.copy()
+    if isinstance(value, dict):
+        return {k: _copy_result(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy_result(v) for v in value]
+    return value
+
+
+def _freeze(value):
+    """Make a query argument hashable for the cache key."""
+    if isinstance(value, dict):
+        return tuple(sorted(value.items()))
+    return value
+
+
+def _cached(func):
+    """
+    Serve repeated calls from the read cache while it is enabled.
+
+    Entries are stamped with (generation, today) when the query starts: any
+    committed write, a database switch or midnight (for the date-relative
+    periods) makes them stale.
+    """
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _query_cache_enabled:
+            return func(*args, **kwargs)
+        key = (name, tuple(map(_freeze, args)), tuple(sorted((k, _freeze(v)) for k, v in kwargs.items())))
+        stamp = (_generation, date.today())
+        with _query_cache_lock:
+            entry = _query_cache.get(key)
+            if entry is not None and entry[0] == stamp:
+                _query_cache.move_to_end(key)
+                _query_cache_stats['hits'] += 1
+                return _copy_result(entry[1])
+            _query_cache_stats['misses'] += 1
+
+        value = func(*args, **kwargs)
+        with _query_cache_lock:
+            # A write during the query leaves the entry stale, never wrong
+            _query_cache[key] = (stamp, value)
+            _query_cache.move_to_end(key)
+            while len(_query_cache) > QUERY_CACHE_SIZE:
+                _query_cache.popitem(last=False)
+        return _copy_result(value)
+
+    return wrapper
+
+
+def _period_start(period: str) -> date:
+    """Get the first day of a 'today', 'week' or 'month' period."""
+    today = date.today()
+    if period == 'week':
+        # Week starts on Monday
+        return today - timedelta(days=today.weekday())
+    if period == 'month':
+        return today.replace(day=1)
+    return today
+
+
+def _range_total_sql(key_id: str, start: str, end: str) -> str:
+    """
+    SQL for one key's count over [start, end]: the running total at end
+    minus the running total before start, each one cumulative_counts seek.
+
+    Args:
+        key_id: Column holding the key id
+        start: Parameter holding the first day's ordinal
+        end: Parameter holding the last day's ordinal
+    """
+    running_total = f"""IFNULL((
+        SELECT total FROM cumulative_counts
+        WHERE key_id = {key_id} AND day {{}} ORDER BY day DESC LIMIT 1
+    ), 0)"""
+    return f"{running_total.format('<= ' + end)} - {running_total.format('< ' + start)}"
+
+
+def _check_range(start: date, end: date):
+    """Reject a reversed range, whose prefix-sum difference would be negative."""
+    if start > end:
+        raise ValueError(f'start {start} is after end {end}')
+
+
+def _iso(day: Optional[int]) -> Optional[str]:
+    """Convert a stored day ordinal back to an ISO date string."""
+    return date.fromordinal(day).isoformat() if day is not None else None
+
+
+@_cached
+@metrics.timed
+def get_key_counts(period: str = 'all', start: Optional[date] = None,
+                   end: Optional[date] = None) -> Counter:
     """
     Get key press counts for a given time period.
 
     Args:
         period: 'today', 'week', 'month', or 'all'
+        start: First day of a custom range (overrides period)
+        end: Last day of a custom range, inclusive (defaults to today)
+
+    Months folded by compact_history count on their last day, so ranges
+    reaching into them are exact to the month only.
 
     Returns:
         Counter object with key counts
-    """
-    conn = get_connection()
-    cursor = conn.cursor()
 
-    today = date.today()
+    Raises:
+        ValueError: If start is after end
+    """
+    if start is not None:
+        _check_range(start, end or date.today())
+    with get_manager().reader() as conn:
+        cursor = conn.cursor()
 
-    if period == 'today':
-        cursor.execute(
-            'SELECT key, SUM(count) as total FROM daily_counts WHERE date = ? GROUP BY key',
-            (today.isoformat(),)
-        )
-    elif period == 'week':
-        # Week starts on Monday
-        days_since_monday = today.weekday()
-        start = today - timedelta(days=days_since_monday)
-        cursor.execute(
-            'SELECT key, SUM(count) as total FROM daily_counts WHERE date >= ? GROUP BY key',
-            (start.isoformat(),)
-        )
-    elif period == 'month':
-        start = today.replace(day=1)
-        cursor.execute(
-            'SELECT key, SUM(count) as total FROM daily_counts WHERE date >= ? GROUP BY key',
-            (start.isoformat(),)
-        )
-    else:  # all
-        cursor.execute('SELECT key, SUM(count) as total FROM daily_counts GROUP BY key')
+        if start is not None or end is not None:
+            cursor.execute(
+                f"SELECT keys.name AS key, {_range_total_sql('keys.id', ':start', ':end')} AS total FROM keys",
+                {'start': start.toordinal() if start else 0, 'end': (end or date.today()).toordinal()},
+            )
+        elif period == 'today':
+            cursor.execute('''
+                SELECT keys.name AS key, counts.count AS total
+                FROM daily_counts AS counts JOIN keys ON keys.id = counts.key_id
+                WHERE counts.day = ?
+            ''', (date.today().toordinal(),))
+        elif period == 'week':
+            cursor.execute('''
+                SELECT keys.name AS key, SUM(counts.count) AS total
+                FROM daily_counts AS counts JOIN keys ON keys.id = counts.key_id
+                WHERE counts.day >= ?
+                GROUP BY counts.key_id
+            ''', (_period_start('week').toordinal(),))
+        elif period == 'month':
+            cursor.execute('''
+                SELECT keys.name AS key, counts.count AS total
+                FROM monthly_counts AS counts JOIN keys ON keys.id = counts.key_id
+                WHERE counts.month = ?
+            ''', (_month_of(date.today().toordinal()),))
+        else:  # all
+            cursor.execute('''
+                SELECT keys.name AS key, totals.count AS total
+                FROM key_totals AS totals JOIN keys ON keys.id = totals.key_id
+            ''')
 
-    counts = Counter()
-    for row in cursor.fetchall():
-        counts[row['key']] = row['total']
+        counts = Counter()
+        for row in cursor.fetchall():
+            if row['total']:
+                counts[row['key']] = row['total']
 
-    conn.close()
     return counts
 
 
-def get_total_keystrokes(period: str = 'all') -> int:
-    """Get total keystroke count for a given time period."""
-    conn = get_connection()
-    cursor = conn.cursor()
+@metrics.timed
+def get_daily_key_counts(start: Optional[date] = None, end: Optional[date] = None) -> list[tuple[date, Counter]]:
+    """
+    Get key counts for every tracked day in a range, in one query.
 
-    today = date.today()
+    Args:
+        start: First day, inclusive (default: the first tracked day)
+        end: Last day, inclusive (default: today)
+
+    Returns:
+        [(day, Counter)] in date order; days without keystrokes, and days
+        folded by compact_history, are omitted
+    """
+    with get_manager().reader() as conn:
+        cursor = conn.execute('''
+            SELECT counts.day, keys.name, counts.count
+            FROM daily_counts AS counts JOIN keys ON keys.id = counts.key_id
+            WHERE counts.day BETWEEN ? AND ?
+            ORDER BY counts.day
+        ''', (start.toordinal() if start else 0, (end or date.today()).toordinal()))
+        cursor.row_factory = None
+        rows = cursor.fetchall()
+
+    days = []
+    for day, name, count in rows:
+        if not days or days[-1][0] != day:
+            days.append((day, Counter()))
+        days[-1][1][name] = count
+    return [(date.fromordinal(day), counts) for day, counts in days]
 
-    if period == 'today':
-        cursor.execute(
-            'SELECT SUM(count) FROM daily_counts WHERE date = ?',
-            (today.isoformat(),)
-        )
-    elif period == 'week':
-        days_since_monday = today.weekday()
-        start = today - timedelta(days=days_since_monday)
-        cursor.execute(
-            'SELECT SUM(count) FROM daily_counts WHERE date >= ?',
-            (start.isoformat(),)
-        )
-    elif period == 'month':
-        start = today.replace(day=1)
-        cursor.execute(
-            'SELECT SUM(count) FROM daily_counts WHERE date >= ?',
-            (start.isoformat(),)
-        )
-    else:
-        cursor.execute('SELECT SUM(count) FROM daily_counts')
 
-    result = cursor.fetchone()[0]
-    conn.close()
+PERIOD_COUNTS_SQL = f'''
+    SELECT keys.name, today.count,
+           {_range_total_sql('totals.key_id', ':week_start', ':today')},
+           monthly.count, totals.count
+           {{range_columns}}
+    FROM key_totals AS totals
+    JOIN keys ON keys.id = totals.key_id
+    LEFT JOIN daily_counts AS today
+        ON today.day = :today AND today.key_id = totals.key_id
+    LEFT JOIN monthly_counts AS monthly
+        ON monthly.month = :month AND monthly.key_id = totals.key_id
+'''
+
+
+@_cached
+@metrics.timed
+def get_period_counts(ranges: Optional[dict[str, tuple[date, date]]] = None) -> dict[str, Counter]:
+    """
+    Get key counts for today, this week, this month and all time at once.
+
+    All periods come from a single query of primary key lookups per key:
+    today, month and all-time counts are one row each, the week and custom
+    ranges are two cumulative_counts seeks, so nothing scans daily_counts.
+
+    Args:
+        ranges: Extra custom periods as {name: (start, end)}, both inclusive
+
+    Returns:
+        {period: Counter} for 'today', 'week', 'month', 'all' and every range
+
+    Raises:
+        ValueError: If a range starts after it ends
+    """
+    ranges = ranges or {}
+    for start, end in ranges.values():
+        _check_range(start, end)
+    today = date.today().toordinal()
+    params = {
+        'today': today,
+        'week_start': _period_start('week').toordinal(),
+        'month': _month_of(today),
+    }
+    range_columns = []
+    for i, (start, end) in enumerate(ranges.values()):
+        params[f'start_{i}'] = start.toordinal()
+        params[f'end_{i}'] = end.toordinal()
+        range_columns.append(f", {_range_total_sql('totals.key_id', f':start_{i}', f':end_{i}')}")
+    sql = PERIOD_COUNTS_SQL.format(range_columns=''.join(range_columns))
+
+    # Result columns after the key name, in SELECT order
+    counters = [Counter() for _ in range(4 + len(ranges))]
+    with get_manager().reader() as conn:
+        cursor = conn.execute(sql, params)
+        cursor.row_factory = None  # plain tuples; sqlite3.Row lookups dominate otherwise
+        for name, *totals in cursor:
+            for counts, total in zip(counters, totals):
+                if total:
+                    counts[name] = total
+
+    return dict(zip(['today', 'week', 'month', 'all', *ranges], counters))
+
+
+@_cached
+@metrics.timed
+def get_total_keystrokes(period: str = 'all') -> int:
+    """Get total keystroke count for a given time period."""
+    with get_manager().reader() as conn:
+        if period in ('today', 'week', 'month'):
+            result = conn.execute(
+                'SELECT SUM(count) FROM day_totals WHERE day >= ?',
+                (_period_start(period).toordinal(),)
+            ).fetchone()[0]
+        else:
+            result = conn.execute('SELECT SUM(count) FROM key_totals').fetchone()[0]
+
     return result or 0
 
 
+@_cached
+@metrics.timed
 def get_today_count() -> int:
     """Quick helper to get today's keystroke count for tooltip."""
     return get_total_keystrokes('today')
 
 
+@_cached
+@metrics.timed
 def get_tracking_start_date() -> str | None:
     """Get the earliest date in the database (when tracking started)."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT MIN(date) FROM daily_counts')
-    result = cursor.fetchone()[0]
-    conn.close()
-    return result
+    with get_manager().reader() as conn:
+        result = conn.execute('SELECT MIN(day) FROM day_totals').fetchone()[0]
+    return _iso(result)
 
 
+@_cached
+@metrics.timed
 def get_days_tracked() -> int:
     """Get the number of unique days with recorded data."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT COUNT(DISTINCT date) FROM daily_counts')
-    result = cursor.fetchone()[0]
-    conn.close()
+    with get_manager().reader() as conn:
+        result = conn.execute('SELECT COUNT(*) FROM day_totals').fetchone()[0]
     return result or 0
 
 
+@_cached
+@metrics.timed
 def get_most_active_day() -> tuple[str, int] | None:
     """Get the day with the highest keystroke count."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT date, SUM(count) as total
-        FROM daily_counts
-        GROUP BY date
-        ORDER BY total DESC
-        LIMIT 1
-    ''')
-    result = cursor.fetchone()
-    conn.close()
+    with get_manager().reader() as conn:
+        result = conn.execute('''
+            SELECT day, count as total
+            FROM day_totals
+            ORDER BY total DESC, day
+            LIMIT 1
+        ''').fetchone()
     if result:
-        return (result['date'], result['total'])
+        return (_iso(result['day']), result['total'])
     return None
 
 
+# Walks back from today one day at a time through the day_totals primary
+# key, stopping at the first gap: the cost is the streak length, not the history
+STREAK_CTE = '''
+    streak(day) AS (
+        SELECT :today WHERE EXISTS (SELECT 1 FROM day_totals WHERE day = :today)
+        UNION ALL
+        SELECT day - 1 FROM streak
+        WHERE EXISTS (SELECT 1 FROM day_totals WHERE day = streak.day - 1)
+    )
+'''
+
+# Gaps-and-islands in one pass: an island starts on a day whose previous day
+# is missing (a primary key probe), and ends on the last day before the next
+# start. Gaps are the stretches between consecutive islands.
+ISLANDS_SQL = '''
+    WITH starts AS (
+        SELECT day, LEAD(day) OVER (ORDER BY day) AS next
+        FROM day_totals AS d
+        WHERE NOT EXISTS (SELECT 1 FROM day_totals WHERE day = d.day - 1)
+    )
+    SELECT
+        day AS start,
+        (SELECT MAX(day) FROM day_totals WHERE day < IFNULL(starts.next, 9223372036854775807)) AS end
+    FROM starts
+    ORDER BY day
+'''
+
+
+@_cached
+@metrics.timed
 def get_current_streak() -> int:
     """Get the current consecutive days streak."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT DISTINCT date FROM daily_counts ORDER BY date DESC')
-    dates = [row['date'] for row in cursor.fetchall()]
-    conn.close()
+    with get_manager().reader() as conn:
+        result = conn.execute(
+            f'WITH RECURSIVE {STREAK_CTE} SELECT COUNT(*) FROM streak',
+            {'today': date.today().toordinal()}
+        ).fetchone()[0]
+    return result
 
-    if not dates:
-        return 0
 
-    streak = 0
-    today = date.today()
-    check_date = today
-
-    for date_str in dates:
-        recorded_date = date.fromisoformat(date_str)
-        if recorded_date == check_date:
-            streak += 1
-            check_date -= timedelta(days=1)
-        elif recorded_date < check_date:
-            # Gap found, streak ends
-            break
+@_cached
+@metrics.timed
+def get_streak_analysis(max_gaps: Optional[int] = 10) -> dict:
+    """
+    Analyze tracking streaks and the gaps between them.
+
+    Args:
+        max_gaps: Return at most this many gaps (longest first); None for all
+
+    Returns:
+        Dict with 'current_streak' (days), 'longest_streak' as a
+        (days, start, end) tuple or None, and 'gaps' as a list of
+        (start, end, days) tuples for untracked stretches
+    """
+    with get_manager().reader() as conn:
+        current = conn.execute(
+            f'WITH RECURSIVE {STREAK_CTE} SELECT COUNT(*) FROM streak',
+            {'today': date.today().toordinal()}
+        ).fetchone()[0]
+        islands = [(row['start'], row['end']) for row in conn.execute(ISLANDS_SQL)]
 
-    return streak
+    # Ties go to the most recent streak or gap
+    longest = max(islands, key=lambda island: (island[1] - island[0], island[0]), default=None)
+    gaps = sorted(((end + 1, start - 1) for (_, end), (start, _) in zip(islands, islands[1:])),
+                  key=lambda gap: (gap[1] - gap[0], gap[0]), reverse=True)
+    if max_gaps is not None:
+        gaps = gaps[:max_gaps]
+
+    return {
+        'current_streak': current,
+        'longest_streak': (longest[1] - longest[0] + 1, _iso(longest[0]), _iso(longest[1])) if longest else None,
+        'gaps': [(_iso(start), _iso(end), end - start + 1) for start, end in gaps],
+    }
+
+
+# One statement; every part is answered from a rollup primary key or index
+STATISTICS_SQL = f'''
+    WITH RECURSIVE {STREAK_CTE}
+    SELECT
+        (SELECT SUM(count) FROM key_totals) AS total,
+        (SELECT COUNT(*) FROM day_totals) AS days,
+        (SELECT MIN(day) FROM day_totals) AS start_day,
+        top.day AS top_day,
+        top.count AS top_count,
+        (SELECT COUNT(*) FROM streak) AS streak,
+        (SELECT SUM(count) FROM day_totals WHERE day = :today) AS today_total,
+        (SELECT SUM(count) FROM day_totals WHERE day >= :week_start) AS week_total,
+        (SELECT SUM(count) FROM day_totals WHERE day >= :month_start) AS month_total
+    FROM (SELECT 1)
+    LEFT JOIN (SELECT day, count FROM day_totals ORDER BY count DESC, day LIMIT 1) AS top
+'''
 
 
+@_cached
+@metrics.timed
 def get_statistics() -> dict:
-    """Get all statistics for the heat map report."""
-    total = get_total_keystrokes('all')
-    days = get_days_tracked()
-    start_date = get_tracking_start_date()
-    most_active = get_most_active_day()
-    streak = get_current_streak()
+    """
+    Get all statistics for the heat map report.
+
+    Everything is computed in a single query against the rollup tables.
+    """
+    params = {
+        'today': date.today().toordinal(),
+        'week_start': _period_start('week').toordinal(),
+        'month_start': _period_start('month').toordinal(),
+    }
+    with get_manager().reader() as conn:
+        row = conn.execute(STATISTICS_SQL, params).fetchone()
+
+    total = row['total'] or 0
+    days = row['days']
 
     # Calculate averages
     keys_per_day = round(total / days) if days > 0 else 0
@@ -228,10 +1294,48 @@ def get_statistics() -> dict:
 
     return {
         'total_keystrokes': total,
-        'tracking_since': start_date,
+        'tracking_since': _iso(row['start_day']),
         'days_tracked': days,
         'keys_per_day': keys_per_day,
         'keys_per_hour': keys_per_hour,
-        'most_active_day': most_active,
-        'current_streak': streak,
+        'most_active_day': (_iso(row['top_day']), row['top_count']) if days else None,
+        'current_streak': row['streak'] or 0,
+        'period_totals': {
+            'today': row['today_total'] or 0,
+            'week': row['week_total'] or 0,
+            'month': row['month_total'] or 0,
+        },
     }
+
+
+def main():
+    """Command line maintenance for the database."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Keyboard Heat Map database maintenance.')
+    parser.add_argument('command', choices=['verify', 'rebuild', 'downgrade'],
+                        help='verify: report rollup drift; rebuild: recompute rollups from daily_counts; '
+                             'downgrade: convert to the schema used by releases before 0.8')
+    args = parser.parse_args()
+
+    # Journal replay belongs to the tray app, which may be running
+    init_db(replay=False)
+    if args.command == 'downgrade':
+        downgrade_schema()
+        print('Database converted to schema 1.')
+        return
+
+    if args.command == 'rebuild':
+        rebuild_rollups()
+        print('Rollups rebuilt.')
+
+    drift = verify_rollups()
+    for table, rows in drift.items():
+        print(f'{table}: {len(rows)} drifted row(s)')
+        for row_key, expected, actual in rows[:20]:
+            print(f"    {', '.join(map(str, row_key))}: expected {expected}, found {actual}")
+    sys.exit(1 if any(drift.values()) else 0)
+
+
+if __name__ == '__main__':
+    main()
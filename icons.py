@@ -1,3 +1,4 @@
+from functools import lru_cache
 from PIL import Image, ImageDraw
 from pathlib import Path
 
@@ -54,15 +55,17 @@ def create_keyboard_icon(size: int = 64, active: bool = True) -> Image.Image:
     return img
 
 
+@lru_cache(maxsize=None)
 def get_active_icon() -> Image.Image:
-    """Get the active (recording) tray icon."""
+    """Get the active (recording) tray icon, rendered once."""
     return create_gradient_icon(128)
 
 
+@lru_cache(maxsize=None)
 def get_paused_icon() -> Image.Image:
-    """Get the paused (not recording) tray icon."""
-    # Create gradient icon and convert to grayscale
-    img = create_gradient_icon(128)
+    """Get the paused (not recording) tray icon, rendered once."""
+    # Start from the active icon and convert to grayscale
+    img = get_active_icon()
     # Convert to grayscale while preserving alpha
     gray = img.convert('LA').convert('RGBA')
     return gray
@@ -0,0 +1,196 @@
+"""
+Append-only journal of keystroke count deltas.
+
+KeyLogger appends the counts it has buffered since the last checkpoint, so a
+crash between database flushes loses at most one checkpoint interval. Every
+flush starts a new epoch with its own segment file; once an epoch's counts
+are committed to SQLite (together with the epoch number) its segment is
+deleted, and database.init_db replays whatever segments are left over.
+
+A Journal holds an OS lock on the directory's owner file for as long as it
+is open, and replay skips a directory another journal still holds: that
+process commits its own segments, and replaying them would count them twice.
+The OS drops the lock when the holder exits, crashed or not.
+
+Record layout (little endian):
+    header:  day ordinal (u32), entry count (u16)
+    entries: name length (u8), count (u32), UTF-8 name
+    trailer: CRC32 of header and entries (u32)
+A torn write at the end of a segment fails its CRC and is ignored.
+"""
+import os
+import struct
+import time
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+HEADER = struct.Struct('<IH')
+ENTRY = struct.Struct('<BI')
+TRAILER = struct.Struct('<I')
+
+SEGMENT_SUFFIX = '.khj'
+OWNER_FILE = 'owner.lock'
+MAX_ENTRIES = 0xFFFF
+
+FSYNC_POLICIES = ('always', 'interval', 'never')
+
+
+def _segment_path(directory: Path, epoch: int) -> Path:
+    return directory / f'{epoch:012d}{SEGMENT_SUFFIX}'
+
+
+def encode_record(day: int, deltas: Counter) -> bytes:
+    """Encode one batch of count deltas for a single day."""
+    parts = []
+    for name, count in deltas.items():
+        encoded = name.encode('utf-8')[:255]
+        parts.append(ENTRY.pack(len(encoded), count))
+        parts.append(encoded)
+    body = HEADER.pack(day, len(deltas)) + b''.join(parts)
+    return body + TRAILER.pack(zlib.crc32(body))
+
+
+def decode_records(data: bytes) -> list[tuple[int, Counter]]:
+    """Decode a segment's records, stopping at the first torn or corrupt one."""
+    records = []
+    offset = 0
+    while offset + HEADER.size <= len(data):
+        start = offset
+        day, entries = HEADER.unpack_from(data, offset)
+        offset += HEADER.size
+        deltas = Counter()
+        try:
+            for _ in range(entries):
+                length, count = ENTRY.unpack_from(data, offset)
+                offset += ENTRY.size
+                name = data[offset:offset + length]
+                if len(name) != length:
+                    return records
+                deltas[name.decode('utf-8')] += count
+                offset += length
+            (crc,) = TRAILER.unpack_from(data, offset)
+        except (struct.error, UnicodeDecodeError):
+            return records
+        if crc != zlib.crc32(data[start:offset]):
+            return records
+        offset += TRAILER.size
+        records.append((day, deltas))
+    return records
+
+
+def read_segments(directory: Path) -> dict[int, list[tuple[int, Counter]]]:
+    """Read every segment in a journal directory, keyed by epoch."""
+    segments = {}
+    if not directory.is_dir():
+        return segments
+    for path in sorted(directory.glob(f'*{SEGMENT_SUFFIX}')):
+        try:
+            epoch = int(path.stem)
+        except ValueError:
+            continue
+        segments[epoch] = decode_records(path.read_bytes())
+    return segments
+
+
+def remove_segments(directory: Path, up_to_epoch: int):
+    """Delete every segment with an epoch at or below up_to_epoch."""
+    if not directory.is_dir():
+        return
+    for path in directory.glob(f'*{SEGMENT_SUFFIX}'):
+        try:
+            if int(path.stem) <= up_to_epoch:
+                path.unlink(missing_ok=True)
+        except (ValueError, OSError):
+            pass
+
+
+def acquire_owner(directory: Path) -> Optional[BinaryIO]:
+    """
+    Lock a journal directory for this handle without blocking.
+
+    Returns:
+        The open owner file, whose closing releases the lock, or None if
+        another journal holds it
+    """
+    file = open(directory / OWNER_FILE, 'wb')
+    try:
+        if os.name == 'nt':
+            import msvcrt
+            msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        file.close()
+        return None
+    return file
+
+
+class Journal:
+    """Writes count deltas for the current epoch to its segment file."""
+
+    def __init__(self, directory: Path, fsync: str = 'interval', fsync_interval: float = 5.0):
+        """
+        Args:
+            directory: Folder holding the segment files
+            fsync: 'always' (every append), 'interval' (at most every
+                fsync_interval seconds) or 'never' (leave it to the OS)
+            fsync_interval: Seconds between fsyncs for the 'interval' policy
+        """
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {', '.join(FSYNC_POLICIES)}")
+        self.directory = directory
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.epoch: Optional[int] = None
+        self._file: Optional[BinaryIO] = None
+        self._last_fsync = 0.0
+        directory.mkdir(parents=True, exist_ok=True)
+        # Not fatal if another journal holds it: capture goes on regardless
+        self._owner = acquire_owner(directory)
+
+    def start_epoch(self, epoch: int):
+        """Close the current segment and start appending to a new epoch's."""
+        self.close()
+        self.epoch = epoch
+        self._file = open(_segment_path(self.directory, epoch), 'ab')
+
+    def append(self, day: int, deltas: Counter):
+        """Append count deltas for a day to the current segment."""
+        if not deltas or self._file is None:
+            return
+        items = list(deltas.items())
+        for i in range(0, len(items), MAX_ENTRIES):
+            self._file.write(encode_record(day, Counter(dict(items[i:i + MAX_ENTRIES]))))
+        self._file.flush()
+
+        now = time.monotonic()
+        if self.fsync == 'always' or (self.fsync == 'interval' and now - self._last_fsync >= self.fsync_interval):
+            os.fsync(self._file.fileno())
+            self._last_fsync = now
+
+    def discard(self, epoch: int):
+        """
+        Delete the segment of an epoch whose counts have been committed to the
+        database, and any earlier ones kept while flushes were failing.
+        """
+        if self.epoch is not None and self.epoch <= epoch:
+            self.close()
+        remove_segments(self.directory, epoch)
+
+    def close(self):
+        """Close the current segment file, syncing it unless fsync is 'never'."""
+        if self._file is not None:
+            if self.fsync != 'never':
+                os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+    def release(self):
+        """Close the current segment and give up the directory's owner lock."""
+        self.close()
+        if self._owner is not None:
+            self._owner.close()
+            self._owner = None
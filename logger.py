@@ -1,172 +1,450 @@
-from pynput import keyboard
 from typing import Callable, Optional
 from collections import Counter
+from datetime import date, datetime, timedelta
 import threading
+import time
 import database
+import journal
+import metrics
+
+
+# Numpad virtual key codes (checked before the character)
+NUMPAD_MAP = {
+    96: 'Num0', 97: 'Num1', 98: 'Num2', 99: 'Num3',
+    100: 'Num4', 101: 'Num5', 102: 'Num6', 103: 'Num7',
+    104: 'Num8', 105: 'Num9',
+    106: 'Num*', 107: 'Num+', 109: 'Num-',
+    110: 'Num.', 111: 'Num/',
+}
+
+# pynput Key names mapped to display names
+KEY_NAME_MAP = {
+    'space': 'Space',
+    'enter': 'Enter',
+    'backspace': 'Backspace',
+    'tab': 'Tab',
+    'shift': 'Shift',
+    'shift_r': 'Shift',
+    'ctrl': 'Ctrl',
+    'ctrl_l': 'Ctrl',
+    'ctrl_r': 'Ctrl',
+    'alt': 'Alt',
+    'alt_l': 'Alt',
+    'alt_r': 'Alt',
+    'alt_gr': 'AltGr',
+    'caps_lock': 'CapsLock',
+    'esc': 'Esc',
+    'delete': 'Delete',
+    'insert': 'Insert',
+    'home': 'Home',
+    'end': 'End',
+    'page_up': 'PageUp',
+    'page_down': 'PageDown',
+    'up': 'Up',
+    'down': 'Down',
+    'left': 'Left',
+    'right': 'Right',
+    'print_screen': 'PrtSc',
+    'scroll_lock': 'ScrLk',
+    'pause': 'Pause',
+    'num_lock': 'NumLock',
+    'menu': 'Menu',
+    'cmd': 'Win',
+    'cmd_l': 'Win',
+    'cmd_r': 'Win',
+    # Function keys
+    'f1': 'F1', 'f2': 'F2', 'f3': 'F3', 'f4': 'F4',
+    'f5': 'F5', 'f6': 'F6', 'f7': 'F7', 'f8': 'F8',
+    'f9': 'F9', 'f10': 'F10', 'f11': 'F11', 'f12': 'F12',
+    # Media keys
+    'media_play_pause': 'Play/Pause',
+    'media_next': 'Next',
+    'media_previous': 'Previous',
+    'media_volume_up': 'VolUp',
+    'media_volume_down': 'VolDown',
+    'media_volume_mute': 'Mute',
+}
+
+DECODE_CACHE_SIZE = 1024
+
+# Decoded names keyed by (vk, char) for KeyCode objects and by the member for Key
+_decoded: dict = {}
+_NO_VK = object()
+
+
+def _decode_uncached(key) -> str:
+    """Decode a pynput key object the slow way."""
+    vk = getattr(key, 'vk', None)
+    if vk is not None and vk in NUMPAD_MAP:
+        return NUMPAD_MAP[vk]
+
+    char = getattr(key, 'char', None)
+    if char is not None:
+        return char.lower()
+
+    key_str = str(key)
+
+    # Handle Key.xxx format
+    if key_str.startswith('Key.'):
+        key_name = key_str[4:]
+        return KEY_NAME_MAP.get(key_name, key_name.title())
+
+    # Virtual key codes like <65437>
+    if '<' in key_str and '>' in key_str:
+        vk_code = key_str.strip('<>')
+        if vk_code.isdigit():
+            vk = int(vk_code)
+            return NUMPAD_MAP.get(vk, f'Key{vk}')
+
+    return key_str
+
+
+def decode_key(key) -> str:
+    """
+    Decode a pynput key object into a readable string.
+
+    The result only depends on the key's (vk, char), or on the Key member
+    for special keys, so decoded names are memoized in a bounded cache.
+    """
+    vk = getattr(key, 'vk', _NO_VK)
+    ident = key if vk is _NO_VK else (vk, key.char)
+    try:
+        return _decoded[ident]
+    except KeyError:
+        pass
+
+    name = _decode_uncached(key)
+    if len(_decoded) >= DECODE_CACHE_SIZE:
+        _decoded.clear()
+    _decoded[ident] = name
+    return name
 
 
 class KeyLogger:
-    """Handles keyboard event capture and logging with buffered writes."""
+    """
+    Handles keyboard event capture and logging with buffered writes.
+
+    Counts go into one of two buffers. The keyboard hook only ever touches
+    the active buffer; a flush swaps in the spare under buffer_lock (an
+    O(1) reference swap) and writes the retired buffer with no lock held
+    that the hook could wait on.
+
+    Between flushes, checkpoints append newly buffered counts to an on-disk
+    journal (see journal.py), so a crash only loses the last checkpoint
+    interval. Each flush starts a new journal epoch and commits the retired
+    epoch's number together with its counts.
 
-    FLUSH_INTERVAL = 30  # seconds
+    A single scheduler thread decides when to flush: once FLUSH_THRESHOLD
+    keystrokes are buffered, once the oldest is FLUSH_MAX_AGE seconds old,
+    FLUSH_IDLE seconds after typing stops, or at midnight. While the buffer
+    is empty the thread sleeps without a timeout.
+    """
+
+    FLUSH_THRESHOLD = 5000  # keystrokes
+    FLUSH_MAX_AGE = 300  # seconds
+    FLUSH_IDLE = 30  # seconds without new keystrokes
+    JOURNAL_INTERVAL = 1  # seconds between journal checkpoints
+    JOURNAL_FSYNC = 'interval'  # 'always', 'interval' or 'never'
 
     def __init__(self):
-        self.listener: Optional[keyboard.Listener] = None
+        self.listener = None
         self.paused = False
         self.buffer = Counter()
-        self.buffer_lock = threading.Lock()
-        self.flush_timer: Optional[threading.Timer] = None
+        self._spare_buffer = Counter()
+        self._pending = 0  # keystrokes in the active buffer
+        self.buffer_lock = threading.Lock()  # guards increments and the swap only
+        self.flush_lock = threading.Lock()   # serializes flushes
         self.on_key_logged: Optional[Callable[[str], None]] = None
+        self.last_flush: Optional[database.FlushResult] = None
+        self.journal: Optional[journal.Journal] = None
+        self.journal_epoch = 0
+        self._journaled = Counter()  # active buffer counts already in the journal
+        self._in_flight = 0  # keystrokes swapped out by a flush and not yet written
+        self._today: Optional[date] = None  # day _today_flushed counts, once seeded
+        self._today_flushed = 0  # keystrokes in the database for that day
+        self.scheduler: Optional[threading.Thread] = None
+        self._wake = threading.Event()
+        self._stopping = False
+        self.stats = {
+            'flushes': 0,
+            'rows_written': 0,
+            'keystrokes_written': 0,
+            'flush_seconds': 0.0,
+            'flush_reasons': Counter(),
+            'checkpoints': 0,
+            'checkpoint_errors': 0,
+            'scheduler_wakeups': 0,
+        }
 
     def _parse_key(self, key) -> str:
         """Parse a pynput key object into a readable string."""
-        # Numpad virtual key codes (check first before char)
-        numpad_map = {
-            96: 'Num0', 97: 'Num1', 98: 'Num2', 99: 'Num3',
-            100: 'Num4', 101: 'Num5', 102: 'Num6', 103: 'Num7',
-            104: 'Num8', 105: 'Num9',
-            106: 'Num*', 107: 'Num+', 109: 'Num-',
-            110: 'Num.', 111: 'Num/',
-        }
-
-        # Check virtual key code first for numpad keys
-        if hasattr(key, 'vk') and key.vk is not None:
-            if key.vk in numpad_map:
-                return numpad_map[key.vk]
-
-        try:
-            # Regular character keys
-            if hasattr(key, 'char') and key.char is not None:
-                return key.char.lower()
-        except AttributeError:
-            pass
-
-        # Special keys
-        key_str = str(key)
-
-        # Handle Key.xxx format
-        if key_str.startswith('Key.'):
-            key_name = key_str[4:]  # Remove 'Key.' prefix
-
-            # Map common key names to display names
-            key_mapping = {
-                'space': 'Space',
-                'enter': 'Enter',
-                'backspace': 'Backspace',
-                'tab': 'Tab',
-                'shift': 'Shift',
-                'shift_r': 'Shift',
-                'ctrl': 'Ctrl',
-                'ctrl_l': 'Ctrl',
-                'ctrl_r': 'Ctrl',
-                'alt': 'Alt',
-                'alt_l': 'Alt',
-                'alt_r': 'Alt',
-                'alt_gr': 'AltGr',
-                'caps_lock': 'CapsLock',
-                'esc': 'Esc',
-                'delete': 'Delete',
-                'insert': 'Insert',
-                'home': 'Home',
-                'end': 'End',
-                'page_up': 'PageUp',
-                'page_down': 'PageDown',
-                'up': 'Up',
-                'down': 'Down',
-                'left': 'Left',
-                'right': 'Right',
-                'print_screen': 'PrtSc',
-                'scroll_lock': 'ScrLk',
-                'pause': 'Pause',
-                'num_lock': 'NumLock',
-                'menu': 'Menu',
-                'cmd': 'Win',
-                'cmd_l': 'Win',
-                'cmd_r': 'Win',
-                # Function keys
-                'f1': 'F1', 'f2': 'F2', 'f3': 'F3', 'f4': 'F4',
-                'f5': 'F5', 'f6': 'F6', 'f7': 'F7', 'f8': 'F8',
-                'f9': 'F9', 'f10': 'F10', 'f11': 'F11', 'f12': 'F12',
-                # Media keys
-                'media_play_pause': 'Play/Pause',
-                'media_next': 'Next',
-                'media_previous': 'Previous',
-                'media_volume_up': 'VolUp',
-                'media_volume_down': 'VolDown',
-                'media_volume_mute': 'Mute',
-            }
-
-            return key_mapping.get(key_name, key_name.title())
-
-        # Handle numpad and other special cases via string format
-        if '<' in key_str and '>' in key_str:
-            # Virtual key codes like <65437>
-            vk_code = key_str.strip('<>')
-            if vk_code.isdigit():
-                vk = int(vk_code)
-                if vk in numpad_map:
-                    return numpad_map[vk]
-                return f'Key{vk}'
-
-        return key_str
+        return decode_key(key)
 
     def _on_release(self, key):
         """Handle key release event."""
         if self.paused:
             return
 
-        key_name = self._parse_key(key)
+        key_name = decode_key(key)
 
         with self.buffer_lock:
             self.buffer[key_name] += 1
+            self._pending += 1
+            pending = self._pending
+
+        # Only the first buffered key and the threshold crossing wake the scheduler
+        if pending == 1 or pending == self.FLUSH_THRESHOLD:
+            self._wake.set()
 
         if self.on_key_logged:
             self.on_key_logged(key_name)
 
-    def _schedule_flush(self):
-        """Schedule the next buffer flush."""
-        if self.flush_timer:
-            self.flush_timer.cancel()
+    def _on_release_measured(self, key):
+        """_on_release plus metrics; only installed as the hook while metrics are on."""
+        start = time.perf_counter()
+        self._on_release(key)
+        metrics.observe('hook_latency_us', (time.perf_counter() - start) * 1e6)
+        if self.paused:
+            metrics.count('keys_dropped_paused')
+        else:
+            metrics.count('keys_captured')
+            metrics.high_water('buffer_high_water', self._pending)
+
+    def _run_scheduler(self):
+        """Flush and checkpoint according to the flush policy until stopped."""
+        timeout = None
+        first_seen = None  # when the scheduler first saw the current buffer
+        while True:
+            self._wake.wait(timeout)
+            self._wake.clear()
+            if self._stopping:
+                return
+            self.stats['scheduler_wakeups'] += 1
+
+            now = time.monotonic()
+            pending = self._pending
+            if pending == 0:
+                first_seen = None
+                timeout = None
+                continue
+            if first_seen is None:
+                first_seen = last_change = next_checkpoint = now
+                buffer_day = date.today()
+                seen = pending
+            if pending != seen:
+                seen = pending
+                last_change = now
+
+            if pending >= self.FLUSH_THRESHOLD:
+                reason = 'threshold'
+            elif date.today() != buffer_day:
+                reason = 'rollover'
+            elif now - first_seen >= self.FLUSH_MAX_AGE:
+                reason = 'max_age'
+            elif now - last_change >= self.FLUSH_IDLE:
+                reason = 'idle'
+            else:
+                reason = None
+
+            if reason:
+                try:
+                    self.flush(reason, day=buffer_day)
+                except Exception:
+                    # The counts went back into the buffer; journal them while
+                    # the database is unavailable and retry after a pause
+                    self._try_checkpoint()
+                    next_checkpoint = now + self.JOURNAL_INTERVAL
+                    timeout = self.FLUSH_IDLE
+                    continue
+                first_seen = None
+                timeout = 0 if self._pending else None
+                continue
+
+            if self.journal is not None and now >= next_checkpoint:
+                self._try_checkpoint()
+                next_checkpoint = now + self.JOURNAL_INTERVAL
+
+            tomorrow = datetime.combine(buffer_day + timedelta(days=1), datetime.min.time())
+            deadlines = [
+                first_seen + self.FLUSH_MAX_AGE,
+                last_change + self.FLUSH_IDLE,
+                now + (tomorrow - datetime.now()).total_seconds(),
+            ]
+            if self.journal is not None:
+                deadlines.append(next_checkpoint)
+            timeout = max(0.0, min(deadlines) - now)
+
+    def start_scheduler(self):
+        """Start the flush scheduler thread."""
+        if self.scheduler is None or not self.scheduler.is_alive():
+            self._stopping = False
+            self.scheduler = threading.Thread(target=self._run_scheduler, daemon=True)
+            self.scheduler.start()
+            self._wake.set()  # pick up anything already buffered
+
+    def stop_scheduler(self):
+        """Stop the flush scheduler thread."""
+        if self.scheduler is not None:
+            self._stopping = True
+            self._wake.set()
+            self.scheduler.join()
+            self.scheduler = None
+
+    def open_journal(self):
+        """Start journaling into a new epoch after the last committed one."""
+        if self.journal is not None:
+            self.journal.release()
+        self.journal = journal.Journal(database.get_journal_dir(), fsync=self.JOURNAL_FSYNC)
+        self.journal_epoch = database.get_journal_epoch() + 1
+        self.journal.start_epoch(self.journal_epoch)
+        self._journaled = Counter()
 
-        self.flush_timer = threading.Timer(self.FLUSH_INTERVAL, self._auto_flush)
-        self.flush_timer.daemon = True
-        self.flush_timer.start()
+    def checkpoint(self):
+        """Append counts buffered since the last checkpoint to the journal."""
+        with self.flush_lock:
+            if self.journal is None:
+                return
+            with self.buffer_lock:
+                snapshot = self.buffer.copy()
+            self.journal.append(date.today().toordinal(), snapshot - self._journaled)
+            self._journaled = snapshot
+            self.stats['checkpoints'] += 1
 
-    def _auto_flush(self):
-        """Automatically flush buffer and reschedule."""
-        self.flush()
-        self._schedule_flush()
+    def _try_checkpoint(self):
+        """Checkpoint from the scheduler; a failed write is retried at the next one."""
+        try:
+            self.checkpoint()
+        except OSError:
+            self.stats['checkpoint_errors'] += 1
+
+    def seed_today(self):
+        """Read today's saved total once; today_count keeps it current from then on."""
+        with self.flush_lock:
+            count = database.get_today_count()
+            with self.buffer_lock:
+                self._today, self._today_flushed = date.today(), count
+
+    def _roll_today(self):
+        """Start today's total from zero after midnight. Call with buffer_lock held."""
+        today = date.today()
+        if self._today is not None and self._today != today:
+            self._today, self._today_flushed = today, 0
+
+    @property
+    def today_count(self) -> int:
+        """
+        Keystrokes logged today, saved or still buffered, without a database read.
+
+        Exact once seed_today has run, except that keys typed in the moment
+        between midnight and the rollover flush are saved under the previous
+        day but counted here until that flush.
+        """
+        with self.buffer_lock:
+            self._roll_today()
+            return self._today_flushed + self._in_flight + self._pending
 
-    def flush(self):
-        """Flush the buffer to database."""
+    def _swap_buffers(self) -> Counter:
+        """Make the spare buffer active and return the retired one."""
         with self.buffer_lock:
-            if self.buffer:
-                database.flush_counts(self.buffer.copy())
-                self.buffer.clear()
+            retired = self.buffer
+            self.buffer = self._spare_buffer
+            self._in_flight = self._pending
+            self._pending = 0
+        self._spare_buffer = None
+        return retired
+
+    def flush(self, reason: str = 'manual', day: Optional[date] = None):
+        """
+        Flush the buffer to database.
+
+        Args:
+            reason: Why the flush happened, tallied in stats['flush_reasons']
+            day: Date to record the counts under (defaults to today)
+        """
+        with self.flush_lock:
+            retired = self._swap_buffers()
+            journaled = self._journaled
+            epoch = None
+            try:
+                if self.journal is not None:
+                    # New keys go to the next epoch's segment from here on
+                    self.journal.start_epoch(self.journal_epoch + 1)
+                    epoch = self.journal_epoch
+                    self.journal_epoch += 1
+                    self._journaled = Counter()
+                if retired:
+                    result = database.flush_counts(retired, day=day, journal_epoch=epoch)
+                    keystrokes = sum(retired.values())
+                    with self.buffer_lock:
+                        self._roll_today()
+                        self._in_flight = 0
+                        if (day or date.today()) == self._today:
+                            self._today_flushed += keystrokes
+                    self.last_flush = result
+                    self.stats['flushes'] += 1
+                    self.stats['rows_written'] += result.rows
+                    self.stats['keystrokes_written'] += keystrokes
+                    self.stats['flush_seconds'] += result.seconds
+                    self.stats['flush_reasons'][reason] += 1
+                    if metrics.enabled:
+                        metrics.count('flushes')
+                        metrics.count(f'flushes_{reason}')
+                        metrics.observe('flush_ms', result.seconds * 1000, metrics.DURATION_BUCKETS_MS)
+            except Exception:
+                # Keep the counts for the next flush instead of dropping them.
+                # Their journaled part stays in the retired epoch's segment
+                # until a later flush commits, so checkpoints add only the rest.
+                with self.buffer_lock:
+                    self.buffer.update(retired)
+                    self._pending += sum(retired.values())
+                    self._in_flight = 0
+                self._journaled = journaled
+                raise
+            finally:
+                # Buffers first, so a journal error can't leave capture without one
+                retired.clear()
+                self._spare_buffer = retired
+
+            if epoch is not None:
+                try:
+                    self.journal.discard(epoch)
+                except OSError:
+                    pass  # Committed; replay_journal skips and removes it
 
     def start(self):
-        """Start the keyboard listener and flush timer."""
+        """Start the keyboard listener and flush scheduler."""
+        # Imported here so the module loads without a display (e.g. for benchmarks)
+        from pynput import keyboard
+
         if self.listener is None or not self.listener.running:
-            self.listener = keyboard.Listener(on_release=self._on_release)
+            if self.journal is None:
+                self.open_journal()
+            on_release = self._on_release_measured if metrics.enabled else self._on_release
+            self.listener = keyboard.Listener(on_release=on_release)
             self.listener.start()
-            self._schedule_flush()
+            self.start_scheduler()
+            if self._today is None:
+                self.seed_today()
 
     def stop(self):
         """Stop the keyboard listener and flush remaining buffer."""
-        if self.flush_timer:
-            self.flush_timer.cancel()
-            self.flush_timer = None
+        self.stop_scheduler()
 
-        self.flush()  # Flush any remaining keystrokes
+        self.flush('exit')  # Flush any remaining keystrokes
 
         if self.listener and self.listener.running:
             self.listener.stop()
             self.listener = None
 
+        if self.journal is not None:
+            # Anything left in the open segment is replayed on next start
+            self.journal.release()
+            self.journal = None
+
     def pause(self):
         """Pause logging and flush buffer."""
         self.paused = True
-        self.flush()
+        self.flush('pause')
 
     def resume(self):
         """Resume logging."""
@@ -1,21 +1,16 @@
 import sys
 import os
-import winreg
 import threading
 import tempfile
 import atexit
-import subprocess
-import json
-import urllib.request
 from pathlib import Path
 
-import pystray
-from pystray import MenuItem as Item
-
+# Only capture-critical modules load up front. pystray, icons (Pillow), report,
+# the update machinery and winreg are imported where they are first used, after
+# the keyboard hook is installed.
 import database
 import logger
-import report
-import icons
+import metrics
 
 __version__ = "0.7.1"
 GITHUB_REPO = "semihsmg/heat-map"
@@ -68,21 +63,43 @@ def remove_lock_file():
         pass
 
 
+def start_capture() -> logger.KeyLogger:
+    """Initialize the database and install the keyboard hook."""
+    database.init_db()
+    # All writes happen in this process, so query results can be cached between them
+    database.enable_query_cache()
+    key_logger = logger.KeyLogger()
+    key_logger.start()
+    if metrics.enabled:
+        metrics.start_writer()
+    return key_logger
+
+
 class KeyboardHeatMapApp:
     """Main application class for the Keyboard Heat Map system tray app."""
 
     APP_NAME = "KeyboardHeatMap"
     STARTUP_REG_PATH = r"Software\Microsoft\Windows\CurrentVersion\Run"
+    TOOLTIP_INTERVAL = 1.0  # minimum seconds between tooltip updates
+    MAINTENANCE_DELAY = 300  # seconds after startup before the first compaction
+    MAINTENANCE_INTERVAL = 24 * 3600  # seconds between compactions
+    MAINTENANCE_PAUSE = 0.5  # seconds between compaction batches
 
     def __init__(self):
-        self.key_logger = logger.KeyLogger()
-        self.icon: pystray.Icon = None
+        # Start capturing before any tray, icon or report code is loaded
+        self.key_logger = start_capture()
+        self.icon = None  # pystray.Icon
+        self.report_server = None  # started on first use of Live Heat Map
+        self._tooltip_wake = threading.Event()
+        self._tooltip_stop = threading.Event()
+        self._maintenance_stop = threading.Event()
+        self.key_logger.on_key_logged = self._on_key_logged
         self._setup_app()
 
     def _setup_app(self):
         """Initialize the application."""
-        # Initialize database
-        database.init_db()
+        import pystray
+        import icons
 
         # Create the system tray icon
         self.icon = pystray.Icon(
@@ -92,17 +109,28 @@ class KeyboardHeatMapApp:
             menu=self._create_menu()
         )
 
-        # Update tooltip with today's count periodically
-        self._update_tooltip()
+        # Keep the tooltip's count of today's keys current
+        threading.Thread(target=self._run_tooltip, daemon=True).start()
 
-    def _create_menu(self) -> pystray.Menu:
+        # Apply the retention policy (HEATMAP_KEEP_DAYS), if one is set
+        if database.KEEP_DAYS is not None:
+            threading.Thread(target=self._run_maintenance, daemon=True).start()
+
+    def _create_menu(self):
         """Create the system tray context menu."""
+        import pystray
+        from pystray import MenuItem as Item
+
         return pystray.Menu(
             Item(
                 'Open Heat Map',
                 lambda icon, item: self._open_heatmap(),
                 default=True
             ),
+            Item(
+                'Live Heat Map',
+                lambda icon, item: self._open_live_heatmap()
+            ),
             pystray.Menu.SEPARATOR,
             Item(
                 'Pause' if not self.key_logger.is_paused else 'Resume',
@@ -124,7 +152,10 @@ class KeyboardHeatMapApp:
 
     def _toggle_pause(self, icon, item):
         """Toggle pause/resume logging."""
+        import icons
+
         is_paused = self.key_logger.toggle_pause()
+        self._tooltip_wake.set()
 
         # Update icon
         if is_paused:
@@ -139,9 +170,25 @@ class KeyboardHeatMapApp:
 
     def _open_heatmap(self):
         """Open the heat map in the browser."""
+        import report
+
         self.key_logger.flush()  # Ensure latest data is saved
         report.open_report()
 
+    def _open_live_heatmap(self):
+        """Open the live-updating heat map served on localhost."""
+        import webbrowser
+
+        if self.report_server is None:
+            try:
+                import server
+                self.report_server = server.ReportServer(before_page=self.key_logger.flush)
+            except OSError as e:
+                self._notify("Error", f"Could not start the heat map server: {e}")
+                return
+            self.report_server.start()
+        webbrowser.open(self.report_server.url)
+
     def _toggle_startup(self, icon, item):
         """Toggle run at startup setting."""
         if self._is_startup_enabled():
@@ -153,6 +200,8 @@ class KeyboardHeatMapApp:
 
     def _is_startup_enabled(self) -> bool:
         """Check if app is set to run at startup."""
+        import winreg
+
         try:
             key = winreg.OpenKey(
                 winreg.HKEY_CURRENT_USER,
@@ -172,6 +221,8 @@ class KeyboardHeatMapApp:
 
     def _add_to_startup(self):
         """Add app to Windows startup."""
+        import winreg
+
         try:
             key = winreg.OpenKey(
                 winreg.HKEY_CURRENT_USER,
@@ -191,6 +242,8 @@ class KeyboardHeatMapApp:
 
     def _remove_from_startup(self):
         """Remove app from Windows startup."""
+        import winreg
+
         try:
             key = winreg.OpenKey(
                 winreg.HKEY_CURRENT_USER,
@@ -222,6 +275,8 @@ class KeyboardHeatMapApp:
 
     def _check_git_update(self, icon, item):
         """Check for updates via git pull (for development)."""
+        import subprocess
+
         try:
             app_dir = Path(__file__).parent
             result = subprocess.run(
@@ -248,6 +303,10 @@ class KeyboardHeatMapApp:
 
     def _check_github_release(self, icon, item):
         """Check GitHub releases for updates (for exe)."""
+        import json
+        import subprocess
+        import urllib.request
+
         try:
             # Get latest release from GitHub API
             api_url = f"https://api.github.com/repos/{GITHUB_REPO}/releases/latest"
@@ -322,21 +381,46 @@ del "%~f0"
                 return a - b
         return len(p1) - len(p2)
 
-    def _update_tooltip(self):
-        """Update the tooltip with today's keystroke count."""
-        def update():
-            while self.icon and self.icon.visible:
-                try:
-                    count = database.get_today_count()
-                    status = " (Paused)" if self.key_logger.is_paused else ""
-                    self.icon.title = f"Keyboard Heat Map{status}\nToday: {count:,} keys"
-                except Exception:
-                    pass
-                # Update every 30 seconds
-                threading.Event().wait(30)
-
-        tooltip_thread = threading.Thread(target=update, daemon=True)
-        tooltip_thread.start()
+    def _on_key_logged(self, key_name: str):
+        """Called from the keyboard hook for every logged key; must stay cheap."""
+        if not self._tooltip_wake.is_set():
+            self._tooltip_wake.set()
+        if self.report_server is not None:
+            self.report_server.publish(key_name)
+
+    def _run_tooltip(self):
+        """
+        Show today's keystroke count in the tooltip.
+
+        The count comes from KeyLogger.today_count, so no database reads
+        happen after startup. Updates follow typing, at most one per
+        TOOLTIP_INTERVAL, and the last keys of a burst are always shown.
+        """
+        from datetime import date, datetime, timedelta
+
+        while not self._tooltip_stop.is_set():
+            self._tooltip_wake.clear()
+            try:
+                status = " (Paused)" if self.key_logger.is_paused else ""
+                self.icon.title = f"Keyboard Heat Map{status}\nToday: {self.key_logger.today_count:,} keys"
+            except Exception:
+                pass
+            # Rate limit; keys logged meanwhile leave the wake flag set
+            if self._tooltip_stop.wait(self.TOOLTIP_INTERVAL):
+                return
+            # Sleep until the next key, or midnight so the count resets to zero
+            midnight = datetime.combine(date.today() + timedelta(days=1), datetime.min.time())
+            self._tooltip_wake.wait((midnight - datetime.now()).total_seconds() + 1)
+
+    def _run_maintenance(self):
+        """Compact old history in small batches, once a day, while the app runs."""
+        delay = self.MAINTENANCE_DELAY
+        while not self._maintenance_stop.wait(delay):
+            try:
+                database.compact_history(pause=self.MAINTENANCE_PAUSE, stop=self._maintenance_stop)
+            except Exception:
+                pass  # Try again tomorrow
+            delay = self.MAINTENANCE_INTERVAL
 
     def _notify(self, title: str, message: str):
         """Show a system notification."""
@@ -347,16 +431,26 @@ del "%~f0"
 
     def _exit_app(self, icon, item):
         """Exit the application."""
+        self._tooltip_stop.set()
+        self._tooltip_wake.set()
+        self._maintenance_stop.set()
         self.key_logger.stop()
+        metrics.stop_writer()
+        if self.report_server is not None:
+            self.report_server.stop()
+        database.close_connections()
         self.icon.stop()
 
     def run(self):
         """Start the application."""
-        # Start the key logger
-        self.key_logger.start()
-
-        # Run the system tray icon (blocks)
-        self.icon.run()
+        # The key logger is already running; run the system tray icon (blocks)
+        self.icon.run(setup=self._on_tray_ready)
+
+    def _on_tray_ready(self, icon):
+        """Show the icon, then report startup problems the user should fix."""
+        icon.visible = True
+        if database.KEEP_DAYS_WARNING:
+            self._notify("History Retention", database.KEEP_DAYS_WARNING)
 
 
 def main():
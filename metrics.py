@@ -0,0 +1,205 @@
+"""
+Runtime metrics for the capture and storage hot paths.
+
+Off by default; set HEATMAP_METRICS=1 before starting the app (or call
+enable()) to collect:
+
+    counters     keys captured, keys dropped while paused, flushes,
+                 rows upserted
+    high water   most keystrokes buffered between two flushes
+    histograms   keyboard hook latency (us) and flush duration (ms)
+    timings      calls, total and worst time per database function
+
+Disabled metrics cost almost nothing: the keyboard hook is only wrapped
+when metrics are on at startup, and every other call site checks
+`metrics.enabled` first.
+
+snapshot() returns everything as a dict. start_writer() also writes it to
+metrics.json next to the database every WRITE_INTERVAL seconds, and the
+report shows a diagnostics panel while metrics are on.
+"""
+import functools
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+
+enabled = os.environ.get('HEATMAP_METRICS', '') not in ('', '0')
+
+WRITE_INTERVAL = 60  # seconds between metrics.json updates
+
+# Histogram bucket upper bounds; values above the last go in an overflow bucket
+LATENCY_BUCKETS_US = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10_000, 50_000)
+DURATION_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+_lock = threading.Lock()
+_started = time.time()
+_counters = Counter()
+_high_water: dict[str, float] = {}
+_histograms: dict[str, list] = {}  # name -> [bounds, bucket counts, max]
+_timings: dict[str, list] = {}  # name -> [calls, total seconds, max seconds]
+_writer: Optional[threading.Thread] = None
+_writer_stop = threading.Event()
+
+
+def enable(on: bool = True):
+    """Turn collection on or off at runtime."""
+    global enabled
+    enabled = on
+
+
+def reset():
+    """Forget everything collected so far."""
+    global _started
+    with _lock:
+        _counters.clear()
+        _high_water.clear()
+        _histograms.clear()
+        _timings.clear()
+        _started = time.time()
+
+
+def count(name: str, n: int = 1):
+    """Add n to a counter."""
+    with _lock:
+        _counters[name] += n
+
+
+def high_water(name: str, value: float):
+    """Record value if it is the highest seen for name."""
+    if value > _high_water.get(name, 0):
+        with _lock:
+            if value > _high_water.get(name, 0):
+                _high_water[name] = value
+
+
+def observe(name: str, value: float, bounds: tuple = LATENCY_BUCKETS_US):
+    """Add a value to a histogram with the given bucket bounds."""
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = [bounds, [0] * (len(bounds) + 1), 0]
+        histogram[1][bisect_left(histogram[0], value)] += 1
+        if value > histogram[2]:
+            histogram[2] = value
+
+
+def timed(func):
+    """Decorator recording calls and time spent per function while enabled."""
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not enabled:
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            with _lock:
+                timing = _timings.get(name)
+                if timing is None:
+                    timing = _timings[name] = [0, 0.0, 0.0]
+                timing[0] += 1
+                timing[1] += elapsed
+                if elapsed > timing[2]:
+                    timing[2] = elapsed
+
+    return wrapper
+
+
+def _percentile(bounds: tuple, counts: list, fraction: float, maximum: float) -> float:
+    """Upper bound of the bucket holding the given fraction of values."""
+    target = sum(counts) * fraction
+    seen = 0
+    for bound, bucket in zip(bounds, counts):
+        seen += bucket
+        if seen >= target:
+            return min(bound, maximum)
+    return maximum
+
+
+def snapshot() -> dict:
+    """Everything collected so far, as plain JSON-serializable values."""
+    with _lock:
+        histograms = {}
+        for name, (bounds, counts, maximum) in _histograms.items():
+            histograms[name] = {
+                'count': sum(counts),
+                'p50': _percentile(bounds, counts, 0.5, maximum),
+                'p99': _percentile(bounds, counts, 0.99, maximum),
+                'max': round(maximum, 3),
+                'buckets': {
+                    **{str(bound): n for bound, n in zip(bounds, counts)},
+                    f'>{bounds[-1]}': counts[-1],
+                },
+            }
+        timings = {
+            name: {
+                'calls': calls,
+                'total_ms': round(total * 1000, 3),
+                'mean_us': round(total / calls * 1e6, 1),
+                'max_us': round(worst * 1e6, 1),
+            }
+            for name, (calls, total, worst) in sorted(_timings.items())
+        }
+        return {
+            'enabled': enabled,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'uptime_seconds': round(time.time() - _started),
+            'counters': dict(_counters),
+            'high_water': dict(_high_water),
+            'histograms': histograms,
+            'timings': timings,
+        }
+
+
+def get_metrics_path() -> Path:
+    """Get the metrics file path, next to the database in AppData."""
+    import database
+    return database.get_db_path().parent / 'metrics.json'
+
+
+def write_snapshot(path: Optional[Path] = None) -> Path:
+    """Write the current snapshot as JSON, replacing the file atomically."""
+    import json
+
+    path = path or get_metrics_path()
+    temp_path = path.with_name(path.name + '.tmp')
+    temp_path.write_text(json.dumps(snapshot(), indent=2), encoding='utf-8')
+    os.replace(temp_path, path)
+    return path
+
+
+def start_writer(interval: float = WRITE_INTERVAL):
+    """Write metrics.json every interval seconds from a daemon thread."""
+    global _writer
+
+    def run():
+        while not _writer_stop.wait(interval):
+            try:
+                write_snapshot()
+            except OSError:
+                pass  # Try again next interval
+
+    if _writer is None or not _writer.is_alive():
+        _writer_stop.clear()
+        _writer = threading.Thread(target=run, daemon=True)
+        _writer.start()
+
+
+def stop_writer():
+    """Stop the writer thread and write a final snapshot."""
+    global _writer
+    if _writer is not None:
+        _writer_stop.set()
+        _writer.join()
+        _writer = None
+        try:
+            write_snapshot()
+        except OSError:
+            pass
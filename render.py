@@ -0,0 +1,356 @@
+"""
+Heat map image renderer.
+
+Draws the keyboard from report.KEYBOARD_LAYOUT straight to a Pillow image,
+with the same glow tiers and top-3 styling as the HTML report. Key caps are
+pre-rendered once per (glow tier, size) and labels once per (text, color), so exporting hundreds
+of images (e.g. one per day) only pays for pasting sprites and count text.
+
+Usage:
+    python render.py                          # all four periods to ./heatmaps
+    python render.py --period week --period all --out DIR
+    python render.py --days 30                # one image per day for 30 days
+    python render.py --from 2025-01-01 --to 2025-01-31
+"""
+from collections import Counter
+from datetime import date, timedelta
+from functools import lru_cache
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+import database
+import report
+
+# Geometry in CSS pixels, matching the report stylesheet
+KEY_UNIT = 48
+KEY_GAP = 4
+KEYBOARD_PADDING = 20
+SECTION_GAP = 20
+PAGE_PADDING = 40
+HEADER_HEIGHT = 70
+FOOTER_HEIGHT = 30
+
+BACKGROUND = (10, 10, 15, 255)
+KEYBOARD_BG = (26, 26, 36, 255)
+KEYBOARD_BORDER = (37, 37, 47, 255)  # 5% white over KEYBOARD_BG
+ACCENT = (0, 255, 170, 255)
+MUTED = (136, 136, 170, 255)
+
+# zlib level for exported PNGs; 3 is ~30% faster to write than the default 6
+PNG_COMPRESS_LEVEL = 3
+
+FONT_CANDIDATES = ('consolab.ttf', 'DejaVuSansMono-Bold.ttf', 'arialbd.ttf', 'DejaVuSans-Bold.ttf')
+
+
+class KeyStyle(NamedTuple):
+    top: str  # background gradient start
+    bottom: str  # background gradient end
+    border: tuple
+    text: tuple
+    ledge: str  # the solid 4px shadow under the key
+    glow: Optional[tuple]  # RGBA glow color
+    glow_size: int  # CSS blur radius of the glow
+
+
+# Mirrors the .key, .glow-* and .top-* rules in report.HTML_TEMPLATE
+KEY_STYLES = {
+    '': KeyStyle('#2a2a38', '#2a2a38', (58, 58, 74, 255), (136, 136, 170, 255), '#1a1a24', None, 0),
+    'glow-1': KeyStyle('#2a3a38', '#2a2a38', (0, 255, 170, 77), (0, 255, 170, 204), '#1a2a28', (0, 255, 170, 26), 15),
+    'glow-2': KeyStyle('#2a4a45', '#2a3a38', (0, 255, 170, 128), (0, 255, 170, 230), '#1a3a35', (0, 255, 170, 51), 20),
+    'glow-3': KeyStyle('#2a5a52', '#2a4a45', (0, 221, 255, 128), (0, 255, 170, 255), '#1a4a42', (0, 255, 170, 77), 25),
+    'glow-4': KeyStyle('#2a6a5f', '#2a5a52', (0, 221, 255, 179), (0, 255, 221, 255), '#1a5a4f', (0, 221, 255, 77), 30),
+    'glow-5': KeyStyle('#3a7a6f', '#2a6a5f', (0, 221, 255, 230), (0, 255, 255, 255), '#2a6a5f', (0, 221, 255, 102), 35),
+    'glow-max': KeyStyle('#5a4a6a', '#4a3a5a', (255, 0, 170, 230), (255, 68, 221, 255), '#3a2a4a', (255, 0, 170, 128), 40),
+    'top-1': KeyStyle('#6a3a7a', '#5a2a6a', (255, 0, 170, 255), (255, 102, 238, 255), '#4a1a5a', (255, 0, 170, 153), 50),
+    'top-2': KeyStyle('#5a3a6a', '#4a2a5a', (255, 0, 170, 204), (238, 85, 221, 255), '#3a1a4a', (255, 0, 170, 102), 40),
+    'top-3': KeyStyle('#4a3a5a', '#3a2a4a', (255, 0, 170, 153), (221, 68, 204, 255), '#2a1a3a', (255, 0, 170, 77), 30),
+}
+
+
+def glow_tier(count: int, max_count: int) -> str:
+    """Get the glow style for a count, with the same thresholds as the report."""
+    if count == 0:
+        return ''
+    ratio = count / max_count
+    if ratio >= 0.9:
+        return 'glow-max'
+    if ratio >= 0.7:
+        return 'glow-5'
+    if ratio >= 0.5:
+        return 'glow-4'
+    if ratio >= 0.3:
+        return 'glow-3'
+    if ratio >= 0.15:
+        return 'glow-2'
+    return 'glow-1'
+
+
+@lru_cache(maxsize=None)
+def _font(size: int) -> ImageFont.ImageFont:
+    for name in FONT_CANDIDATES:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:  # Pillow < 10.1 has a single bitmap font
+        return ImageFont.load_default()
+
+
+def _hex(color: str) -> tuple:
+    return tuple(int(color[i:i + 2], 16) for i in (1, 3, 5)) + (255,)
+
+
+def _mix(color: tuple, background: tuple, opacity: float) -> tuple:
+    """Blend an RGBA color over an opaque background (ImageDraw doesn't blend on RGBA images)."""
+    alpha = color[3] / 255 * opacity
+    return tuple(round(c * alpha + b * (1 - alpha)) for c, b in zip(color[:3], background[:3])) + (255,)
+
+
+def _layout() -> tuple[list[tuple[str, str, int, int, int, int]], int, int]:
+    """
+    Place every key of KEYBOARD_LAYOUT in CSS pixels.
+
+    Returns:
+        ([(key_id, label, x, y, width, height)], keyboard width, keyboard height)
+    """
+    keys = []
+    section_x = KEYBOARD_PADDING
+    height = 0
+    for section in ('main', 'nav', 'numpad'):
+        section_width = 0
+        for row_index, row in enumerate(report.KEYBOARD_LAYOUT[section]):
+            y = KEYBOARD_PADDING + row_index * (KEY_UNIT + KEY_GAP)
+            x = 0
+            for index, key_def in enumerate(row):
+                key_id, label, width = key_def[:3]
+                rows = key_def[3] if len(key_def) > 3 else 1
+                if key_id == '_gap':
+                    x += width * KEY_UNIT + KEY_GAP
+                    continue
+                w = round(width * KEY_UNIT + (width - 1) * KEY_GAP)
+                h = rows * KEY_UNIT + (rows - 1) * KEY_GAP
+                if rows > 1:
+                    # Tall keys are absolutely positioned at their index, out of the flow
+                    keys.append((key_id, label, section_x + index * (KEY_UNIT + KEY_GAP), y, w, h))
+                    continue
+                keys.append((key_id, label, section_x + round(x), y, w, h))
+                x += w + KEY_GAP
+            section_width = max(section_width, round(x) - KEY_GAP)
+            height = max(height, y + KEY_UNIT)
+        section_x += section_width + SECTION_GAP
+    return keys, section_x - SECTION_GAP + KEYBOARD_PADDING, height + KEYBOARD_PADDING
+
+
+KEY_POSITIONS, KEYBOARD_WIDTH, KEYBOARD_HEIGHT = _layout()
+
+
+@lru_cache(maxsize=256)
+def _key_sprite(tier: str, width: int, height: int, scale: int) -> tuple[Image.Image, int]:
+    """
+    Pre-render a blank key cap with its shadows and glow.
+
+    Returns:
+        (RGBA sprite, margin in pixels around the key itself)
+    """
+    style = KEY_STYLES[tier]
+    w, h = width * scale, height * scale
+    margin = (max(style.glow_size, 16) + 4) * scale
+    size = (w + 2 * margin, h + 2 * margin)
+    box = [margin, margin, margin + w - 1, margin + h - 1]
+    radius = 6 * scale
+
+    sprite = Image.new('RGBA', size, (0, 0, 0, 0))
+
+    # Soft drop shadow (0 6px 10px) and glow (0 0 Npx), blurred like box-shadow
+    shadow = Image.new('RGBA', size, (0, 0, 0, 0))
+    ImageDraw.Draw(shadow).rounded_rectangle(
+        [box[0], box[1] + 6 * scale, box[2], box[3] + 6 * scale], radius, fill=(0, 0, 0, 77))
+    sprite.alpha_composite(shadow.filter(ImageFilter.GaussianBlur(5 * scale)))
+    if style.glow:
+        glow = Image.new('RGBA', size, (0, 0, 0, 0))
+        ImageDraw.Draw(glow).rounded_rectangle(box, radius, fill=style.glow)
+        sprite.alpha_composite(glow.filter(ImageFilter.GaussianBlur(style.glow_size * scale / 2)))
+
+    draw = ImageDraw.Draw(sprite, 'RGBA')
+    draw.rounded_rectangle([box[0], box[1] + 4 * scale, box[2], box[3] + 4 * scale], radius, fill=_hex(style.ledge))
+
+    # Vertical background gradient, clipped to the rounded key shape
+    top, bottom = _hex(style.top), _hex(style.bottom)
+    gradient = Image.linear_gradient('L').resize((w, h))
+    face = Image.composite(Image.new('RGBA', (w, h), bottom), Image.new('RGBA', (w, h), top), gradient)
+    mask = Image.new('L', (w, h), 0)
+    ImageDraw.Draw(mask).rounded_rectangle([0, 0, w - 1, h - 1], radius, fill=255)
+    sprite.paste(face, (margin, margin), mask)
+    draw.rounded_rectangle(box, radius, outline=style.border, width=scale)
+    return sprite, margin
+
+
+@lru_cache(maxsize=1024)
+def _text_sprite(text: str, color: tuple, size: int) -> Image.Image:
+    """Pre-render a key label, so batches don't rasterize the same text again."""
+    font = _font(size)
+    left, _, right, _ = font.getbbox(text)
+    try:
+        ascent, descent = font.getmetrics()
+    except AttributeError:  # bitmap fallback font
+        ascent, descent = size, 0
+    # Full line height, so labels center like CSS text rather than by glyph ink
+    sprite = Image.new('RGBA', (max(right - left, 1), ascent + descent), (0, 0, 0, 0))
+    ImageDraw.Draw(sprite).text((-left, ascent), text, font=font, fill=color, anchor='ls')
+    return sprite
+
+
+@lru_cache(maxsize=8)
+def _frame(scale: int) -> Image.Image:
+    """The empty page: background and keyboard panel."""
+    width = (KEYBOARD_WIDTH + 2 * PAGE_PADDING) * scale
+    height = (KEYBOARD_HEIGHT + 2 * PAGE_PADDING + HEADER_HEIGHT + FOOTER_HEIGHT) * scale
+    frame = Image.new('RGBA', (width, height), BACKGROUND)
+    left, top = PAGE_PADDING * scale, (PAGE_PADDING + HEADER_HEIGHT) * scale
+    ImageDraw.Draw(frame, 'RGBA').rounded_rectangle(
+        [left, top, left + KEYBOARD_WIDTH * scale - 1, top + KEYBOARD_HEIGHT * scale - 1],
+        16 * scale, fill=KEYBOARD_BG, outline=KEYBOARD_BORDER, width=scale,
+    )
+    return frame
+
+
+def render_heatmap(counts: dict, title: str = 'All Time', scale: int = 2) -> Image.Image:
+    """
+    Render a heat map image for a set of key counts.
+
+    Args:
+        counts: Key press counts by key name
+        title: Subtitle shown under the heading, e.g. the period
+        scale: Pixels per CSS pixel
+
+    Returns:
+        RGB image
+    """
+    counts = Counter(counts)
+    max_count = max(counts.values()) if counts else 1
+    top3 = {key: rank for rank, (key, _) in enumerate(counts.most_common(3), 1)}
+
+    image = _frame(scale).copy()
+    draw = ImageDraw.Draw(image, 'RGBA')
+    count_font = _font(8 * scale)
+    left, top = PAGE_PADDING * scale, (PAGE_PADDING + HEADER_HEIGHT) * scale
+
+    for key_id, label, x, y, width, height in KEY_POSITIONS:
+        count = counts.get(key_id) or counts.get(key_id.lower()) or 0
+        rank = top3.get(key_id) or top3.get(key_id.lower())
+        tier = f'top-{rank}' if rank else glow_tier(count, max_count)
+        sprite, margin = _key_sprite(tier, width, height, scale)
+        key_x, key_y = left + x * scale, top + y * scale
+        image.alpha_composite(sprite, (key_x - margin, key_y - margin))
+        if label:
+            text = _text_sprite(label, KEY_STYLES[tier].text, 11 * scale)
+            image.alpha_composite(text, (key_x + (width * scale - text.width) // 2,
+                                         key_y + (height * scale - text.height) // 2))
+        if count > 0:
+            style = KEY_STYLES[tier]
+            text_color = _mix(style.text, _hex(style.bottom), 0.7)
+            draw.text(((x + width - 4) * scale + left, (y + height - 2) * scale + top),
+                      f'{count:,}', font=count_font, fill=text_color, anchor='rd')
+
+    center = image.width // 2
+    draw.text((center, PAGE_PADDING * scale), 'KEYBOARD HEAT MAP', font=_font(28 * scale), fill=ACCENT, anchor='mt')
+    subtitle = f'{title} · {sum(counts.values()):,} keys'
+    draw.text((center, (PAGE_PADDING + 42) * scale), subtitle, font=_font(13 * scale), fill=MUTED, anchor='mt')
+    draw.text((center, image.height - PAGE_PADDING * scale), 'github.com/semihsmg/heat-map',
+              font=_font(10 * scale), fill=MUTED, anchor='md')
+    return image.convert('RGB')
+
+
+def save_heatmap(counts: dict, path: Path, title: str = 'All Time', scale: int = 2) -> Path:
+    """Render a heat map and save it as a PNG."""
+    path = Path(path)
+    render_heatmap(counts, title, scale).save(path, format='PNG', compress_level=PNG_COMPRESS_LEVEL)
+    return path
+
+
+def export_periods(out_dir: Path, periods: Optional[list[str]] = None,
+                   ranges: Optional[dict[str, tuple[date, date]]] = None, scale: int = 2) -> list[Path]:
+    """
+    Export one image per report period, plus one per custom range.
+
+    All periods are read with a single database.get_period_counts call.
+
+    Args:
+        out_dir: Folder for the images (created if missing)
+        periods: Subset of 'today', 'week', 'month', 'all' (default: all four)
+        ranges: Extra custom periods as {name: (start, end)}, both inclusive
+        scale: Pixels per CSS pixel
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    labels = dict(report.PERIODS)
+    periods = periods or list(labels)
+    ranges = ranges or {}
+    period_counts = database.get_period_counts(ranges)
+
+    paths = []
+    for period in periods:
+        paths.append(save_heatmap(period_counts[period], out_dir / f'heatmap-{period}.png', labels[period], scale))
+    for name, (start, end) in ranges.items():
+        filename = f'heatmap-{start.isoformat()}_{end.isoformat()}.png'
+        paths.append(save_heatmap(period_counts[name], out_dir / filename, name, scale))
+    return paths
+
+
+def export_days(out_dir: Path, start: date, end: date, scale: int = 2, workers: int = 4) -> list[Path]:
+    """
+    Export one image per tracked day between start and end, inclusive.
+
+    Images are rendered in order while up to `workers` threads encode and
+    write earlier ones (PNG compression releases the GIL). At most
+    2 * workers rendered images are held in memory at once.
+    """
+    from collections import deque
+    from concurrent.futures import ThreadPoolExecutor
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for day, counts in database.get_daily_key_counts(start, end):
+            if len(pending) >= 2 * workers:
+                pending.popleft().result()
+            path = out_dir / f'heatmap-{day.isoformat()}.png'
+            image = render_heatmap(counts, day.strftime('%A, %B %d, %Y'), scale)
+            pending.append(pool.submit(image.save, path, format='PNG', compress_level=PNG_COMPRESS_LEVEL))
+            paths.append(path)
+        for future in pending:
+            future.result()
+    return paths
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Export heat map images.')
+    parser.add_argument('--out', type=Path, default=Path('heatmaps'), help='output folder (default: ./heatmaps)')
+    parser.add_argument('--period', action='append', choices=[p for p, _ in report.PERIODS],
+                        help='period to export; repeatable (default: all four)')
+    parser.add_argument('--days', type=int, help='export one image per day for the last DAYS days')
+    parser.add_argument('--from', dest='start', type=date.fromisoformat, help='first day to export (YYYY-MM-DD)')
+    parser.add_argument('--to', dest='end', type=date.fromisoformat, help='last day to export (default: today)')
+    parser.add_argument('--scale', type=int, default=2, help='pixels per CSS pixel (default: 2)')
+    args = parser.parse_args()
+
+    database.init_db(replay=False)
+    if args.days or args.start:
+        end = args.end or date.today()
+        start = args.start or end - timedelta(days=args.days - 1)
+        paths = export_days(args.out, start, end, args.scale)
+    else:
+        paths = export_periods(args.out, args.period, scale=args.scale)
+    print(f'Wrote {len(paths)} image(s) to {args.out}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,359 @@
+"""
+Keystroke replay harness for the capture path.
+
+Drives KeyLogger._on_release with synthetic or recorded streams of key
+objects shaped like pynput's, from one or more threads and at a chosen
+rate, while the real flush scheduler writes into either a fake database or
+a throwaway SQLite one. pynput is never imported (except by --record), so
+this runs headless, e.g. in CI without an X server.
+
+Reports sustained events/sec, hook latency percentiles and how long
+flushes stalled, and checks that every replayed keystroke was written.
+
+Recorded streams are text files with one event per line: an optional
+offset in seconds from the start, then the key as str() of the pynput
+object ('a', Key.space, <65437>).
+
+Usage:
+    python replay.py                                  # 200k keys, 1 thread, flat out
+    python replay.py --threads 4 --rate 2000 --seconds 10
+    python replay.py --db sqlite --journal --flush-threshold 500
+    python replay.py --stream typing.txt [--speed 10]
+    python replay.py --record typing.txt --seconds 60  # needs a keyboard
+"""
+import ast
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from enum import Enum
+from pathlib import Path
+from typing import Optional
+
+import database
+import logger
+import metrics
+
+
+class FakeKeyCode:
+    """Stand-in for pynput's KeyCode, with the same attributes and str() format."""
+    __slots__ = ('vk', 'char')
+
+    def __init__(self, vk=None, char=None):
+        self.vk = vk
+        self.char = char
+
+    def __str__(self):
+        return repr(self.char) if self.char is not None else f'<{self.vk}>'
+
+
+# Stand-in for pynput's Key enum: str(FakeKey.space) == 'Key.space'
+FakeKey = Enum('Key', [(name, 0xFF00 + i) for i, name in enumerate([
+    *logger.KEY_NAME_MAP, 'f13', 'f20', 'media_stop',
+])])
+
+
+def synthetic_keys(count: int, seed: int = 1) -> list:
+    """Build a realistic mix of character, numpad, virtual-key and special keys."""
+    rng = random.Random(seed)
+    pool = (
+        [FakeKeyCode(vk=ord(c.upper()), char=c) for c in 'abcdefghijklmnopqrstuvwxyz']
+        + [FakeKeyCode(vk=ord(c.upper()), char=c.upper()) for c in 'etaoin']
+        + [FakeKeyCode(vk=0x30 + d, char=str(d)) for d in range(10)]
+        + [FakeKeyCode(vk=vk, char=None) for vk in logger.NUMPAD_MAP]
+        + [FakeKeyCode(vk=vk, char='5') for vk in (101, 110)]
+        + [FakeKeyCode(vk=vk, char=None) for vk in (12, 65437, 255)]
+        + list(FakeKey)
+    )
+    return [rng.choice(pool) for _ in range(count)]
+
+
+def parse_key(text: str):
+    """Turn str() of a pynput key back into an equivalent fake key object."""
+    if text.startswith('Key.'):
+        try:
+            return FakeKey[text[4:]]
+        except KeyError:
+            raise ValueError(f'unknown special key: {text}') from None
+    if text.startswith('<') and text.endswith('>') and text[1:-1].isdigit():
+        return FakeKeyCode(vk=int(text[1:-1]))
+    try:
+        char = ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        raise ValueError(f'unrecognized key: {text}') from None
+    if not isinstance(char, str):
+        raise ValueError(f'unrecognized key: {text}')
+    return FakeKeyCode(char=char)
+
+
+def load_stream(path: Path) -> tuple[list, Optional[list]]:
+    """
+    Read a recorded stream.
+
+    Returns:
+        (keys, offsets); offsets is None unless every line has one
+    """
+    keys, offsets = [], []
+    for number, line in enumerate(Path(path).read_text(encoding='utf-8').splitlines(), 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        offset, _, rest = line.partition(' ')
+        try:
+            offsets.append(float(offset))
+            line = rest.strip()
+        except ValueError:
+            offsets.append(None)
+        try:
+            keys.append(parse_key(line))
+        except ValueError as e:
+            raise ValueError(f'{path}:{number}: {e}') from None
+    return keys, None if None in offsets else offsets
+
+
+def record(path: Path, seconds: float):
+    """Record real key releases to a stream file (needs a keyboard backend)."""
+    from pynput import keyboard
+
+    start = time.perf_counter()
+    with open(path, 'w', encoding='utf-8') as out:
+        def on_release(key):
+            out.write(f'{time.perf_counter() - start:.4f} {key}\n')
+
+        with keyboard.Listener(on_release=on_release):
+            time.sleep(seconds)
+
+
+class FakeDatabase:
+    """
+    Replaces database.flush_counts while active, recording what was written.
+
+    Each flush sleeps for `delay` seconds to stand in for a slow disk.
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.written = Counter()
+        self._original = None
+
+    def flush_counts(self, counts, day=None, journal_epoch=None):
+        if self.delay:
+            time.sleep(self.delay)
+        self.written.update(counts)
+        return database.FlushResult(len(counts), self.delay)
+
+    def __enter__(self):
+        self._original = database.flush_counts
+        database.flush_counts = self.flush_counts
+        return self
+
+    def __exit__(self, *exc):
+        database.flush_counts = self._original
+
+
+@contextmanager
+def temp_database():
+    """Point database.py at a fresh SQLite database in a temp directory."""
+    previous = os.environ.get('APPDATA')
+    temp_dir = tempfile.mkdtemp(prefix='heatmap-replay-')
+    os.environ['APPDATA'] = temp_dir
+    database.close_connections()
+    try:
+        database.init_db(replay=False)
+        yield database.get_db_path()
+    finally:
+        database.close_connections()
+        if previous is None:
+            os.environ.pop('APPDATA', None)
+        else:
+            os.environ['APPDATA'] = previous
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def _percentile(ordered: list, fraction: float):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def replay(keys: list, threads: int = 1, rate: float = 0, offsets: Optional[list] = None,
+           speed: float = 1.0, db: str = 'fake', flush_delay: float = 0.0,
+           flush_threshold: Optional[int] = None, journal: bool = False) -> dict:
+    """
+    Replay a key stream through a fresh KeyLogger and measure the hook.
+
+    Every thread replays the whole stream, so threads * len(keys) keystrokes
+    are logged in total.
+
+    Args:
+        keys: Key objects as returned by synthetic_keys or load_stream
+        threads: Number of threads calling the hook concurrently
+        rate: Target keystrokes per second across all threads; 0 means
+            as fast as possible
+        offsets: Per-key release times in seconds (from load_stream); used
+            instead of rate when given
+        speed: Playback speed multiplier for offsets
+        db: 'fake' for an in-memory stand-in, 'sqlite' for a temp database
+        flush_delay: Seconds each fake flush sleeps
+        flush_threshold: Overrides KeyLogger.FLUSH_THRESHOLD
+        journal: Checkpoint to a journal as the app does (sqlite only)
+
+    Returns:
+        Metrics: events, events_per_sec, p50/p99/max hook latency (us),
+        flushes, flush time and the worst hook latency during a flush,
+        and lost (keystrokes not written; should be 0)
+    """
+    if db not in ('fake', 'sqlite'):
+        raise ValueError("db must be 'fake' or 'sqlite'")
+    if journal and db != 'sqlite':
+        raise ValueError('journal needs the sqlite database')
+
+    if offsets is not None:
+        schedule = [offset / speed for offset in offsets]
+    elif rate:
+        interval = threads / rate
+        schedule = [i * interval for i in range(len(keys))]
+    else:
+        schedule = None
+
+    key_logger = logger.KeyLogger()
+    if flush_threshold:
+        key_logger.FLUSH_THRESHOLD = flush_threshold
+    flushing = threading.Event()
+    flush_times = []
+    flush = key_logger.flush
+
+    def timed_flush(*args, **kwargs):
+        flushing.set()
+        start = time.perf_counter()
+        try:
+            return flush(*args, **kwargs)
+        finally:
+            flush_times.append(time.perf_counter() - start)
+            flushing.clear()
+
+    key_logger.flush = timed_flush
+
+    # Per thread: all latencies, and latencies while a flush was running
+    latencies = [([], []) for _ in range(threads)]
+    ready = threading.Barrier(threads + 1)
+
+    def type_keys(samples, stalled):
+        clock = time.perf_counter
+        # The same hook KeyLogger.start installs
+        on_release = key_logger._on_release_measured if metrics.enabled else key_logger._on_release
+        ready.wait()
+        start = clock()
+        for i, key in enumerate(keys):
+            if schedule is not None:
+                wait = start + schedule[i] - clock()
+                if wait > 0.001:
+                    time.sleep(wait)
+                while clock() < start + schedule[i]:
+                    pass
+            before = clock()
+            on_release(key)
+            elapsed = clock() - before
+            samples.append(elapsed)
+            if flushing.is_set():
+                stalled.append(elapsed)
+
+    def run() -> tuple[float, int]:
+        before = database.get_total_keystrokes('all') if db == 'sqlite' else 0
+        if journal:
+            key_logger.open_journal()
+        key_logger.start_scheduler()
+        typists = [threading.Thread(target=type_keys, args=pair) for pair in latencies]
+        for thread in typists:
+            thread.start()
+        ready.wait()
+        start = time.perf_counter()
+        for thread in typists:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        key_logger.stop_scheduler()
+        key_logger.flush('exit')
+        if key_logger.journal is not None:
+            key_logger.journal.release()
+        if db == 'sqlite':
+            return elapsed, database.get_total_keystrokes('all') - before
+        return elapsed, sum(fake.written.values())
+
+    if db == 'sqlite':
+        with temp_database():
+            elapsed, written = run()
+    else:
+        with FakeDatabase(flush_delay) as fake:
+            elapsed, written = run()
+
+    samples = sorted(sample for pair in latencies for sample in pair[0])
+    stalled = [sample for pair in latencies for sample in pair[1]]
+    events = len(samples)
+    return {
+        'events': events,
+        'threads': threads,
+        'seconds': round(elapsed, 3),
+        'events_per_sec': round(events / elapsed) if elapsed else 0,
+        'p50_us': round(_percentile(samples, 0.5) * 1e6, 2),
+        'p99_us': round(_percentile(samples, 0.99) * 1e6, 2),
+        'max_us': round(samples[-1] * 1e6, 2),
+        'flushes': len(flush_times),
+        'flush_total_ms': round(sum(flush_times) * 1000, 2),
+        'flush_max_ms': round(max(flush_times, default=0) * 1000, 2),
+        'stall_max_us': round(max(stalled, default=0) * 1e6, 2),
+        'lost': events - written,
+    }
+
+
+def main():
+    import argparse
+    import json
+    import sys
+
+    parser = argparse.ArgumentParser(description='Replay keystrokes through the capture path.')
+    parser.add_argument('--stream', type=Path, help='recorded stream to replay (default: synthetic keys)')
+    parser.add_argument('--speed', type=float, default=1.0, help='playback speed for recorded offsets')
+    parser.add_argument('--events', type=int, default=200_000, help='synthetic keys per thread (default: 200000)')
+    parser.add_argument('--seconds', type=float, help='with --rate: replay for this long; with --record: record this long')
+    parser.add_argument('--threads', type=int, default=1, help='threads calling the hook (default: 1)')
+    parser.add_argument('--rate', type=float, default=0, help='keystrokes/sec across threads (default: flat out)')
+    parser.add_argument('--db', choices=['fake', 'sqlite'], default='fake', help='database to flush into')
+    parser.add_argument('--flush-delay', type=float, default=0.0, help='seconds each fake flush takes')
+    parser.add_argument('--flush-threshold', type=int, help='keystrokes that trigger a flush')
+    parser.add_argument('--journal', action='store_true', help='journal checkpoints (sqlite only)')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    parser.add_argument('--record', type=Path, help='record real keystrokes to this file instead')
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.record, args.seconds or 60)
+        return
+
+    offsets = None
+    if args.stream:
+        keys, offsets = load_stream(args.stream)
+    else:
+        count = args.events
+        if args.rate and args.seconds:
+            count = round(args.rate * args.seconds / args.threads)
+        keys = synthetic_keys(count)
+
+    try:
+        results = replay(keys, args.threads, args.rate, offsets, args.speed, args.db,
+                         args.flush_delay, args.flush_threshold, args.journal)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.json:
+        print(json.dumps(results))
+    else:
+        for metric, value in results.items():
+            print(f'{metric:<16} {value}')
+    if results['lost']:
+        sys.exit(f"{results['lost']} keystrokes were not written")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,16 @@
+import os
+import base64
+import shutil
 import tempfile
 import webbrowser
 import json
+from datetime import date
+from functools import lru_cache
 from pathlib import Path
+from typing import Optional
+import analytics
 import database
+import metrics
 
 
 # Full-size keyboard layout definition
@@ -86,35 +94,42 @@ KEYBOARD_LAYOUT = {
 }
 
 
-def generate_html() -> str:
-    """Generate the heat map HTML with all-time data."""
-    key_counts = database.get_key_counts('all')
-    top_keys = key_counts.most_common(10)
-    stats = database.get_statistics()
-
-    max_count = max(key_counts.values()) if key_counts else 1
-
-    # Format statistics
-    tracking_since = stats['tracking_since'] or 'N/A'
-    most_active_day = stats['most_active_day']
-    most_active_str = f"{most_active_day[0]} ({most_active_day[1]:,})" if most_active_day else 'N/A'
-
-    # Convert counts to JSON for JavaScript
-    counts_json = json.dumps(dict(key_counts))
-    top_keys_json = json.dumps(top_keys)
-
-    html = f'''<!DOCTYPE html>
+# Placeholders in HTML_TEMPLATE: the JSON report data, and the inlined fonts
+DATA_PLACEHOLDER = '__REPORT_DATA__'
+FONTS_PLACEHOLDER = '__FONT_FACES__'
+
+# Offline report assets, shipped under assets/report/ (see fetch_assets).
+# Bump ASSET_VERSION whenever the files change so stale AppData copies are replaced.
+ASSET_VERSION = 1
+BUNDLED_ASSET_DIR = Path(__file__).parent / 'assets' / 'report'
+FONT_FILES = [
+    # (family, weight, file): subset woff2, inlined into the page
+    ('JetBrains Mono', 400, 'jetbrains-mono-400.woff2'),
+    ('JetBrains Mono', 600, 'jetbrains-mono-600.woff2'),
+    ('JetBrains Mono', 700, 'jetbrains-mono-700.woff2'),
+    ('Orbitron', 500, 'orbitron-500.woff2'),
+    ('Orbitron', 700, 'orbitron-700.woff2'),
+]
+HTML2CANVAS_FILE = 'html2canvas.min.js'
+HTML2CANVAS_URL = 'https://cdn.jsdelivr.net/npm/html2canvas@1.4.1/dist/html2canvas.min.js'
+GOOGLE_FONTS_URL = ('https://fonts.googleapis.com/css2?family=JetBrains+Mono:wght@400;600;700'
+                    '&family=Orbitron:wght@500;700')
+# Characters the fonts are subset to; anything else uses the system fallbacks
+FONT_SUBSET = ''.join(chr(c) for c in range(0x20, 0x7F)) + '\u2190\u2191\u2192\u2193\u00b7'
+
+# Static page shell: all CSS, layout and JavaScript. Only the data payload
+# changes between reports, so the template is split once at import.
+HTML_TEMPLATE = '''<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>Keyboard Heat Map</title>
-    <link rel="preconnect" href="https://fonts.googleapis.com">
-    <link rel="preconnect" href="https://fonts.gstatic.com" crossorigin>
-    <link href="https://fonts.googleapis.com/css2?family=JetBrains+Mono:wght@400;600;700&family=Orbitron:wght@500;700&display=swap" rel="stylesheet">
-    <script src="https://html2canvas.hertzen.com/dist/html2canvas.min.js"></script>
+    <style>__FONT_FACES__</style>
     <style>
-        :root {{
+        :root {
+            --font-mono: 'JetBrains Mono', Consolas, 'Cascadia Mono', Menlo, 'DejaVu Sans Mono', monospace;
+            --font-display: 'Orbitron', Bahnschrift, 'Segoe UI', 'DejaVu Sans', sans-serif;
             --bg-dark: #0a0a0f;
             --bg-keyboard: #1a1a24;
             --key-bg: #2a2a38;
@@ -124,23 +139,23 @@ def generate_html() -> str:
             --glow-color-mid: #00ddff;
             --glow-color-high: #ff00aa;
             --accent: #00ffaa;
-        }}
+        }
 
-        * {{
+        * {
             margin: 0;
             padding: 0;
             box-sizing: border-box;
-        }}
+        }
 
-        body {{
-            font-family: 'JetBrains Mono', monospace;
+        body {
+            font-family: var(--font-mono);
             background: var(--bg-dark);
             min-height: 100vh;
             color: #fff;
             overflow-x: hidden;
-        }}
+        }
 
-        .background {{
+        .background {
             position: fixed;
             top: 0;
             left: 0;
@@ -152,21 +167,21 @@ def generate_html() -> str:
                 radial-gradient(ellipse at 50% 50%, rgba(0, 221, 255, 0.04) 0%, transparent 60%);
             pointer-events: none;
             z-index: -1;
-        }}
+        }
 
-        .container {{
+        .container {
             max-width: 1400px;
             margin: 0 auto;
             padding: 40px 20px;
-        }}
+        }
 
-        header {{
+        header {
             text-align: center;
             margin-bottom: 40px;
-        }}
+        }
 
-        h1 {{
-            font-family: 'Orbitron', sans-serif;
+        h1 {
+            font-family: var(--font-display);
             font-size: 2.5rem;
             font-weight: 700;
             background: linear-gradient(135deg, var(--glow-color), var(--glow-color-mid), var(--glow-color-high));
@@ -176,23 +191,23 @@ def generate_html() -> str:
             text-shadow: 0 0 40px rgba(0, 255, 170, 0.3);
             letter-spacing: 4px;
             margin-bottom: 10px;
-        }}
+        }
 
-        .subtitle {{
+        .subtitle {
             color: var(--key-text);
             font-size: 0.9rem;
             letter-spacing: 2px;
-        }}
+        }
 
-        .stats-section {{
+        .stats-section {
             display: flex;
             justify-content: center;
             gap: 12px;
             flex-wrap: wrap;
             margin-bottom: 30px;
-        }}
+        }
 
-        .stat-card {{
+        .stat-card {
             background: var(--key-bg);
             border: 1px solid var(--key-border);
             border-radius: 8px;
@@ -204,37 +219,37 @@ def generate_html() -> str:
                 0 4px 0 #1a1a24,
                 0 6px 10px rgba(0, 0, 0, 0.3);
             transition: all 0.3s ease;
-        }}
+        }
 
-        .stat-card:hover {{
+        .stat-card:hover {
             transform: translateY(-2px);
             box-shadow:
                 0 6px 0 #1a1a24,
                 0 8px 15px rgba(0, 0, 0, 0.4);
-        }}
+        }
 
-        .stat-value {{
-            font-family: 'Orbitron', sans-serif;
+        .stat-value {
+            font-family: var(--font-display);
             font-size: 1.4rem;
             font-weight: 700;
             color: var(--accent);
             text-shadow: 0 0 15px rgba(0, 255, 170, 0.3);
-        }}
+        }
 
-        .stat-label {{
+        .stat-label {
             color: var(--key-text);
             font-size: 0.75rem;
             letter-spacing: 0.5px;
             margin-top: 6px;
-        }}
+        }
 
-        .keyboard-container {{
+        .keyboard-container {
             display: flex;
             justify-content: center;
             margin-bottom: 30px;
-        }}
+        }
 
-        .keyboard {{
+        .keyboard {
             background: var(--bg-keyboard);
             border-radius: 16px;
             padding: 20px;
@@ -244,21 +259,21 @@ def generate_html() -> str:
                 0 20px 60px rgba(0, 0, 0, 0.5),
                 inset 0 1px 0 rgba(255, 255, 255, 0.05);
             border: 1px solid rgba(255, 255, 255, 0.05);
-        }}
+        }
 
-        .keyboard-section {{
+        .keyboard-section {
             display: flex;
             flex-direction: column;
             gap: 4px;
-        }}
+        }
 
-        .keyboard-row {{
+        .keyboard-row {
             display: flex;
             gap: 4px;
             height: 48px;
-        }}
+        }
 
-        .key {{
+        .key {
             background: var(--key-bg);
             border: 1px solid var(--key-border);
             border-radius: 6px;
@@ -274,16 +289,16 @@ def generate_html() -> str:
                 0 4px 0 #1a1a24,
                 0 6px 10px rgba(0, 0, 0, 0.3);
             text-shadow: 0 1px 2px rgba(0, 0, 0, 0.5);
-        }}
+        }
 
-        .key:hover {{
+        .key:hover {
             transform: translateY(-2px);
             box-shadow:
                 0 6px 0 #1a1a24,
                 0 8px 15px rgba(0, 0, 0, 0.4);
-        }}
+        }
 
-        .key.glow-1 {{
+        .key.glow-1 {
             background: linear-gradient(180deg, #2a3a38 0%, #2a2a38 100%);
             border-color: rgba(0, 255, 170, 0.3);
             color: rgba(0, 255, 170, 0.8);
@@ -291,9 +306,9 @@ def generate_html() -> str:
                 0 4px 0 #1a2a28,
                 0 6px 10px rgba(0, 0, 0, 0.3),
                 0 0 15px rgba(0, 255, 170, 0.1);
-        }}
+        }
 
-        .key.glow-2 {{
+        .key.glow-2 {
             background: linear-gradient(180deg, #2a4a45 0%, #2a3a38 100%);
             border-color: rgba(0, 255, 170, 0.5);
             color: rgba(0, 255, 170, 0.9);
@@ -301,9 +316,9 @@ def generate_html() -> str:
                 0 4px 0 #1a3a35,
                 0 6px 10px rgba(0, 0, 0, 0.3),
                 0 0 20px rgba(0, 255, 170, 0.2);
-        }}
+        }
 
-        .key.glow-3 {{
+        .key.glow-3 {
             background: linear-gradient(180deg, #2a5a52 0%, #2a4a45 100%);
             border-color: rgba(0, 221, 255, 0.5);
             color: #00ffaa;
@@ -311,9 +326,9 @@ def generate_html() -> str:
                 0 4px 0 #1a4a42,
                 0 6px 10px rgba(0, 0, 0, 0.3),
                 0 0 25px rgba(0, 255, 170, 0.3);
-        }}
+        }
 
-        .key.glow-4 {{
+        .key.glow-4 {
             background: linear-gradient(180deg, #2a6a5f 0%, #2a5a52 100%);
             border-color: rgba(0, 221, 255, 0.7);
             color: #00ffdd;
@@ -322,9 +337,9 @@ def generate_html() -> str:
                 0 4px 0 #1a5a4f,
                 0 6px 10px rgba(0, 0, 0, 0.3),
                 0 0 30px rgba(0, 221, 255, 0.3);
-        }}
+        }
 
-        .key.glow-5 {{
+        .key.glow-5 {
             background: linear-gradient(180deg, #3a7a6f 0%, #2a6a5f 100%);
             border-color: rgba(0, 221, 255, 0.9);
             color: #00ffff;
@@ -333,9 +348,9 @@ def generate_html() -> str:
                 0 4px 0 #2a6a5f,
                 0 6px 10px rgba(0, 0, 0, 0.3),
                 0 0 35px rgba(0, 221, 255, 0.4);
-        }}
+        }
 
-        .key.glow-max {{
+        .key.glow-max {
             background: linear-gradient(180deg, #5a4a6a 0%, #4a3a5a 100%);
             border-color: rgba(255, 0, 170, 0.9);
             color: #ff44dd;
@@ -345,68 +360,68 @@ def generate_html() -> str:
                 0 6px 10px rgba(0, 0, 0, 0.3),
                 0 0 40px rgba(255, 0, 170, 0.5);
             animation: pulse 2s ease-in-out infinite;
-        }}
+        }
 
-        @keyframes pulse {{
-            0%, 100% {{ box-shadow: 0 4px 0 #3a2a4a, 0 6px 10px rgba(0, 0, 0, 0.3), 0 0 40px rgba(255, 0, 170, 0.5); }}
-            50% {{ box-shadow: 0 4px 0 #3a2a4a, 0 6px 10px rgba(0, 0, 0, 0.3), 0 0 60px rgba(255, 0, 170, 0.7); }}
-        }}
+        @keyframes pulse {
+            0%, 100% { box-shadow: 0 4px 0 #3a2a4a, 0 6px 10px rgba(0, 0, 0, 0.3), 0 0 40px rgba(255, 0, 170, 0.5); }
+            50% { box-shadow: 0 4px 0 #3a2a4a, 0 6px 10px rgba(0, 0, 0, 0.3), 0 0 60px rgba(255, 0, 170, 0.7); }
+        }
 
         /* Top 3 keys - purple shades */
-        .key.top-1 {{
+        .key.top-1 {
             background: linear-gradient(180deg, #6a3a7a 0%, #5a2a6a 100%);
             border-color: rgba(255, 0, 170, 1);
             color: #ff66ee;
             text-shadow: 0 0 20px rgba(255, 0, 170, 0.9);
             box-shadow: 0 4px 0 #4a1a5a, 0 6px 10px rgba(0, 0, 0, 0.3), 0 0 50px rgba(255, 0, 170, 0.6);
             animation: pulse 2s ease-in-out infinite;
-        }}
+        }
 
-        .key.top-2 {{
+        .key.top-2 {
             background: linear-gradient(180deg, #5a3a6a 0%, #4a2a5a 100%);
             border-color: rgba(255, 0, 170, 0.8);
             color: #ee55dd;
             text-shadow: 0 0 15px rgba(255, 0, 170, 0.7);
             box-shadow: 0 4px 0 #3a1a4a, 0 6px 10px rgba(0, 0, 0, 0.3), 0 0 40px rgba(255, 0, 170, 0.4);
-        }}
+        }
 
-        .key.top-3 {{
+        .key.top-3 {
             background: linear-gradient(180deg, #4a3a5a 0%, #3a2a4a 100%);
             border-color: rgba(255, 0, 170, 0.6);
             color: #dd44cc;
             text-shadow: 0 0 10px rgba(255, 0, 170, 0.5);
             box-shadow: 0 4px 0 #2a1a3a, 0 6px 10px rgba(0, 0, 0, 0.3), 0 0 30px rgba(255, 0, 170, 0.3);
-        }}
+        }
 
-        .key-count {{
+        .key-count {
             position: absolute;
             bottom: 2px;
             right: 4px;
             font-size: 0.5rem;
             opacity: 0.7;
-        }}
+        }
 
-        .top-keys-section {{
+        .top-keys-section {
             text-align: center;
-        }}
+        }
 
-        .top-keys-title {{
-            font-family: 'Orbitron', sans-serif;
+        .top-keys-title {
+            font-family: var(--font-display);
             font-size: 0.75rem;
             color: var(--key-text);
             letter-spacing: 2px;
             text-transform: uppercase;
             margin-bottom: 16px;
-        }}
+        }
 
-        .top-keys-list {{
+        .top-keys-list {
             display: flex;
             justify-content: center;
             gap: 12px;
             flex-wrap: wrap;
-        }}
+        }
 
-        .top-key-card {{
+        .top-key-card {
             background: var(--key-bg);
             border: 1px solid var(--key-border);
             border-radius: 8px;
@@ -417,105 +432,139 @@ def generate_html() -> str:
                 0 4px 0 #1a1a24,
                 0 6px 10px rgba(0, 0, 0, 0.3);
             transition: all 0.3s ease;
-        }}
+        }
 
-        .top-key-card:hover {{
+        .top-key-card:hover {
             transform: translateY(-2px);
             box-shadow:
                 0 6px 0 #1a1a24,
                 0 8px 15px rgba(0, 0, 0, 0.4);
-        }}
+        }
 
-        .top-key-card.glow-1 {{
+        .top-key-card.glow-1 {
             background: linear-gradient(180deg, #2a3a38 0%, #2a2a38 100%);
             border-color: rgba(0, 255, 170, 0.3);
             box-shadow: 0 4px 0 #1a2a28, 0 6px 10px rgba(0, 0, 0, 0.3), 0 0 15px rgba(0, 255, 170, 0.1);
-        }}
+        }
 
-        .top-key-card.glow-2 {{
+        .top-key-card.glow-2 {
             background: linear-gradient(180deg, #2a4a45 0%, #2a3a38 100%);
             border-color: rgba(0, 255, 170, 0.5);
             box-shadow: 0 4px 0 #1a3a35, 0 6px 10px rgba(0, 0, 0, 0.3), 0 0 20px rgba(0, 255, 170, 0.2);
-        }}
+        }
 
-        .top-key-card.glow-3 {{
+        .top-key-card.glow-3 {
             background: linear-gradient(180deg, #2a5a52 0%, #2a4a45 100%);
             border-color: rgba(0, 221, 255, 0.5);
             box-shadow: 0 4px 0 #1a4a42, 0 6px 10px rgba(0, 0, 0, 0.3), 0 0 25px rgba(0, 255, 170, 0.3);
-        }}
+        }
 
-        .top-key-card.glow-4 {{
+        .top-key-card.glow-4 {
             background: linear-gradient(180deg, #2a6a5f 0%, #2a5a52 100%);
             border-color: rgba(0, 221, 255, 0.7);
             box-shadow: 0 4px 0 #1a5a4f, 0 6px 10px rgba(0, 0, 0, 0.3), 0 0 30px rgba(0, 221, 255, 0.3);
-        }}
+        }
 
-        .top-key-card.glow-5 {{
+        .top-key-card.glow-5 {
             background: linear-gradient(180deg, #3a7a6f 0%, #2a6a5f 100%);
             border-color: rgba(0, 221, 255, 0.9);
             box-shadow: 0 4px 0 #2a6a5f, 0 6px 10px rgba(0, 0, 0, 0.3), 0 0 35px rgba(0, 221, 255, 0.4);
-        }}
+        }
 
-        .top-key-card.glow-max {{
+        .top-key-card.glow-max {
             background: linear-gradient(180deg, #5a4a6a 0%, #4a3a5a 100%);
             border-color: rgba(255, 0, 170, 0.9);
             box-shadow: 0 4px 0 #3a2a4a, 0 6px 10px rgba(0, 0, 0, 0.3), 0 0 40px rgba(255, 0, 170, 0.5);
             animation: pulse 2s ease-in-out infinite;
-        }}
+        }
 
         /* Top 3 cards - purple shades */
-        .top-key-card.top-1 {{
+        .top-key-card.top-1 {
             background: linear-gradient(180deg, #6a3a7a 0%, #5a2a6a 100%);
             border-color: rgba(255, 0, 170, 1);
             box-shadow: 0 4px 0 #4a1a5a, 0 6px 10px rgba(0, 0, 0, 0.3), 0 0 50px rgba(255, 0, 170, 0.6);
             animation: pulse 2s ease-in-out infinite;
-        }}
+        }
 
-        .top-key-card.top-2 {{
+        .top-key-card.top-2 {
             background: linear-gradient(180deg, #5a3a6a 0%, #4a2a5a 100%);
             border-color: rgba(255, 0, 170, 0.8);
             box-shadow: 0 4px 0 #3a1a4a, 0 6px 10px rgba(0, 0, 0, 0.3), 0 0 40px rgba(255, 0, 170, 0.4);
-        }}
+        }
 
-        .top-key-card.top-3 {{
+        .top-key-card.top-3 {
             background: linear-gradient(180deg, #4a3a5a 0%, #3a2a4a 100%);
             border-color: rgba(255, 0, 170, 0.6);
             box-shadow: 0 4px 0 #2a1a3a, 0 6px 10px rgba(0, 0, 0, 0.3), 0 0 30px rgba(255, 0, 170, 0.3);
-        }}
+        }
 
-        .top-key-header {{
+        .top-key-header {
             display: flex;
             align-items: center;
             justify-content: center;
             gap: 6px;
             margin-bottom: 4px;
-        }}
+        }
 
-        .top-key-rank {{
-            font-family: 'Orbitron', sans-serif;
+        .top-key-rank {
+            font-family: var(--font-display);
             font-size: 0.65rem;
             color: var(--key-text);
-        }}
+        }
 
-        .top-key-name {{
+        .top-key-name {
             font-weight: 700;
             font-size: 1rem;
             color: #fff;
-        }}
+        }
+
+        .top-key-count {
+            font-family: var(--font-display);
+            font-size: 0.8rem;
+            color: var(--accent);
+        }
+
+        .period-section {
+            display: flex;
+            justify-content: center;
+            gap: 8px;
+            flex-wrap: wrap;
+            margin-bottom: 24px;
+        }
 
-        .top-key-count {{
-            font-family: 'Orbitron', sans-serif;
+        .period-btn {
+            background: var(--key-bg);
+            border: 1px solid var(--key-border);
+            border-radius: 6px;
+            padding: 8px 16px;
+            color: var(--key-text);
+            font-family: var(--font-mono);
             font-size: 0.8rem;
+            font-weight: 600;
+            cursor: pointer;
+            box-shadow: 0 3px 0 #1a1a24;
+            transition: all 0.2s ease;
+        }
+
+        .period-btn:hover {
             color: var(--accent);
-        }}
+        }
+
+        .period-btn.active {
+            color: var(--accent);
+            border-color: rgba(0, 255, 170, 0.5);
+            box-shadow:
+                0 3px 0 #1a1a24,
+                0 0 12px rgba(0, 255, 170, 0.2);
+        }
 
-        .download-section {{
+        .download-section {
             display: flex;
             justify-content: center;
             margin: 30px 0;
-        }}
+        }
 
-        .download-btn {{
+        .download-btn {
             display: flex;
             align-items: center;
             gap: 8px;
@@ -524,7 +573,7 @@ def generate_html() -> str:
             border-radius: 8px;
             padding: 12px 24px;
             color: var(--key-text);
-            font-family: 'JetBrains Mono', monospace;
+            font-family: var(--font-mono);
             font-size: 0.85rem;
             font-weight: 600;
             cursor: pointer;
@@ -532,9 +581,9 @@ def generate_html() -> str:
                 0 4px 0 #1a1a24,
                 0 6px 10px rgba(0, 0, 0, 0.3);
             transition: all 0.3s ease;
-        }}
+        }
 
-        .download-btn:hover {{
+        .download-btn:hover {
             transform: translateY(-2px);
             color: var(--accent);
             border-color: rgba(0, 255, 170, 0.3);
@@ -542,41 +591,75 @@ def generate_html() -> str:
                 0 6px 0 #1a1a24,
                 0 8px 15px rgba(0, 0, 0, 0.4),
                 0 0 15px rgba(0, 255, 170, 0.1);
-        }}
+        }
 
-        .download-btn:active {{
+        .download-btn:active {
             transform: translateY(2px);
             box-shadow:
                 0 2px 0 #1a1a24,
                 0 4px 8px rgba(0, 0, 0, 0.3);
-        }}
+        }
 
-        .download-btn:disabled {{
+        .download-btn:disabled {
             opacity: 0.6;
             cursor: not-allowed;
-        }}
+        }
 
-        .download-btn svg {{
+        .download-btn svg {
             width: 18px;
             height: 18px;
-        }}
+        }
+
+        .diagnostics {
+            max-width: 640px;
+            margin: 40px auto 0;
+            color: var(--key-text);
+            font-size: 0.75rem;
+        }
 
-        .footer {{
+        .diagnostics summary {
+            font-family: var(--font-display);
+            letter-spacing: 2px;
+            text-transform: uppercase;
+            text-align: center;
+            cursor: pointer;
+        }
+
+        .diagnostics table {
+            width: 100%;
+            margin-top: 16px;
+            border-collapse: collapse;
+            font-family: var(--font-mono);
+        }
+
+        .diagnostics th,
+        .diagnostics td {
+            padding: 4px 8px;
+            border-bottom: 1px solid var(--key-border);
+            text-align: right;
+        }
+
+        .diagnostics th:first-child,
+        .diagnostics td:first-child {
+            text-align: left;
+        }
+
+        .footer {
             text-align: center;
             margin-top: 50px;
             color: var(--key-text);
             font-size: 0.75rem;
-        }}
+        }
 
-        .footer-link {{
+        .footer-link {
             color: var(--key-text);
             text-decoration: none;
             transition: color 0.3s ease;
-        }}
+        }
 
-        .footer-link:hover {{
+        .footer-link:hover {
             color: var(--accent);
-        }}
+        }
     </style>
 </head>
 <body>
@@ -587,32 +670,9 @@ def generate_html() -> str:
             <p class="subtitle">Your typing patterns visualized</p>
         </header>
 
-        <div class="stats-section">
-            <div class="stat-card">
-                <div class="stat-value">{stats['total_keystrokes']:,}</div>
-                <div class="stat-label">Total Keystrokes</div>
-            </div>
-            <div class="stat-card">
-                <div class="stat-value">{stats['keys_per_day']:,}</div>
-                <div class="stat-label">Keys per Day</div>
-            </div>
-            <div class="stat-card">
-                <div class="stat-value">{stats['keys_per_hour']:,}</div>
-                <div class="stat-label">Keys per Hour</div>
-            </div>
-            <div class="stat-card">
-                <div class="stat-value">{tracking_since}</div>
-                <div class="stat-label">Tracking Since</div>
-            </div>
-            <div class="stat-card">
-                <div class="stat-value">{stats['days_tracked']}</div>
-                <div class="stat-label">Days Tracked</div>
-            </div>
-            <div class="stat-card">
-                <div class="stat-value">{most_active_str}</div>
-                <div class="stat-label">Most Active Day</div>
-            </div>
-        </div>
+        <div class="stats-section" id="stats-section"></div>
+
+        <div class="period-section" id="period-section"></div>
 
         <div class="keyboard-container">
             <div class="keyboard">
@@ -638,6 +698,12 @@ def generate_html() -> str:
             <div class="top-keys-list" id="top-keys-list"></div>
         </div>
 
+        <details class="diagnostics" id="diagnostics" hidden>
+            <summary>Diagnostics</summary>
+            <table id="diagnostics-summary"></table>
+            <table id="diagnostics-queries"></table>
+        </details>
+
         <footer class="footer">
             <a href="https://github.com/semihsmg/heat-map" target="_blank" class="footer-link">
                 <svg height="16" width="16" viewBox="0 0 16 16" fill="currentColor" style="vertical-align: middle; margin-right: 6px;">
@@ -649,17 +715,24 @@ def generate_html() -> str:
     </div>
 
     <script>
-        const keyCounts = {counts_json};
-        const topKeys = {top_keys_json};
-        const maxCount = {max_count};
+        const reportData = __REPORT_DATA__;
+        const periods = {};
+        reportData.periods.forEach(period => { periods[period.id] = period; });
+        let activePeriod = reportData.defaultPeriod;
+        let keyCounts = {};
+        let topKeys = [];
+        let maxCount = 1;
 
         // Map top 3 keys for purple styling
-        const top3Keys = {{}};
-        topKeys.slice(0, 3).forEach((item, index) => {{
-            top3Keys[item[0]] = index + 1;  // 1, 2, or 3
-        }});
-
-        const keyboardLayout = {{
+        let top3Keys = {};
+        function rankTopKeys() {
+            top3Keys = {};
+            topKeys.slice(0, 3).forEach((item, index) => {
+                top3Keys[item[0]] = index + 1;  // 1, 2, or 3
+            });
+        }
+
+        const keyboardLayout = {
             main: [
                 [
                     ['Esc', 'Esc', 1],
@@ -715,9 +788,9 @@ def generate_html() -> str:
                 [['Num1', '1', 1], ['Num2', '2', 1], ['Num3', '3', 1], ['NumEnter', 'Ent', 1, 2]],
                 [['Num0', '0', 2], ['Num.', '.', 1]],
             ]
-        }};
+        };
 
-        function getGlowClass(count) {{
+        function getGlowClass(count) {
             if (count === 0) return '';
             const ratio = count / maxCount;
             if (ratio >= 0.9) return 'glow-max';
@@ -726,78 +799,114 @@ def generate_html() -> str:
             if (ratio >= 0.3) return 'glow-3';
             if (ratio >= 0.15) return 'glow-2';
             return 'glow-1';
-        }}
+        }
 
-        function renderKeyboard(section, layout) {{
+        function renderKeyboard(section, layout) {
             const container = document.getElementById(section + '-section');
             container.innerHTML = '';
 
-            layout.forEach((row, rowIndex) => {{
-                if (row.length === 0) {{
+            layout.forEach((row, rowIndex) => {
+                if (row.length === 0) {
                     const emptyRow = document.createElement('div');
                     emptyRow.className = 'keyboard-row';
                     emptyRow.innerHTML = '<div style="height: 48px;"></div>';
                     container.appendChild(emptyRow);
                     return;
-                }}
+                }
 
                 const rowDiv = document.createElement('div');
                 rowDiv.className = 'keyboard-row';
 
-                row.forEach(keyDef => {{
+                row.forEach(keyDef => {
                     const [keyId, label, width, height] = keyDef;
 
-                    if (keyId === '_gap') {{
+                    if (keyId === '_gap') {
                         const gap = document.createElement('div');
                         gap.style.width = (width * 48) + 'px';
                         rowDiv.appendChild(gap);
                         return;
-                    }}
+                    }
 
                     const keyDiv = document.createElement('div');
                     keyDiv.className = 'key';
                     keyDiv.style.width = (width * 48 + (width - 1) * 4) + 'px';
 
-                    if (height && height > 1) {{
+                    if (height && height > 1) {
                         keyDiv.style.height = (height * 48 + (height - 1) * 4) + 'px';
                         keyDiv.style.position = 'absolute';
                         keyDiv.style.marginLeft = (row.indexOf(keyDef) * 52) + 'px';
-                    }}
+                    }
 
                     const count = keyCounts[keyId] || keyCounts[keyId.toLowerCase()] || 0;
 
                     // Check if this is a top 3 key
                     const topRank = top3Keys[keyId] || top3Keys[keyId.toLowerCase()];
-                    if (topRank) {{
+                    if (topRank) {
                         keyDiv.classList.add('top-' + topRank);
-                    }} else {{
+                    } else {
                         const glowClass = getGlowClass(count);
                         if (glowClass) keyDiv.classList.add(glowClass);
-                    }}
+                    }
 
                     keyDiv.innerHTML = label;
-                    if (count > 0) {{
+                    if (count > 0) {
                         keyDiv.innerHTML += '<span class="key-count">' + count.toLocaleString() + '</span>';
-                    }}
+                    }
 
                     keyDiv.title = keyId + ': ' + count.toLocaleString() + ' presses';
                     rowDiv.appendChild(keyDiv);
-                }});
+                });
 
                 container.appendChild(rowDiv);
-            }});
-        }}
+            });
+        }
 
-        function renderTopKeys() {{
+        function renderStats() {
+            const container = document.getElementById('stats-section');
+            container.innerHTML = '';
+
+            reportData.stats.forEach(([value, label]) => {
+                const card = document.createElement('div');
+                card.className = 'stat-card';
+                card.innerHTML = '<div class="stat-value"></div><div class="stat-label"></div>';
+                card.children[0].textContent = value;
+                card.children[1].textContent = label;
+                container.appendChild(card);
+            });
+        }
+
+        function fillTable(table, rows, header) {
+            table.innerHTML = '';
+            [header, ...rows].forEach((cells, index) => {
+                if (!cells) return;
+                const row = table.insertRow();
+                cells.forEach(value => {
+                    const cell = document.createElement(index === 0 && header ? 'th' : 'td');
+                    cell.textContent = value;
+                    row.appendChild(cell);
+                });
+            });
+        }
+
+        function renderDiagnostics() {
+            const diagnostics = reportData.diagnostics;
+            if (!diagnostics) return;
+            fillTable(document.getElementById('diagnostics-summary'), diagnostics.summary);
+            fillTable(document.getElementById('diagnostics-queries'), diagnostics.queries,
+                ['Query', 'Calls', 'Mean (\u00b5s)', 'Max (\u00b5s)']);
+            document.getElementById('diagnostics').hidden = false;
+        }
+
+        function renderTopKeys() {
             const container = document.getElementById('top-keys-list');
             container.innerHTML = '';
 
-            if (topKeys.length === 0) {{
+            if (topKeys.length === 0) {
                 container.innerHTML = '<p style="color: var(--key-text);">No data yet</p>';
                 return;
-            }}
+            }
 
-            topKeys.forEach((item, index) => {{
+            topKeys.forEach((item, index) => {
                 const [key, count] = item;
 
                 // Capitalize single letter keys
@@ -805,31 +914,167 @@ def generate_html() -> str:
 
                 const card = document.createElement('div');
                 // Top 3 get purple styling, rest get glow class
-                if (index < 3) {{
+                if (index < 3) {
                     card.className = 'top-key-card top-' + (index + 1);
-                }} else {{
+                } else {
                     const glowClass = getGlowClass(count);
                     card.className = 'top-key-card' + (glowClass ? ' ' + glowClass : '');
-                }}
+                }
                 card.innerHTML = `
                     <div class="top-key-header">
-                        <span class="top-key-rank">#${{index + 1}}</span>
-                        <span class="top-key-name">${{displayKey}}</span>
+                        <span class="top-key-rank">#${index + 1}</span>
+                        <span class="top-key-name">${displayKey}</span>
                     </div>
-                    <div class="top-key-count">${{count.toLocaleString()}}</div>
+                    <div class="top-key-count">${count.toLocaleString()}</div>
                 `;
                 container.appendChild(card);
-            }});
-        }}
+            });
+        }
+
+        function renderPeriodButtons() {
+            const container = document.getElementById('period-section');
+            container.innerHTML = '';
+
+            reportData.periods.forEach(period => {
+                const btn = document.createElement('button');
+                btn.className = 'period-btn' + (period.id === activePeriod ? ' active' : '');
+                btn.textContent = period.label;
+                btn.onclick = () => showPeriod(period.id);
+                container.appendChild(btn);
+            });
+        }
+
+        // Derive the top keys and glow scale from the active period's counts
+        function useCounts(counts) {
+            keyCounts = counts;
+            const sorted = Object.entries(keyCounts).sort((a, b) => b[1] - a[1]);
+            topKeys = sorted.slice(0, 10);
+            maxCount = sorted.length ? sorted[0][1] : 1;
+            rankTopKeys();
+        }
+
+        function renderCounts() {
+            renderKeyboard('main', keyboardLayout.main);
+            renderKeyboard('nav', keyboardLayout.nav);
+            renderKeyboard('numpad', keyboardLayout.numpad);
+            renderTopKeys();
+        }
+
+        let renderQueued = false;
+        function showPeriod(periodId) {
+            activePeriod = periodId;
+            useCounts(periods[periodId].counts);
+            renderPeriodButtons();
+            if (!renderQueued) {
+                renderQueued = true;
+                requestAnimationFrame(() => {
+                    renderQueued = false;
+                    renderCounts();
+                });
+            }
+        }
 
         // Render everything
-        renderKeyboard('main', keyboardLayout.main);
-        renderKeyboard('nav', keyboardLayout.nav);
-        renderKeyboard('numpad', keyboardLayout.numpad);
-        renderTopKeys();
+        useCounts(periods[activePeriod].counts);
+        renderStats();
+        renderDiagnostics();
+        renderPeriodButtons();
+        renderCounts();
+
+        // Live updates when served by server.py
+        function periodUrl(period) {
+            if (period.start) return '/api/counts?start=' + period.start + '&end=' + period.end;
+            return '/api/counts?period=' + period.id;
+        }
+
+        if (location.protocol.startsWith('http') && window.EventSource) {
+            const events = new EventSource('/api/events');
+            let stale = false;
+            events.onerror = () => { stale = true; };
+            events.onopen = () => {
+                // Deltas sent while disconnected are lost, so reload the counts
+                if (!stale) return;
+                stale = false;
+                reportData.periods.filter(period => period.live).forEach(period => {
+                    fetch(periodUrl(period)).then(r => r.json()).then(counts => {
+                        period.counts = counts;
+                        if (period.id === activePeriod) showPeriod(period.id);
+                    });
+                });
+            };
+            events.onmessage = (event) => {
+                const deltas = JSON.parse(event.data);
+                reportData.periods.filter(period => period.live).forEach(period => {
+                    const counts = Object.assign({}, period.counts);
+                    for (const key in deltas) counts[key] = (counts[key] || 0) + deltas[key];
+                    period.counts = counts;
+                });
+                showPeriod(activePeriod);
+            };
+        }
+
+        // Ask server.py to render the active period with Pillow
+        async function fetchRenderedImage() {
+            const period = periods[activePeriod];
+            const query = period.start ? 'start=' + period.start + '&end=' + period.end : 'period=' + period.id;
+            const response = await fetch('/api/image.png?' + query);
+            if (!response.ok) throw new Error('Render failed: ' + response.status);
+            return URL.createObjectURL(await response.blob());
+        }
+
+        // html2canvas is only loaded on the first file-mode download, from the
+        // local asset cache when available, so opening the page never waits on it
+        function loadHtml2canvas() {
+            if (window.html2canvas) return Promise.resolve();
+            return new Promise((resolve, reject) => {
+                const script = document.createElement('script');
+                script.src = reportData.assets.html2canvas || reportData.assets.html2canvasFallback;
+                script.onload = resolve;
+                script.onerror = () => reject(new Error('Could not load html2canvas'));
+                document.head.appendChild(script);
+            });
+        }
+
+        // Rasterize the page in the browser (report opened from a file)
+        async function captureScreenshot(container) {
+            await loadHtml2canvas();
+            // Clone the container and position at 0,0
+            const clone = container.cloneNode(true);
+            clone.style.position = 'absolute';
+            clone.style.left = '0';
+            clone.style.top = '0';
+            clone.style.margin = '0';
+            clone.style.padding = '80px';
+            clone.style.zIndex = '-9999';
+            // Add dark background with gradient glows
+            clone.style.background = `
+                radial-gradient(ellipse at 20% 80%, rgba(0, 255, 170, 0.08) 0%, transparent 50%),
+                radial-gradient(ellipse at 80% 20%, rgba(255, 0, 170, 0.06) 0%, transparent 50%),
+                radial-gradient(ellipse at 50% 50%, rgba(0, 221, 255, 0.04) 0%, transparent 60%),
+                #0a0a0f
+            `;
+            document.body.appendChild(clone);
+
+            // Hide download button in clone
+            const cloneDownloadSection = clone.querySelector('#download-section');
+            if (cloneDownloadSection) cloneDownloadSection.style.display = 'none';
+
+            try {
+                const canvas = await html2canvas(clone, {
+                    scale: 2,
+                    useCORS: true,
+                    allowTaint: true,
+                    foreignObjectRendering: true,
+                    backgroundColor: '#0a0a0f'
+                });
+                return canvas.toDataURL('image/png');
+            } finally {
+                document.body.removeChild(clone);
+            }
+        }
 
         // Download screenshot with watermark
-        async function downloadScreenshot() {{
+        async function downloadScreenshot() {
             const btn = document.getElementById('download-btn');
             const downloadSection = document.getElementById('download-section');
             const container = document.querySelector('.container');
@@ -847,49 +1092,21 @@ def generate_html() -> str:
             // Hide download button for clean screenshot
             downloadSection.style.display = 'none';
 
-            try {{
-                // Clone the container and position at 0,0
-                const clone = container.cloneNode(true);
-                clone.style.position = 'absolute';
-                clone.style.left = '0';
-                clone.style.top = '0';
-                clone.style.margin = '0';
-                clone.style.padding = '80px';
-                clone.style.zIndex = '-9999';
-                // Add dark background with gradient glows
-                clone.style.background = `
-                    radial-gradient(ellipse at 20% 80%, rgba(0, 255, 170, 0.08) 0%, transparent 50%),
-                    radial-gradient(ellipse at 80% 20%, rgba(255, 0, 170, 0.06) 0%, transparent 50%),
-                    radial-gradient(ellipse at 50% 50%, rgba(0, 221, 255, 0.04) 0%, transparent 60%),
-                    #0a0a0f
-                `;
-                document.body.appendChild(clone);
-
-                // Hide download button in clone
-                const cloneDownloadSection = clone.querySelector('#download-section');
-                if (cloneDownloadSection) cloneDownloadSection.style.display = 'none';
-
-                const canvas = await html2canvas(clone, {{
-                    scale: 2,
-                    useCORS: true,
-                    allowTaint: true,
-                    foreignObjectRendering: true,
-                    backgroundColor: '#0a0a0f'
-                }});
-
-                // Remove clone
-                document.body.removeChild(clone);
+            try {
+                const served = location.protocol.startsWith('http');
+                const href = served ? await fetchRenderedImage() : await captureScreenshot(container);
 
                 // Download the image with timestamp
                 const now = new Date();
                 const timestamp = now.toISOString().slice(0, 19).replace('T', '_').replace(/:/g, '-');
                 const a = document.createElement('a');
-                a.href = canvas.toDataURL('image/png');
-                a.download = `keyboard-heatmap-${{timestamp}}.png`;
+                a.href = href;
+                a.download = `keyboard-heatmap-${activePeriod}-${timestamp}.png`;
                 a.click();
-            }} catch (error) {{
+                if (served) setTimeout(() => URL.revokeObjectURL(href), 0);
+            } catch (error) {
                 console.error('Download failed:', error);
-            }} finally {{
+            } finally {
                 // Restore download button
                 downloadSection.style.display = 'flex';
                 btn.disabled = false;
@@ -901,25 +1118,226 @@ def generate_html() -> str:
                     </svg>
                     Download
                 `;
-            }}
-        }}
+            }
+        }
     </script>
 </body>
 </html>'''
 
-    return html
+
+
+@lru_cache(maxsize=1)
+def _font_faces() -> str:
+    """@font-face rules for the bundled fonts, inlined as data URIs."""
+    rules = []
+    for family, weight, filename in FONT_FILES:
+        path = BUNDLED_ASSET_DIR / filename
+        if not path.exists():
+            continue  # the CSS font stacks fall back to system fonts
+        data = base64.b64encode(path.read_bytes()).decode('ascii')
+        rules.append(
+            f"@font-face {{ font-family: '{family}'; font-weight: {weight}; font-display: swap; "
+            f"src: url(data:font/woff2;base64,{data}) format('woff2'); }}"
+        )
+    return '\n'.join(rules)
+
+
+@lru_cache(maxsize=1)
+def _template_parts() -> tuple[str, str]:
+    """The static page split around the data payload, with fonts inlined."""
+    head, tail = HTML_TEMPLATE.replace(FONTS_PLACEHOLDER, _font_faces()).split(DATA_PLACEHOLDER)
+    return head, tail
+
+
+def get_asset_dir() -> Path:
+    """Get the versioned AppData copy of the report assets."""
+    return database.get_db_path().parent / 'assets' / f'v{ASSET_VERSION}'
+
+
+@lru_cache(maxsize=1)
+def _html2canvas_url() -> Optional[str]:
+    """
+    Get a file URL for the local html2canvas copy, extracting it once.
+
+    The report lives in the temp dir and a frozen build unpacks its bundled
+    files to a folder that is deleted on exit, so the script is copied to a
+    versioned folder in AppData that outlives both.
+    """
+    bundled = BUNDLED_ASSET_DIR / HTML2CANVAS_FILE
+    if not bundled.exists():
+        return None
+    asset_dir = get_asset_dir()
+    target = asset_dir / HTML2CANVAS_FILE
+    try:
+        if not target.exists():
+            asset_dir.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(bundled, target)
+            # Drop the copies of older asset versions
+            for old in asset_dir.parent.glob('v*'):
+                if old != asset_dir:
+                    shutil.rmtree(old, ignore_errors=True)
+    except OSError:
+        return None
+    return target.as_uri()
+
+
+def fetch_assets(dest: Path = BUNDLED_ASSET_DIR):
+    """
+    Download the report fonts (subset to FONT_SUBSET) and html2canvas.
+
+    Run once before building; the files are picked up from assets/report/.
+    """
+    import re
+    import urllib.parse
+    import urllib.request
+
+    # Google Fonts only serves woff2 to browsers that say they support it
+    headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                             '(KHTML, like Gecko) Chrome/120.0 Safari/537.36'}
+
+    def download(url: str) -> bytes:
+        with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=30) as response:
+            return response.read()
+
+    dest.mkdir(parents=True, exist_ok=True)
+    css_url = GOOGLE_FONTS_URL + '&text=' + urllib.parse.quote(FONT_SUBSET)
+    css = download(css_url).decode('utf-8')
+    files = {(family, weight): filename for family, weight, filename in FONT_FILES}
+    for block in re.findall(r'@font-face\s*{[^}]*}', css):
+        family = re.search(r"font-family:\s*'([^']+)'", block).group(1)
+        weight = int(re.search(r'font-weight:\s*(\d+)', block).group(1))
+        url = re.search(r'url\(([^)]+)\)', block).group(1)
+        if (family, weight) in files:
+            (dest / files[family, weight]).write_bytes(download(url))
+    (dest / HTML2CANVAS_FILE).write_bytes(download(HTML2CANVAS_URL))
+    missing = [filename for _, _, filename in FONT_FILES if not (dest / filename).exists()]
+    if missing:
+        raise RuntimeError(f"Google Fonts did not serve {', '.join(missing)}")
+
+
+# Periods embedded in every report, in button order
+PERIODS = [
+    ('today', 'Today'),
+    ('week', 'This Week'),
+    ('month', 'This Month'),
+    ('all', 'All Time'),
+]
+
+
+def _diagnostics() -> Optional[dict]:
+    """Format the metrics snapshot for the diagnostics panel, if metrics are on."""
+    if not metrics.enabled:
+        return None
+    snapshot = metrics.snapshot()
+    counters = snapshot['counters']
+    histograms = snapshot['histograms']
+
+    def spread(name: str, unit: str) -> str:
+        h = histograms.get(name)
+        return f"{h['p50']:g} / {h['p99']:g} / {h['max']:g} {unit}" if h else 'N/A'
+
+    return {
+        'summary': [
+            ['Keys captured', f"{counters.get('keys_captured', 0):,}"],
+            ['Dropped while paused', f"{counters.get('keys_dropped_paused', 0):,}"],
+            ['Hook latency p50 / p99 / max', spread('hook_latency_us', '\u00b5s')],
+            ['Buffer high water', f"{snapshot['high_water'].get('buffer_high_water', 0):,}"],
+            ['Flushes', f"{counters.get('flushes', 0):,}"],
+            ['Flush time p50 / p99 / max', spread('flush_ms', 'ms')],
+            ['Rows upserted', f"{counters.get('rows_upserted', 0):,}"],
+            ['Query cache hits / misses', '{hits:,} / {misses:,}'.format(**database.get_query_cache_stats())],
+            ['Uptime', f"{snapshot['uptime_seconds'] // 3600}h {snapshot['uptime_seconds'] // 60 % 60}m"],
+        ],
+        'queries': [
+            [name, f"{t['calls']:,}", f"{t['mean_us']:,}", f"{t['max_us']:,}"]
+            for name, t in snapshot['timings'].items()
+        ],
+    }
+
+
+def build_report_data(ranges: Optional[dict[str, tuple[date, date]]] = None) -> dict:
+    """
+    Collect the data payload the report page renders.
+
+    Args:
+        ranges: Extra custom periods as {label: (start, end)}, both inclusive
+    """
+    ranges = ranges or {}
+    source = analytics if analytics.enabled else database
+    period_counts = source.get_period_counts(ranges)
+    stats = source.get_statistics()
+    today = date.today()
+
+    periods = [
+        {'id': period, 'label': label, 'counts': dict(period_counts[period]), 'live': True}
+        for period, label in PERIODS
+    ]
+    for label, (start, end) in ranges.items():
+        periods.append({
+            'id': label, 'label': label, 'counts': dict(period_counts[label]),
+            'start': start.isoformat(), 'end': end.isoformat(),
+            'live': start <= today <= end,
+        })
+
+    # Format statistics
+    tracking_since = stats['tracking_since'] or 'N/A'
+    most_active_day = stats['most_active_day']
+    most_active_str = f"{most_active_day[0]} ({most_active_day[1]:,})" if most_active_day else 'N/A'
+
+    return {
+        'periods': periods,
+        'defaultPeriod': 'all',
+        'assets': {'html2canvas': _html2canvas_url(), 'html2canvasFallback': HTML2CANVAS_URL},
+        'stats': [
+            [f"{stats['total_keystrokes']:,}", 'Total Keystrokes'],
+            [f"{stats['keys_per_day']:,}", 'Keys per Day'],
+            [f"{stats['keys_per_hour']:,}", 'Keys per Hour'],
+            [tracking_since, 'Tracking Since'],
+            [str(stats['days_tracked']), 'Days Tracked'],
+            [most_active_str, 'Most Active Day'],
+        ],
+        'diagnostics': _diagnostics(),
+    }
+
+
+def generate_html(ranges: Optional[dict[str, tuple[date, date]]] = None) -> str:
+    """Generate the heat map HTML with counts for every period."""
+    # Escape '<' so no key name can close the surrounding <script> element
+    data_json = json.dumps(build_report_data(ranges)).replace('<', '\\u003c')
+    head, tail = _template_parts()
+    return head + data_json + tail
+
+
+# (data generation, date, database) of the last report written
+_last_report_state: Optional[tuple] = None
+
+
+def _write_atomic(path: Path, text: str):
+    """Write a text file so readers never see a partially written version."""
+    temp_path = path.with_name(path.name + '.tmp')
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(temp_path, path)
 
 
 def generate_report() -> Path:
-    """Generate the heat map report and return the file path."""
-    html = generate_html()
+    """
+    Generate the heat map report and return the file path.
+
+    The file is only rewritten when data was written to the database (or
+    the date changed) since the last report, or when it shows metrics.
+    """
+    global _last_report_state
 
     temp_dir = Path(tempfile.gettempdir())
     report_path = temp_dir / 'keyboard_heatmap.html'
 
-    with open(report_path, 'w', encoding='utf-8') as f:
-        f.write(html)
+    state = (database.get_generation(), date.today(), database.get_db_path())
+    if state == _last_report_state and report_path.exists() and not metrics.enabled:
+        return report_path
 
+    _write_atomic(report_path, generate_html())
+    _last_report_state = state
     return report_path
 
 
@@ -927,3 +1345,23 @@ def open_report():
     """Generate and open the heat map report in the default browser."""
     report_path = generate_report()
     webbrowser.open(f'file:///{report_path}')
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Generate the heat map report.')
+    parser.add_argument('--fetch-assets', action='store_true',
+                        help='download the offline fonts and html2canvas into assets/report/')
+    args = parser.parse_args()
+
+    if args.fetch_assets:
+        fetch_assets()
+        print(f'Assets saved to {BUNDLED_ASSET_DIR}')
+    else:
+        database.init_db(replay=False)
+        print(generate_report())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,323 @@
+"""
+Localhost-only HTTP server for the live heat map.
+
+Serves the report page plus a small JSON API backed by database.py, and a
+Server-Sent Events stream that pushes count deltas as keys are logged so an
+open page updates without being regenerated.
+
+Endpoints:
+    /                       heat map page (all-time data)
+    /api/counts?period=     key counts for today, week, month or all
+    /api/counts?start=&end= key counts for a custom range of ISO dates
+    /api/stats              statistics from database.get_statistics
+    /api/top?n=             the n most pressed keys of all time
+    /api/events             SSE stream of {"key": delta} objects
+    /api/image.png?period=  heat map PNG rendered by render.py (also start/end)
+
+Usage:
+    python server.py [--port PORT]
+"""
+import json
+import queue
+import threading
+import time
+from collections import Counter
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import database
+import report
+
+HOST = '127.0.0.1'
+PERIODS = ('today', 'week', 'month', 'all')
+MAX_TOP = 100
+
+
+class EventHub:
+    """Coalesces logged keys into delta batches and fans them out to subscribers."""
+
+    PUSH_INTERVAL = 0.25  # seconds of keystrokes coalesced into one event
+    QUEUE_SIZE = 64  # undelivered events before a slow subscriber is dropped
+
+    def __init__(self):
+        self._pending = Counter()
+        self._lock = threading.Lock()
+        self._subscribers: list[queue.Queue] = []
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, key_name: str):
+        """Record one logged key. Cheap enough to call from the listener thread."""
+        if not self._subscribers:
+            return
+        with self._lock:
+            first = not self._pending
+            self._pending[key_name] += 1
+        if first:
+            self._wake.set()
+
+    def subscribe(self) -> queue.Queue:
+        """Register a subscriber; events arrive as Counters, None means closed."""
+        q = queue.Queue(self.QUEUE_SIZE)
+        with self._lock:
+            self._subscribers = self._subscribers + [q]
+        return q
+
+    def unsubscribe(self, q: queue.Queue):
+        """Remove a subscriber registered with subscribe."""
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s is not q]
+
+    def close(self):
+        """Stop the broadcaster and tell every subscriber to disconnect."""
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=2)
+        with self._lock:
+            subscribers, self._subscribers = self._subscribers, []
+        for q in subscribers:
+            self._end(q)
+
+    @staticmethod
+    def _end(q: queue.Queue):
+        """Replace whatever a subscriber has queued with the closing sentinel."""
+        try:
+            while True:
+                q.get_nowait()
+        except queue.Empty:
+            pass
+        q.put_nowait(None)
+
+    def _run(self):
+        """Wait for logged keys, then broadcast them every PUSH_INTERVAL."""
+        while not self._closed:
+            self._wake.wait()
+            if self._closed:
+                return
+            # Let a burst of keystrokes accumulate into a single event
+            time.sleep(self.PUSH_INTERVAL)
+            with self._lock:
+                self._wake.clear()
+                deltas, self._pending = self._pending, Counter()
+                subscribers = self._subscribers
+            if not deltas:
+                continue
+            for q in subscribers:
+                try:
+                    q.put_nowait(deltas)
+                except queue.Full:
+                    # The client stopped reading; it resyncs when it reconnects
+                    self.unsubscribe(q)
+                    self._end(q)
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """Routes GET requests to the page, the JSON API and the event stream."""
+
+    server: 'ReportServer'
+    protocol_version = 'HTTP/1.1'
+    KEEPALIVE = 15  # seconds between SSE comments on an idle stream
+
+    def do_GET(self):
+        if not self._host_allowed():
+            self._send_json({'error': 'forbidden'}, 403)
+            return
+
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        routes = {
+            '/': self._page,
+            '/api/counts': self._counts,
+            '/api/stats': self._stats,
+            '/api/top': self._top,
+            '/api/events': self._events,
+            '/api/image.png': self._image,
+        }
+        route = routes.get(url.path)
+        if route is None:
+            self._send_json({'error': 'not found'}, 404)
+            return
+        try:
+            route(params)
+        except ValueError as e:
+            self._send_json({'error': str(e)}, 400)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _host_allowed(self) -> bool:
+        """Reject requests for other host names (DNS rebinding)."""
+        port = self.server.server_address[1]
+        return self.headers.get('Host') in (f'{HOST}:{port}', f'localhost:{port}')
+
+    def _sync(self):
+        """Run the server's before_page hook so answers include buffered keys."""
+        if self.server.before_page:
+            self.server.before_page()
+
+    def _page(self, params: dict):
+        self._sync()
+        self._send(report.generate_html().encode('utf-8'), 'text/html; charset=utf-8')
+
+    @staticmethod
+    def _range(params: dict) -> tuple[Optional[date], Optional[date]]:
+        """Parse optional start/end query parameters."""
+        try:
+            start = date.fromisoformat(params['start'][0]) if 'start' in params else None
+            end = date.fromisoformat(params['end'][0]) if 'end' in params else None
+        except ValueError:
+            raise ValueError('start and end must be YYYY-MM-DD dates') from None
+        return start, end
+
+    @staticmethod
+    def _period(params: dict) -> str:
+        period = params.get('period', ['all'])[0]
+        if period not in PERIODS:
+            raise ValueError(f"period must be one of {', '.join(PERIODS)}")
+        return period
+
+    def _counts(self, params: dict):
+        # The page reloads from here after a reconnect, so unflushed keys count too
+        self._sync()
+        if 'start' in params or 'end' in params:
+            start, end = self._range(params)
+            self._send_json(database.get_key_counts(start=start, end=end))
+            return
+        self._send_json(database.get_key_counts(self._period(params)))
+
+    def _image(self, params: dict):
+        import io
+        import render
+
+        self._sync()
+        if 'start' in params or 'end' in params:
+            start, end = self._range(params)
+            counts = database.get_key_counts(start=start, end=end)
+            title = f"{start or 'First day'} to {end or date.today()}"
+        else:
+            period = self._period(params)
+            counts = database.get_key_counts(period)
+            title = dict(report.PERIODS)[period]
+        buffer = io.BytesIO()
+        render.render_heatmap(counts, title).save(buffer, format='PNG', compress_level=render.PNG_COMPRESS_LEVEL)
+        self._send(buffer.getvalue(), 'image/png')
+
+    def _stats(self, params: dict):
+        self._sync()
+        self._send_json(database.get_statistics())
+
+    def _top(self, params: dict):
+        try:
+            n = int(params.get('n', ['10'])[0])
+        except ValueError:
+            raise ValueError('n must be an integer') from None
+        n = max(1, min(n, MAX_TOP))
+        self._sync()
+        self._send_json(database.get_key_counts('all').most_common(n))
+
+    def _events(self, params: dict):
+        hub = self.server.hub
+        q = hub.subscribe()
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-store')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.close_connection = True
+            self.wfile.write(b'retry: 2000\n\n')
+            self.wfile.flush()
+            while True:
+                try:
+                    deltas = q.get(timeout=self.KEEPALIVE)
+                except queue.Empty:
+                    self.wfile.write(b': keepalive\n\n')
+                else:
+                    if deltas is None:
+                        return
+                    self.wfile.write(b'data: ' + json.dumps(deltas).encode('utf-8') + b'\n\n')
+                self.wfile.flush()
+        finally:
+            hub.unsubscribe(q)
+
+    def _send_json(self, data, status: int = 200):
+        self._send(json.dumps(data).encode('utf-8'), 'application/json', status)
+
+    def _send(self, body: bytes, content_type: str, status: int = 200):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # No console under pythonw, and request logs are not useful here
+        pass
+
+
+class ReportServer(ThreadingHTTPServer):
+    """HTTP server bound to 127.0.0.1 that runs in a background thread."""
+
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, before_page: Optional[Callable[[], None]] = None):
+        """
+        Args:
+            port: Port to listen on; 0 picks a free one
+            before_page: Called before the page or API data is served, e.g. to
+                flush buffered keystrokes so answers reflect current counts
+        """
+        super().__init__((HOST, port), RequestHandler)
+        self.hub = EventHub()
+        self.before_page = before_page
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f'http://{HOST}:{self.server_address[1]}/'
+
+    def publish(self, key_name: str):
+        """Push a logged key to connected pages (KeyLogger.on_key_logged)."""
+        self.hub.publish(key_name)
+
+    def start(self):
+        """Serve requests in a daemon thread."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Disconnect event streams, stop serving and close the socket."""
+        self.hub.close()
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Serve the heat map on localhost.')
+    parser.add_argument('--port', type=int, default=0, help='port to listen on (default: any free port)')
+    args = parser.parse_args()
+
+    database.init_db(replay=False)
+    server = ReportServer(args.port)
+    print(f'Serving {server.url} (Ctrl+C to stop)')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.hub.close()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()